@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from photon_source import DEFAULT_BLOCK_SIZE, MAX_ENERGY, MIN_ENERGY, SPECTRAL_INDEX, PhotonSource
+from trigger_engine import bin_photons
+
+# On-disk cache of background photon streams and binned background curves
+#
+# A background stream only depends on (rate, duration, random_seed, spectrum), so a sweep that
+# varies burst parameters simulates the same backgrounds over and over. BackgroundCache stores each
+# stream once as a .npy file, plus its 1s / event-by-event binned curves, and maps them back with
+# np.load(mmap_mode='r'). Files are written atomically (safe with sweep worker processes sharing a
+# directory), touched on every hit, and the least recently used ones are deleted once the directory
+# grows past max_bytes.
+#
+#   cache = BackgroundCache()
+#   Simulator(vars).run(source=cache.source(vars['rate'], vars['duration'], vars['random_seed']))
+
+FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'grb_background')
+DEFAULT_MAX_BYTES = 1 << 30
+
+PHOTONS_DTYPE = [('time', '<f8'), ('energy', '<f8')]      # Full precision, so replays match PhotonSource
+BINS_DTYPE = [('count', '<f8'), ('time', '<f8')]
+
+def background_key(rate, duration, random_seed, index=SPECTRAL_INDEX, min_energy=MIN_ENERGY, max_energy=MAX_ENERGY):
+    description = json.dumps([FORMAT_VERSION, rate, duration, random_seed, index, min_energy, max_energy])
+    return hashlib.sha1(description.encode()).hexdigest()
+
+class CachedBackground:
+    """
+    Cached background as a photon source. Blocks have PhotonSource's block_size so wrapping it in
+    a PoissonBurstSource gives the same photons as wrapping the PhotonSource it was generated from.
+    """
+
+    def __init__(self, times, energies, rate, duration, random_seed, block_size=DEFAULT_BLOCK_SIZE):
+        self.times = times
+        self.energies = energies
+        self.rate = rate
+        self.duration = duration
+        self.random_seed = random_seed
+        self.block_size = block_size
+        self.start_time = 0.0
+
+    def __iter__(self):
+        for start in range(0, len(self.times), self.block_size):
+            yield np.asarray(self.times[start:start + self.block_size]), np.asarray(self.energies[start:start + self.block_size])
+
+class BackgroundCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    # (times, energies) of the background stream, memory mapped
+    def photons(self, rate, duration, random_seed, index=SPECTRAL_INDEX, min_energy=MIN_ENERGY, max_energy=MAX_ENERGY):
+        key = background_key(rate, duration, random_seed, index, min_energy, max_energy)
+
+        def build():
+            blocks = list(PhotonSource(rate, duration, random_seed, index=index, min_energy=min_energy, max_energy=max_energy))
+            records = np.zeros(sum(len(times) for times, energies in blocks), dtype=PHOTONS_DTYPE)
+            if blocks:
+                records['time'] = np.concatenate([times for times, energies in blocks])
+                records['energy'] = np.concatenate([energies for times, energies in blocks])
+            return records
+
+        records = self._load_or_build(key + '-photons', build)
+        return records['time'], records['energy']
+
+    def source(self, rate, duration, random_seed, **spectrum):
+        times, energies = self.photons(rate, duration, random_seed, **spectrum)
+        return CachedBackground(times, energies, rate, duration, random_seed)
+
+    # (counts, close_times) of the background binned like sim() at bin_length, memory mapped
+    def binned(self, bin_length, rate, duration, random_seed, **spectrum):
+        key = background_key(rate, duration, random_seed, **spectrum)
+
+        def build():
+            times, energies = self.photons(rate, duration, random_seed, **spectrum)
+            counts, close_times, _ = bin_photons(times, bin_length)
+            bins = np.zeros(len(counts), dtype=BINS_DTYPE)
+            bins['count'] = counts
+            bins['time'] = close_times
+            return bins
+
+        bins = self._load_or_build(key + '-bins-' + repr(float(bin_length)), build)
+        return bins['count'], bins['time']
+
+    def _load_or_build(self, name, build):
+        path = os.path.join(self.directory, name + '.npy')
+        if os.path.exists(path):
+            try:
+                values = np.load(path, mmap_mode='r')
+                os.utime(path)
+                self.hits += 1
+                return values
+            except (OSError, ValueError):
+                pass                        # Evicted by another process or truncated; rebuild it
+        self.misses += 1
+        values = build()
+        temporary = path + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary, 'wb') as file:
+            np.save(file, values)
+        os.replace(temporary, path)
+        self.evict(keep=path)
+        return values
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, name)))
+        return entries
+
+    def size_bytes(self):
+        return sum(size for mtime, size, path in self.entries())
+
+    # Delete least recently used files until the cache fits in max_bytes
+    def evict(self, keep=None):
+        entries = sorted(self.entries())
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for mtime, size, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from config import GlobalState
+from energy_bands import evaluate_bands
+from grb import grb, BurstSet
+from photon_source import PhotonSource
+from simulator import Simulator
+from streaming_trigger import StreamingTrigger
+from trigger_engine import TriggerEngine, bin_photons, running_averages
+
+# Offline benchmark harness
+#
+# Runs fixed-seed scenarios through the simulator and reports photons/s, the per-bin cost of the
+# trigger evaluation, peak traced memory, the energy-band overhead, the per-photon cost of the
+# streaming trigger and the render time of the sim.py plots. Results are written as JSON so two commits can be compared:
+#   python benchmark.py --out before.json
+#   python benchmark.py --out after.json --compare before.json
+# --scaling additionally varies rate, duration, number of bursts, size_list and ebe_bin_length
+# one at a time around the background scenario.
+
+# name -> (settings overrides, bursts(settings))
+SCENARIOS = {
+    'background': ({'duration': 1000}, lambda vars: []),
+    'sgrb': ({'duration': 1000}, lambda vars: [grb(vars['duration'] / 2, vars['sgrb_A'], vars['sgrb_sigma'])]),
+    'lgrb_multi_pulse': ({'duration': 1000}, lambda vars: BurstSet(
+        np.linspace(400, 600, 40), np.full(40, vars['lgrb_A'] / 100), np.full(40, vars['lgrb_sigma'])).to_grbs()),
+    'high_rate_10khz': ({'duration': 200, 'rate': 10000}, lambda vars: [grb(vars['duration'] / 2, vars['default_A'], vars['default_sigma'])]),
+}
+
+SCALING = {
+    'rate': [57, 570, 5700],
+    'duration': [100, 1000, 5000],
+    'bursts': [1, 10, 100],
+    'size_list': [600, 60000, 600000],
+    'ebe_bin_length': [0.4, 0.04, 0.004],
+}
+
+def scenario_vars(overrides, quick=False):
+    vars = GlobalState().vars
+    vars.update(overrides)
+    if quick:
+        vars['duration'] = max(vars['enter_look_back_to'] * 2, vars['duration'] // 10)
+    return vars
+
+# Best of `repeat` wall-clock timings of fn()
+def best_time(fn, repeat):
+    best = np.inf
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_simulation(vars, bursts, repeat):
+    seconds, result = best_time(lambda: Simulator(vars, bursts).run(), repeat)
+    photons = sum(len(times) for times, energies in PhotonSource(vars['rate'], vars['duration'], vars['random_seed']))
+
+    # Trigger evaluation alone, on pre-binned data
+    times = np.concatenate([times for times, energies in PhotonSource(vars['rate'], vars['duration'], vars['random_seed'])])
+    engine = TriggerEngine.from_vars(vars)
+    counts, ra_timestamps, _ = bin_photons(times, 1)
+    ebe_counts, ebe_timestamps, _ = bin_photons(times, vars['ebe_bin_length'])
+    running_average = running_averages(counts, vars['running_avg_length'])
+    trigger_seconds, _ = best_time(lambda: engine.evaluate(running_average, ra_timestamps, ebe_counts, ebe_timestamps, times), repeat)
+    bins = len(ra_timestamps) + len(ebe_timestamps)
+
+    return {
+        'settings': {k: vars[k] for k in ('duration', 'rate', 'size_list', 'ebe_bin_length', 'random_seed')},
+        'bursts': len(bursts),
+        'photons': photons,
+        'seconds': seconds,
+        'photons_per_second': photons / seconds,
+        'bins': bins,
+        'trigger_eval_seconds_per_bin': trigger_seconds / max(bins, 1),
+        'peak_memory_bytes': peak_memory(lambda: Simulator(vars, bursts).run()),
+        'triggered_timestamp': result.triggered_timestamp,
+        'exit_timestamp': result.exit_timestamp,
+    }
+
+# Trigger engine over one stream with and without energy bands (all bands as one trigger group)
+def bench_bands(vars, bursts, repeat):
+    blocks = list(PhotonSource(vars['rate'], vars['duration'], vars['random_seed']))
+    times = np.concatenate([times for times, energies in blocks])
+    energies = np.concatenate([energies for times, energies in blocks])
+    engine = TriggerEngine.from_vars(vars)
+    single_seconds, _ = best_time(lambda: engine.evaluate_photons(times, bursts, vars['duration']), repeat)
+    banded_seconds, _ = best_time(lambda: evaluate_bands(vars, times, energies, bursts, duration=vars['duration']), repeat)
+    return {
+        'bands': len(vars['energy_band_edges']) - 1,
+        'single_band_seconds': single_seconds,
+        'banded_seconds': banded_seconds,
+        'ratio': banded_seconds / single_seconds,
+    }
+
+# StreamingTrigger cost per photon, one photon at a time and in blocks, at a rate above the lgrb peak.
+# Real-time operation needs mean_seconds_per_photon well below 1 / rate.
+def bench_streaming(rate=100000, seconds=1):
+    times = np.concatenate([times for times, energies in PhotonSource(rate, seconds, 1)])
+    vars = GlobalState().vars
+    single = StreamingTrigger(vars)
+    for photon_time in times.tolist():
+        single.push(photon_time)
+    block = StreamingTrigger(vars)
+    for start in range(0, len(times), 4096):
+        block.push_block(times[start:start + 4096])
+    return {
+        'rate': rate,
+        'photon_interval_seconds': 1 / rate,
+        'push': single.latency_stats(),
+        'push_block': block.latency_stats(),
+    }
+
+# Render time of sim.display_plots() and a reduced plot_tests() grid on the Agg backend
+def bench_plots(repeat, quick=False):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import sim
+
+    show = plt.show
+    plt.show = lambda *args, **kwargs: None
+    try:
+        sim.state = GlobalState()
+        sim.state.vars['duration'] = 1000 if not quick else 100
+        sim.init_vars()
+        sim.sim()
+
+        def render():
+            sim.display_plots()
+            plt.close('all')
+        display_seconds, _ = best_time(render, repeat)
+
+        def tests():
+            sim.plot_tests([0.05, 5], [87, 870])
+            plt.close('all')
+        tests_seconds, _ = best_time(tests, 1)
+    finally:
+        plt.show = show
+    return {'display_plots_seconds': display_seconds, 'plot_tests_2x2_seconds': tests_seconds}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+def run_benchmarks(repeat=3, quick=False, scaling=False, plots=True):
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'quick': quick,
+        'scenarios': {},
+    }
+    Simulator(scenario_vars({'duration': 50})).run()     # warm-up, so the first scenario isn't charged for it
+    for name, (overrides, make_bursts) in SCENARIOS.items():
+        vars = scenario_vars(overrides, quick)
+        results['scenarios'][name] = bench_simulation(vars, make_bursts(vars), repeat)
+        print_row(name, results['scenarios'][name])
+
+    vars = scenario_vars(SCENARIOS['high_rate_10khz'][0], quick)
+    results['energy_bands'] = bench_bands(vars, SCENARIOS['high_rate_10khz'][1](vars), repeat)
+    print('energy_bands'.ljust(28) + 'x' + str(round(results['energy_bands']['ratio'], 2)) + ' of the single-band engine')
+
+    results['streaming'] = bench_streaming()
+    for name in ('push', 'push_block'):
+        print(('streaming_' + name).ljust(28) + str(round(results['streaming'][name]['mean_seconds_per_photon'] * 1e6, 3)).rjust(12) +
+              ' us/photon at ' + str(results['streaming']['rate']) + ' photons/s')
+
+    if scaling:
+        results['scaling'] = {}
+        for parameter, values in SCALING.items():
+            for value in values:
+                vars = scenario_vars({'duration': 1000}, quick)
+                if parameter == 'bursts':
+                    bursts = [grb(p, vars['default_A'], vars['default_sigma']) for p in np.linspace(0, vars['duration'], value)]
+                else:
+                    vars[parameter] = value
+                    bursts = []
+                name = parameter + '=' + str(value)
+                results['scaling'][name] = bench_simulation(vars, bursts, 1)
+                print_row(name, results['scaling'][name])
+
+    if plots:
+        results['plots'] = bench_plots(repeat, quick)
+        for name, seconds in results['plots'].items():
+            print(name.ljust(28) + str(round(seconds, 3)) + ' s')
+    return results
+
+def print_row(name, row):
+    print(name.ljust(28) + str(int(row['photons_per_second'])).rjust(12) + ' photons/s' +
+          str(round(row['trigger_eval_seconds_per_bin'] * 1e6, 3)).rjust(10) + ' us/bin' +
+          str(round(row['peak_memory_bytes'] / 1e6, 1)).rjust(10) + ' MB')
+
+# Print new/old ratios for throughput and timings present in both result files
+def compare(new, old):
+    print('\nCompared with ' + str(old.get('commit')) + ' (ratio > 1 is faster):')
+    for section in ('scenarios', 'scaling'):
+        for name, row in new.get(section, {}).items():
+            old_row = old.get(section, {}).get(name)
+            if old_row:
+                print(name.ljust(28) + 'throughput x' + str(round(row['photons_per_second'] / old_row['photons_per_second'], 2)) +
+                      '  trigger x' + str(round(old_row['trigger_eval_seconds_per_bin'] / row['trigger_eval_seconds_per_bin'], 2)))
+    for name, stats in new.get('streaming', {}).items():
+        old_stats = old.get('streaming', {}).get(name)
+        if isinstance(stats, dict) and old_stats:
+            print(('streaming_' + name).ljust(28) + 'x' + str(round(old_stats['mean_seconds_per_photon'] / stats['mean_seconds_per_photon'], 2)))
+    for name, seconds in new.get('plots', {}).items():
+        if name in old.get('plots', {}):
+            print(name.ljust(28) + 'x' + str(round(old['plots'][name] / seconds, 2)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fixed-seed benchmarks for the GRB trigger simulation')
+    parser.add_argument('--out', default='benchmark.json', help='JSON file for the results')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    parser.add_argument('--repeat', type=int, default=3, help='timing repeats, best is kept')
+    parser.add_argument('--quick', action='store_true', help='shorter runs for a fast smoke check')
+    parser.add_argument('--scaling', action='store_true', help='also vary one parameter at a time')
+    parser.add_argument('--no-plots', action='store_true', help='skip the plot rendering benchmarks')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeat, args.quick, args.scaling, not args.no_plots)
+    with open(args.out, 'w') as file:
+        json.dump(results, file, indent=4)
+    print('Results written to ' + args.out)
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            compare(results, json.load(file))
+
+if __name__ == "__main__":
+    main()
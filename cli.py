@@ -0,0 +1,237 @@
+from time import perf_counter
+
+START = perf_counter()
+
+import argparse
+import json
+import sys
+
+# Headless command line interface
+#
+#   python -m cli run --config x.json --bursts bursts.json --seed N --out dir
+#   python -m cli run --bands --set 'trigger_bands=[[0], [1], [2]]' --out dir
+#   python -m cli replay events.txt --config x.json --out dir
+#   python -m cli continuous --set duration=86400 --scatter 50 --out dir
+#
+# Runs the simulator without the interactive menu and prints the trigger result as JSON. --bands also
+# runs the trigger on each group of energy bands in the 'trigger_bands' setting (band edges from
+# 'energy_band_edges') and saves the per-band light curve with the run. Only numpy
+# and the simulation modules are imported up front: matplotlib is imported only for --plot and
+# scipy only when Poisson bursts are sampled. The JSON includes the time from the start of this
+# module to the source yielding its first photon block (startup_seconds) so that stays visible;
+# `python -X importtime -m cli` shows where it goes.
+
+def load_bursts(path):
+    from grb import BurstSet
+    return BurstSet.from_file(path)
+
+# Apply --config, --seed and --set key=value (values parsed as JSON, else kept as strings)
+def load_state(args):
+    from config import GlobalState
+    state = GlobalState()
+    if args.config:
+        state.load(args.config)
+    if args.seed is not None:
+        state.vars['random_seed'] = args.seed
+    for setting in args.set:
+        key, _, value = setting.partition('=')
+        if key not in state.vars:
+            raise SystemExit('unknown setting ' + repr(key))
+        try:
+            state.vars[key] = json.loads(value)
+        except ValueError:
+            state.vars[key] = value
+    return state
+
+# Saved through an Agg canvas when a path is given (no GUI backend needed), otherwise shown
+def plot_result(result, path=None):
+    from plotting import result_figure, save_figure
+    figure = result_figure(result, headless=path is not None)
+    if path is None:
+        import matplotlib.pyplot as plt
+        plt.show()
+        plt.close(figure)
+    else:
+        save_figure(figure, path)
+
+# Photon source wrapper that records when the first block is yielded; other attributes (duration,
+# random_seed, start_time) come from the wrapped source so the simulator can still wrap it
+class FirstBlockTimer:
+    def __init__(self, source):
+        self.source = source
+        self.first_block = None
+
+    def __getattr__(self, name):
+        return getattr(self.source, name)
+
+    def __iter__(self):
+        for block in self.source:
+            if self.first_block is None:
+                self.first_block = perf_counter()
+            yield block
+
+BANDS_CSV = 'light_curve_bands.csv'      # Per-band event-by-event light curve saved with --bands --out
+
+def timestamp_or_none(timestamp):
+    from simulator import NOT_TRIGGERED
+    return float(timestamp) if timestamp != NOT_TRIGGERED else None
+
+# Trigger result of each group in 'trigger_bands' over the photon blocks of a run, and the banded
+# light curve. Bursts already sampled as photons are not added again. Sources without a fixed
+# duration (recorded data) end at their last photon, as in Simulator.run()
+def evaluate_run_bands(vars, burst_set, blocks, duration=None):
+    import numpy as np
+    from energy_bands import evaluate_bands
+    times = np.concatenate([times for times, energies in blocks] or [np.zeros(0)])
+    energies = np.concatenate([energies for times, energies in blocks] or [np.zeros(0)])
+    if duration is None and len(times):
+        duration = float(times[-1])
+    bursts = [] if vars.get('poisson_bursts', False) else burst_set
+    results, curve = evaluate_bands(vars, times, energies, bursts, duration=duration)
+    groups = [{
+        'bands': list(group),
+        'triggered': result.triggered(),
+        'triggered_timestamp': timestamp_or_none(result.triggered_timestamp),
+        'exit_timestamp': timestamp_or_none(result.exit_timestamp),
+    } for group, result in results.items()]
+    return {'edges': [float(edge) for edge in curve.edges], 'groups': groups}, curve
+
+def execute(args, state, bursts, source=None):
+    from simulator import NOT_TRIGGERED, Simulator
+
+    writer = None
+    if args.out and args.photons:
+        from run_io import RunWriter
+        writer = RunWriter(args.out, state, bursts)
+    if source is None:
+        from photon_source import PhotonSource
+        source = PhotonSource(state.vars['rate'], state.vars['duration'], state.vars['random_seed'])
+    source = FirstBlockTimer(source)
+
+    # The banded trigger needs the whole photon stream, so it is collected while the run goes
+    band_blocks = [] if args.bands else None
+    def photon_sink(times, energies, flags=None):
+        if writer is not None:
+            writer.write_photons(times, energies, flags)
+        if band_blocks is not None:
+            band_blocks.append((times, energies))
+
+    run_start = perf_counter()
+    simulator = Simulator(state, bursts)
+    result = simulator.run(source=source, photon_sink=photon_sink if writer is not None or band_blocks is not None else None)
+    run_end = perf_counter()
+
+    bands = None
+    if band_blocks is not None:
+        bands, curve = evaluate_run_bands(state.vars, simulator.burst_set, band_blocks, source.duration)
+
+    if args.out:
+        if writer is None:
+            from run_io import RunWriter
+            writer = RunWriter(args.out, state, bursts)
+        writer.add_result(result)
+        if bands is not None:
+            import os
+            curve.save(writer)
+            with open(os.path.join(args.out, BANDS_CSV), 'w') as file:
+                curve.write_csv(file)
+        writer.close()
+    if args.plot:
+        import os
+        plot_result(result, os.path.join(args.out, 'light_curve.png') if args.out else None)
+
+    output = {
+        'triggered': result.triggered(),
+        'triggered_timestamp': result.triggered_timestamp if result.triggered_timestamp != NOT_TRIGGERED else None,
+        'exit_timestamp': result.exit_timestamp if result.exit_timestamp != NOT_TRIGGERED else None,
+        'seconds_binned': len(result.photon_count_data),
+        'random_seed': state.vars['random_seed'],
+        'out': args.out,
+        'timing': {
+            'startup_seconds': (source.first_block if source.first_block is not None else run_end) - START,
+            'run_seconds': run_end - run_start,
+        },
+    }
+    if bands is not None:
+        output['bands'] = bands
+    json.dump(output, sys.stdout, indent=4 if args.pretty else None)
+    sys.stdout.write('\n')
+    return output
+
+def run(args):
+    state = load_state(args)
+    if args.no_bursts:
+        bursts = []
+    elif args.bursts:
+        bursts = load_bursts(args.bursts)
+    else:
+        bursts = state.bursts       # Bursts saved in --config; None gives the simulator's default burst
+    return execute(args, state, bursts)
+
+def replay(args):
+    from tte_reader import EventFileSource
+    state = load_state(args)
+    return execute(args, state, [], EventFileSource(args.events, format=args.format))
+
+# Bounded-memory run of any duration that re-arms after every exit (see continuous.py)
+def continuous(args):
+    from continuous import ContinuousRun, scattered_bursts
+    state = load_state(args)
+    if args.bursts:
+        bursts = load_bursts(args.bursts)
+    elif args.scatter is not None:
+        bursts = scattered_bursts(state.vars, args.scatter)
+    else:
+        bursts = state.bursts if state.bursts is not None else []
+    run_start = perf_counter()
+    output = ContinuousRun(state, bursts, args.out, args.segment, args.window, args.algorithm).run()
+    output['random_seed'] = state.vars['random_seed']
+    output['timing'] = {'startup_seconds': run_start - START, 'run_seconds': perf_counter() - run_start}
+    json.dump(output, sys.stdout, indent=4 if args.pretty else None)
+    sys.stdout.write('\n')
+    return output
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m cli', description='Headless GRB trigger simulation')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def common(command):
+        command.add_argument('--config', help='GlobalState JSON file')
+        command.add_argument('--seed', type=int, help='random seed (overrides the config)')
+        command.add_argument('--set', action='append', default=[], metavar='KEY=VALUE', help='override a setting')
+        command.add_argument('--out', help='save the run (run_io directory)')
+        command.add_argument('--photons', action='store_true', help='also save every photon to --out')
+        command.add_argument('--plot', action='store_true', help='plot the run, to --out/light_curve.png if given')
+        command.add_argument('--bands', action='store_true', help='also trigger on each group of energy bands in trigger_bands')
+        command.add_argument('--pretty', action='store_true', help='indent the JSON output')
+
+    run_command = commands.add_parser('run', help='simulate a run')
+    common(run_command)
+    run_command.add_argument('--bursts', help='burst table: .csv, .json, .npy or .npz (see grb.BurstSet.from_file)')
+    run_command.add_argument('--no-bursts', action='store_true', help='background only')
+    run_command.set_defaults(handler=run)
+
+    replay_command = commands.add_parser('replay', help='run the trigger over a recorded event file')
+    common(replay_command)
+    replay_command.add_argument('events', help='text, .npy or PHOTON_DTYPE .bin event file')
+    replay_command.add_argument('--format', choices=['text', 'binary'], help='file format (default: from the extension)')
+    replay_command.set_defaults(handler=replay)
+
+    continuous_command = commands.add_parser('continuous', help='long run in bounded memory, saved segment by segment')
+    continuous_command.add_argument('--config', help='GlobalState JSON file')
+    continuous_command.add_argument('--seed', type=int, help='random seed (overrides the config)')
+    continuous_command.add_argument('--set', action='append', default=[], metavar='KEY=VALUE', help='override a setting')
+    continuous_command.add_argument('--out', help='directory for the segments and triggers.jsonl')
+    continuous_command.add_argument('--pretty', action='store_true', help='indent the JSON output')
+    continuous_command.add_argument('--bursts', help='burst table (see grb.BurstSet.from_file)')
+    continuous_command.add_argument('--scatter', type=int, metavar='N', help='N default bursts at random times')
+    continuous_command.add_argument('--segment', type=float, default=3600, help='seconds per saved segment')
+    continuous_command.add_argument('--window', type=float, default=600, help='seconds of recent bins kept in memory')
+    continuous_command.add_argument('--algorithm', help='trigger algorithm (trigger_algorithms.ALGORITHMS)')
+    continuous_command.set_defaults(handler=continuous)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
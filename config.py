@@ -24,13 +24,29 @@ class GlobalState:
             'lgrb_A': 81217.05,
             'lgrb_sigma': 2.62, 
             'default_A': 90,
-            'default_sigma': 5
+            'default_sigma': 5,
+            'poisson_bursts': False,
+            'energy_band_edges': [1.0, 10.0, 100.0, 1000.0],
+            'trigger_bands': [[0, 1, 2]],
+            'bank_enter_z_score': 5.5,
+            'bank_exit_z_score': 1.0
         }
 
+        # Burst list saved with the settings, a grb.BurstSet; None when the settings carry no bursts
+        self.bursts = None
+
     def save(self, filename):
+        data = dict(self.vars)
+        if self.bursts is not None:
+            data['bursts'] = self.bursts.to_dict()
         with open(filename, 'w') as file:
-            json.dump(self.vars, file, indent=4)
+            json.dump(data, file, indent=4)
     
     def load(self, filename):
+        from grb import BurstSet
         with open(filename, 'r') as file:
-            self.vars = json.load(file)
\ No newline at end of file
+            data = json.load(file)
+        bursts = data.pop('bursts', None)
+        self.bursts = BurstSet.from_dict(bursts) if bursts is not None else None
+        self.vars = GlobalState().vars      # Start from the defaults so files saved before a setting existed still load
+        self.vars.update(data)
\ No newline at end of file
@@ -0,0 +1 @@
+# Lets pytest import the repository's top level modules from tests/ (python -m pytest from the root)
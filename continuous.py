@@ -0,0 +1,208 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+from config import GlobalState
+from photon_source import PhotonSource, PoissonBurstSource
+from ring_buffer import RingBuffer
+from streaming_trigger import StreamingBinner, StreamingTrigger
+
+# Continuous long-duration simulation
+#
+# Simulator.run() keeps every binned value of the run and triggers at most once. ContinuousRun
+# streams the photons through streaming_trigger.StreamingTrigger with rearm=True, so every burst
+# can trigger, and keeps only:
+#   - the last window_seconds of 1s and event-by-event bins, in RingBuffers
+#   - the bins of the current segment (segment_seconds long)
+# Each completed segment is written to out/segment_NNNNN (a run_io directory with the segment's
+# binned curves and trigger events) and dropped from memory; every trigger is appended to
+# out/triggers.jsonl as it exits. Memory therefore depends on segment_seconds and window_seconds,
+# not on the duration; memory_report() gives the buffered bytes and the process's peak RSS, which is
+# also recorded per segment so it can be checked to stay flat (None on platforms without the
+# resource module, such as Windows).
+#
+#   run = ContinuousRun(state, scattered_bursts(state.vars, 200), out='orbit', segment_seconds=3600)
+#   summary = run.run()
+#
+# `python -m cli continuous` runs it from the command line.
+
+DEFAULT_SEGMENT_SECONDS = 3600
+DEFAULT_WINDOW_SECONDS = 600
+SEGMENT_ARRAYS = ('second_counts', 'second_timestamps', 'ebe_counts', 'ebe_timestamps')
+
+# count default bursts (default_A / default_sigma) at uniformly random peak times over the duration
+def scattered_bursts(vars, count, random_seed=None, amplitude=None, sigma=None):
+    from grb import BurstSet
+    rng = np.random.default_rng(np.random.SeedSequence(vars['random_seed'] if random_seed is None else random_seed, spawn_key=(3,)))
+    peak_times = np.sort(rng.uniform(0, vars['duration'], count))
+    amplitude = vars['default_A'] if amplitude is None else amplitude
+    sigma = vars['default_sigma'] if sigma is None else sigma
+    return BurstSet(peak_times, np.full(count, amplitude), np.full(count, sigma))
+
+# Peak RSS of the process, None where there is no resource module (Windows)
+def max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024       # kB on Linux, bytes on macOS
+
+class ContinuousRun:
+    """
+    Bounded-memory simulation of an arbitrarily long run with any number of bursts.
+
+    Built from a config.GlobalState (or its vars dict) and bursts (grb list or BurstSet; the
+    GlobalState's saved bursts if None). With out=None segments are not saved, only counted. The
+    trigger algorithm can be chosen as for StreamingTrigger.
+    """
+
+    def __init__(self, config=None, bursts=None, out=None, segment_seconds=DEFAULT_SEGMENT_SECONDS,
+                 window_seconds=DEFAULT_WINDOW_SECONDS, algorithm=None):
+        from grb import as_burst_set
+        if config is None:
+            config = GlobalState()
+        self.config = config
+        self.vars = config.vars if isinstance(config, GlobalState) else config
+        if bursts is None and isinstance(config, GlobalState):
+            bursts = config.bursts
+        self.burst_set = as_burst_set(bursts if bursts is not None else [])
+        self.out = out
+        self.segment_seconds = segment_seconds
+        self.window_seconds = window_seconds
+        self.trigger = StreamingTrigger(self.vars, rearm=True, algorithm=algorithm)
+        self.ebe_bin_length = self.vars['ebe_bin_length']
+        self.second_binner = StreamingBinner(1)
+        self.ebe_binner = StreamingBinner(self.ebe_bin_length)
+
+        # Rolling windows of the most recent bins
+        ebe_window = int(window_seconds / self.ebe_bin_length)
+        self.second_window = (RingBuffer(int(window_seconds)), RingBuffer(int(window_seconds)))
+        self.ebe_window = (RingBuffer(ebe_window), RingBuffer(ebe_window))
+
+        self.segment = 0
+        self.segment_bins = {name: [] for name in SEGMENT_ARRAYS}
+        self.segment_events = []
+        self.segment_rss = []
+        self.open_trigger = None
+        self.trigger_count = 0
+        self.photons = 0
+        self.peak_buffer_bytes = 0
+        if out is not None:
+            os.makedirs(out, exist_ok=True)
+            self.trigger_file = open(os.path.join(out, 'triggers.jsonl'), 'w')
+        else:
+            self.trigger_file = None
+
+    def source(self):
+        background = PhotonSource(self.vars['rate'], self.vars['duration'], self.vars['random_seed'])
+        if self.vars.get('poisson_bursts', False):
+            return PoissonBurstSource(background, self.burst_set)
+        return background
+
+    def run(self, source=None):
+        source = self.source() if source is None else source
+        add_bursts = len(self.burst_set) > 0 and not self.vars.get('poisson_bursts', False)
+        try:
+            for block in source:
+                times = np.asarray(block[0], dtype=np.float64)
+                if len(times) == 0:
+                    continue
+                second_closes, second_counts = self.second_binner.bin_block(times)
+                ebe_closes, ebe_counts = self.ebe_binner.bin_block(times)
+                second_timestamps = times[second_closes]
+                ebe_timestamps = times[ebe_closes]
+                if add_bursts:
+                    # Expected burst counts are added as each bin closes, as in Simulator.run()
+                    second_counts = second_counts + self.burst_set.evaluate(second_timestamps)
+                    ebe_counts = ebe_counts + self.burst_set.evaluate(ebe_timestamps)
+                for event in self.trigger.push_binned(times, second_closes, second_counts, ebe_closes, ebe_counts):
+                    self._record_event(event)
+                self.photons += len(times)
+                self._add_bins(second_counts, second_timestamps, ebe_counts, ebe_timestamps)
+            self._flush_segment()
+        finally:
+            if self.trigger_file is not None:
+                self.trigger_file.close()
+        return self.summary()
+
+    def _record_event(self, event):
+        if event.kind == 'enter':
+            self.open_trigger = {'enter': event.time, 'exit': None, 'significance': event.significance}
+        else:
+            self.open_trigger['exit'] = event.time
+            self.trigger_count += 1
+            if self.trigger_file is not None:
+                self.trigger_file.write(json.dumps(self.open_trigger) + '\n')
+                self.trigger_file.flush()
+            self.open_trigger = None
+        self.segment_events.append((event.kind, event.time))
+
+    # Append bins to the windows and the current segment, flushing every segment they complete
+    def _add_bins(self, second_counts, second_timestamps, ebe_counts, ebe_timestamps):
+        self.second_window[0].extend(second_counts)
+        self.second_window[1].extend(second_timestamps)
+        self.ebe_window[0].extend(ebe_counts)
+        self.ebe_window[1].extend(ebe_timestamps)
+        arrays = dict(zip(SEGMENT_ARRAYS, (second_counts, second_timestamps, ebe_counts, ebe_timestamps)))
+        while True:
+            end = (self.segment + 1) * self.segment_seconds
+            second_cut = np.searchsorted(second_timestamps, end)
+            ebe_cut = np.searchsorted(ebe_timestamps, end)
+            cuts = {'second_counts': second_cut, 'second_timestamps': second_cut, 'ebe_counts': ebe_cut, 'ebe_timestamps': ebe_cut}
+            for name in SEGMENT_ARRAYS:
+                self.segment_bins[name].append(arrays[name][:cuts[name]])
+                arrays[name] = arrays[name][cuts[name]:]
+            second_timestamps, ebe_timestamps = arrays['second_timestamps'], arrays['ebe_timestamps']
+            self.peak_buffer_bytes = max(self.peak_buffer_bytes, self.buffer_bytes())
+            if len(second_timestamps) == 0 and len(ebe_timestamps) == 0:
+                break
+            self._flush_segment()
+
+    def _flush_segment(self):
+        bins = {name: np.concatenate(parts) if parts else np.zeros(0) for name, parts in self.segment_bins.items()}
+        end = (self.segment + 1) * self.segment_seconds
+        if self.out is not None:
+            from run_io import RunWriter
+            with RunWriter(os.path.join(self.out, 'segment_' + str(self.segment).zfill(5)), self.vars) as writer:
+                writer.header['segment'] = self.segment
+                writer.header['start'] = self.segment * self.segment_seconds
+                writer.header['end'] = end
+                writer.header['events'] = [{'kind': kind, 'time': time} for kind, time in self.segment_events if time < end]
+                for name, values in bins.items():
+                    writer.add_array(name, values)
+        self.segment_rss.append(max_rss_bytes())
+        self.segment += 1
+        self.segment_bins = {name: [] for name in SEGMENT_ARRAYS}
+        self.segment_events = [(kind, time) for kind, time in self.segment_events if time >= end]
+
+    # Bytes of binned data currently held in memory (windows plus the open segment)
+    def buffer_bytes(self):
+        windows = sum(buffer.data.nbytes for buffer in self.second_window + self.ebe_window)
+        return windows + sum(part.nbytes for parts in self.segment_bins.values() for part in parts)
+
+    # Most recent window_seconds of (second_counts, second_timestamps, ebe_counts, ebe_timestamps)
+    def window(self):
+        return tuple(buffer.to_array() for buffer in self.second_window + self.ebe_window)
+
+    def memory_report(self):
+        return {
+            'buffer_bytes': self.buffer_bytes(),
+            'peak_buffer_bytes': self.peak_buffer_bytes,
+            'max_rss_bytes': max_rss_bytes(),
+            'segment_max_rss_bytes': list(self.segment_rss),
+        }
+
+    def summary(self):
+        return {
+            'duration': self.vars['duration'],
+            'photons': self.photons,
+            'bursts': len(self.burst_set),
+            'triggers': self.trigger_count,
+            'open_trigger': self.open_trigger,
+            'segments': self.segment,
+            'out': self.out,
+            'memory': self.memory_report(),
+        }
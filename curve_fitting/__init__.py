@@ -0,0 +1,5 @@
+# Light curve fitting (fitting.py) and the single Gaussian fit script (curvefit.py). Run from the
+# repository root so qdp_reader, grb and config can be imported:
+#
+#   python -m curve_fitting.fitting lgrb.dat --model fred --pulses 2
+#   python -m curve_fitting.curvefit [file.dat] [plot.png]
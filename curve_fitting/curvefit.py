@@ -1,39 +1,44 @@
+import os
+import sys
+
 import numpy as np
+import matplotlib
 import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
-
-# Read the .dat file, skipping the first two lines and ignoring invalid data
-data = np.genfromtxt('lgrb.dat', skip_header=2, delimiter=' ', invalid_raise=False)
-
-# Extract columns (skip the first column)
-x_data = data[:, 1]  # Select the second column
-y_data = data[:, 2]  # Select the third column
-
-# Step 2: Define the Gaussian function
-def gaussian(x, amp, mean, stddev):
-    return amp * np.exp(-((x - mean) ** 2) / (2 * stddev ** 2))
-
-# Initial guess for the parameters [amplitude, mean, standard deviation]
-initial_guess = [np.max(y_data), np.mean(x_data), np.std(x_data)]
-
-# Bound amplitude to be between 0 and max(y_data)
-bounds = ([0, -np.inf, 0], [np.max(y_data), np.inf, np.inf])
-
-# Perform the curve fitting
-popt, pcov = curve_fit(gaussian, x_data, y_data, p0=initial_guess, bounds=bounds)
-
-# Extract the fitted parameters
-amp, mean, stddev = popt
 
-# Step 3: Plot the data and the fit
+from .fitting import GaussianPulse, fit_curve, load_light_curve
+
+# Fit one Gaussian to a .dat light curve and plot it
+#
+#   python -m curve_fitting.curvefit [file.dat] [plot.png]
+#
+# Run it from the repository root: it is part of the curve_fitting package, so `python curvefit.py`
+# from inside curve_fitting/ does not work.
+# The file defaults to the lgrb.dat next to this script; with a second argument the plot is saved
+# there instead of shown. fitting.py fits several pulses / FRED shapes and many files at once.
+#
+# The model is fitting.py's: the Gaussian plus a constant background, where this script used to fit
+# the Gaussian alone. The background takes up the baseline the bare Gaussian had to absorb, so the
+# fitted amplitude and width differ from earlier versions and the background is shown as its own
+# term in the formula.
+
+path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lgrb.dat')
+output = sys.argv[2] if len(sys.argv) > 2 else None
+if output is not None:
+    matplotlib.use('Agg')
+
+x_data, y_data = load_light_curve(path)
+fit = fit_curve(x_data, y_data, 'gaussian', 1, path=path)
+(amp, mean, stddev), background = fit.pulses()[0], fit.background()
+
+# Plot the data and the fit
 plt.figure()
 plt.scatter(x_data, y_data, label='Data')
 x_fit = np.linspace(min(x_data), max(x_data), 1000)
-y_fit = gaussian(x_fit, *popt)
+y_fit = GaussianPulse.evaluate(x_fit, amp, mean, stddev) + background
 plt.plot(x_fit, y_fit, color='red', label='Gaussian Fit')
 
 # Annotate the plot with the Gaussian formula
-formula = f'$y = {amp:.2f} \exp\\left(-\\frac{{(x - {mean:.2f})^2}}{{2 \\times {stddev:.2f}^2}}\\right)$'
+formula = f'$y = {amp:.2f} \\exp\\left(-\\frac{{(x - {mean:.2f})^2}}{{2 \\times {stddev:.2f}^2}}\\right) + {background:.2f}$'
 plt.text(0.55, 0.5, formula, transform=plt.gca().transAxes, fontsize=10,
          verticalalignment='center', horizontalalignment='left', bbox=dict(boxstyle='round,pad=0.5', edgecolor='black', facecolor='white'))
 
@@ -41,4 +46,7 @@ plt.legend()
 plt.xlabel('Time')
 plt.ylabel('Counts')
 plt.title('Gaussian Fit for LGRB Burst')
-plt.show()
\ No newline at end of file
+if output is None:
+    plt.show()
+else:
+    plt.savefig(output)
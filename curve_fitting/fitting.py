@@ -0,0 +1,294 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from qdp_reader import read_light_curve
+
+# Light curve fitting
+#
+# Fits multi-pulse models with analytic Jacobians to count-rate curves (the QDP style .dat files,
+# 'DP <time> <rate>' lines) and turns the fitted pulses into simulator bursts.
+#
+#   fit = fit_file('lgrb.dat', 'gaussian', n_pulses=2)
+#   fit.to_grbs()                       # grb objects for sim.py / Simulator
+#   fit.to_global_state(state, 'lgrb')  # bursts plus lgrb_A / lgrb_sigma of the brightest pulse
+#   fits = fit_files(paths, 'fred', workers=8)
+#
+# Models are sums of n_pulses pulses plus a constant background:
+#   gaussian    amplitude * exp(-(t - mean)^2 / (2 width^2))
+#   fred        Norris et al. (2005) fast-rise exponential-decay pulse,
+#               amplitude * exp(2 sqrt(tau1 / tau2)) * exp(-tau1 / (t - start) - (t - start) / tau2)
+#               for t > start; amplitude is the peak rate
+# scipy is only imported when fitting. Needs the repository root on the path (qdp_reader, grb,
+# config): run python -m curve_fitting.fitting ... from the root.
+
+FWHM_PER_STD = 2 * np.sqrt(2 * np.log(2))
+
+# Time and rate columns of a .dat file (parsed once, then memory mapped from its sidecar cache)
+def load_light_curve(path):
+    return read_light_curve(path)
+
+class GaussianPulse:
+    name = 'gaussian'
+    parameter_names = ('amplitude', 'mean', 'width')
+
+    @staticmethod
+    def evaluate(t, amplitude, mean, width):
+        return amplitude * np.exp(-((t - mean) ** 2) / (2 * width ** 2))
+
+    # Columns d/d(amplitude, mean, width)
+    @staticmethod
+    def jacobian(t, amplitude, mean, width):
+        shape = np.exp(-((t - mean) ** 2) / (2 * width ** 2))
+        value = amplitude * shape
+        return np.column_stack((shape, value * (t - mean) / width ** 2, value * (t - mean) ** 2 / width ** 3))
+
+    @staticmethod
+    def guess(t, peak_time, peak_rate, half_width):
+        return [peak_rate, peak_time, half_width / np.sqrt(2 * np.log(2))]
+
+    @staticmethod
+    def bounds(t, max_rate):
+        span = t[-1] - t[0]
+        return [0, t[0], 1e-6 * span], [2 * max_rate, t[-1], span]
+
+    @staticmethod
+    def peak(amplitude, mean, width):
+        return mean, amplitude, width
+
+class FredPulse:
+    name = 'fred'
+    parameter_names = ('amplitude', 'start', 'tau1', 'tau2')
+
+    @staticmethod
+    def evaluate(t, amplitude, start, tau1, tau2):
+        u = t - start
+        positive = u > 0
+        safe = np.where(positive, u, 1.0)
+        value = amplitude * np.exp(2 * np.sqrt(tau1 / tau2) - tau1 / safe - safe / tau2)
+        return np.where(positive, value, 0.0)
+
+    # Columns d/d(amplitude, start, tau1, tau2), from the derivatives of the log of the pulse
+    @staticmethod
+    def jacobian(t, amplitude, start, tau1, tau2):
+        u = t - start
+        positive = u > 0
+        safe = np.where(positive, u, 1.0)
+        value = np.where(positive, amplitude * np.exp(2 * np.sqrt(tau1 / tau2) - tau1 / safe - safe / tau2), 0.0)
+        return np.column_stack((
+            value / amplitude,
+            value * (1 / tau2 - tau1 / safe ** 2),
+            value * (1 / np.sqrt(tau1 * tau2) - 1 / safe),
+            value * (safe / tau2 ** 2 - np.sqrt(tau1) / tau2 ** 1.5),
+        ))
+
+    @staticmethod
+    def guess(t, peak_time, peak_rate, half_width):
+        # Rise ~ a third of the half width, decay ~ the rest; the peak is at start + sqrt(tau1 tau2)
+        tau1 = half_width / 3
+        tau2 = 2 * half_width
+        return [peak_rate, peak_time - np.sqrt(tau1 * tau2), tau1, tau2]
+
+    @staticmethod
+    def bounds(t, max_rate):
+        span = t[-1] - t[0]
+        return [0, t[0] - span, 1e-6 * span, 1e-6 * span], [2 * max_rate, t[-1], 10 * span, 10 * span]
+
+    # Peak time, peak rate and the standard deviation of a Gaussian with the same FWHM. The pulse is
+    # at half its peak where tau1 / u + u / tau2 = 2 sqrt(tau1 / tau2) + ln 2 = c (u = t - start), a
+    # quadratic in u whose roots are tau2 sqrt(c^2 - 4 tau1 / tau2) apart
+    @staticmethod
+    def peak(amplitude, start, tau1, tau2):
+        c = 2 * np.sqrt(tau1 / tau2) + np.log(2)
+        fwhm = tau2 * np.sqrt(c ** 2 - 4 * tau1 / tau2)
+        return start + np.sqrt(tau1 * tau2), amplitude, fwhm / FWHM_PER_STD
+
+PULSES = {GaussianPulse.name: GaussianPulse, FredPulse.name: FredPulse}
+
+class MultiPulseModel:
+    """
+    n_pulses pulses of one shape plus a constant background. Parameters are the pulse
+    parameters in order, then the background.
+    """
+
+    def __init__(self, pulse='gaussian', n_pulses=1):
+        self.pulse = PULSES[pulse] if isinstance(pulse, str) else pulse
+        self.n_pulses = n_pulses
+        self.per_pulse = len(self.pulse.parameter_names)
+
+    def split(self, parameters):
+        parameters = np.asarray(parameters, dtype=np.float64)
+        pulses = parameters[:-1].reshape(self.n_pulses, self.per_pulse)
+        return pulses, parameters[-1]
+
+    def evaluate(self, t, *parameters):
+        pulses, background = self.split(parameters)
+        total = np.full(np.shape(t), background, dtype=np.float64)
+        for pulse in pulses:
+            total += self.pulse.evaluate(t, *pulse)
+        return total
+
+    def jacobian(self, t, *parameters):
+        pulses, background = self.split(parameters)
+        columns = [self.pulse.jacobian(t, *pulse) for pulse in pulses]
+        columns.append(np.ones((len(t), 1)))
+        return np.hstack(columns)
+
+    # Initial parameters: the background from the lower quartile, then the n_pulses highest local
+    # maxima of the smoothed curve, each with its half width at half maximum
+    def initial_guess(self, t, rate):
+        background = float(np.percentile(rate, 25))
+        window = max(1, len(rate) // 200)
+        smooth = np.convolve(rate - background, np.ones(window) / window, mode='same')
+        is_peak = np.r_[False, (smooth[1:-1] >= smooth[:-2]) & (smooth[1:-1] > smooth[2:]), False]
+        candidates = np.flatnonzero(is_peak)
+        candidates = candidates[np.argsort(smooth[candidates])[::-1]]
+        guess = []
+        used = []
+        span = t[-1] - t[0]
+        for index in candidates:
+            if len(used) == self.n_pulses:
+                break
+            half = smooth[index] / 2
+            left = index
+            while left > 0 and smooth[left] > half:
+                left -= 1
+            right = index
+            while right < len(smooth) - 1 and smooth[right] > half:
+                right += 1
+            half_width = max((t[right] - t[left]) / 2, span / len(t))
+            if any(abs(t[index] - t[other]) < half_width for other in used):
+                continue
+            used.append(index)
+            guess += self.pulse.guess(t, t[index], smooth[index], half_width)
+        while len(used) < self.n_pulses:             # Fewer maxima than pulses: spread the rest evenly
+            position = len(used)
+            used.append(position)
+            guess += self.pulse.guess(t, t[0] + span * (position + 1) / (self.n_pulses + 1), rate.max() - background, span / (4 * self.n_pulses))
+        return guess + [background]
+
+    def bounds(self, t, rate):
+        lower, upper = self.pulse.bounds(t, rate.max())
+        return lower * self.n_pulses + [-np.inf], upper * self.n_pulses + [np.inf]
+
+class FitResult:
+    def __init__(self, path, pulse, n_pulses, parameters, errors, residual_rms, success=True, message=''):
+        self.path = path
+        self.pulse = pulse
+        self.n_pulses = n_pulses
+        self.parameters = parameters
+        self.errors = errors
+        self.residual_rms = residual_rms
+        self.success = success
+        self.message = message
+
+    def model(self):
+        return MultiPulseModel(self.pulse, self.n_pulses)
+
+    def pulses(self):
+        return self.model().split(self.parameters)[0]
+
+    def background(self):
+        return float(self.parameters[-1])
+
+    # (peak_time, peak_rate, gaussian std) of each pulse
+    def peaks(self):
+        pulse = PULSES[self.pulse]
+        return [pulse.peak(*parameters) for parameters in self.pulses()]
+
+    # Pulses as simulator bursts. grb.burst_addition() takes the variance as sigma, so sigma is the
+    # squared width; FRED pulses are approximated by a Gaussian with the same peak and FWHM.
+    # Amplitudes stay in the data's rate units (counts/s, as Poisson-sampled bursts use them).
+    def to_grbs(self, time_offset=0.0):
+        from grb import grb
+        return [grb(peak_time=time + time_offset, amplitude=rate, sigma=width ** 2) for time, rate, width in self.peaks()]
+
+    def to_burst_set(self, time_offset=0.0):
+        from grb import BurstSet
+        return BurstSet.from_grbs(self.to_grbs(time_offset))
+
+    # Store the pulses as the state's bursts and the brightest pulse as kind_A / kind_sigma
+    # (kind 'lgrb', 'sgrb' or 'default')
+    def to_global_state(self, state=None, kind='lgrb', time_offset=0.0):
+        from config import GlobalState
+        state = GlobalState() if state is None else state
+        state.bursts = self.to_burst_set(time_offset)
+        time, rate, width = max(self.peaks(), key=lambda peak: peak[1])
+        state.vars[kind + '_A'] = float(rate)
+        state.vars[kind + '_sigma'] = float(width ** 2)
+        return state
+
+    def to_dict(self):
+        model = self.model()
+        names = [name + '_' + str(i) for i in range(self.n_pulses) for name in model.pulse.parameter_names] + ['background']
+        return {
+            'path': self.path,
+            'pulse': self.pulse,
+            'n_pulses': self.n_pulses,
+            'parameters': dict(zip(names, np.asarray(self.parameters).tolist())),
+            'errors': dict(zip(names, np.asarray(self.errors).tolist())),
+            'residual_rms': self.residual_rms,
+            'success': self.success,
+            'message': self.message,
+        }
+
+def fit_curve(t, rate, pulse='gaussian', n_pulses=1, p0=None, path=None):
+    from scipy.optimize import curve_fit
+    t = np.asarray(t, dtype=np.float64)
+    rate = np.asarray(rate, dtype=np.float64)
+    model = MultiPulseModel(pulse, n_pulses)
+    p0 = model.initial_guess(t, rate) if p0 is None else p0
+    lower, upper = model.bounds(t, rate)
+    p0 = np.clip(p0, np.array(lower) + 1e-12, np.array(upper) - 1e-12)
+    try:
+        parameters, covariance = curve_fit(model.evaluate, t, rate, p0=p0, bounds=(lower, upper), jac=model.jacobian)
+    except (RuntimeError, ValueError) as error:
+        return FitResult(path, model.pulse.name, n_pulses, p0, np.full(len(p0), np.nan), np.nan, False, str(error))
+    with np.errstate(invalid='ignore'):
+        errors = np.sqrt(np.diag(covariance))
+    residual_rms = float(np.sqrt(np.mean((rate - model.evaluate(t, *parameters)) ** 2)))
+    return FitResult(path, model.pulse.name, n_pulses, parameters, errors, residual_rms)
+
+def fit_file(path, pulse='gaussian', n_pulses=1):
+    t, rate = load_light_curve(path)
+    return fit_curve(t, rate, pulse, n_pulses, path=path)
+
+def _fit_task(task):
+    return fit_file(*task)
+
+# Fit every file with the same model; workers=1 runs in-process, None uses every core
+def fit_files(paths, pulse='gaussian', n_pulses=1, workers=None):
+    tasks = [(path, pulse, n_pulses) for path in paths]
+    if workers == 1 or len(tasks) <= 1:
+        return [_fit_task(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return list(executor.map(_fit_task, tasks, chunksize=max(1, len(tasks) // ((workers or os.cpu_count()) * 4))))
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Fit multi-pulse models to .dat light curves')
+    parser.add_argument('files', nargs='+', help='.dat light curve files')
+    parser.add_argument('--model', choices=list(PULSES), default='gaussian')
+    parser.add_argument('--pulses', type=int, default=1, help='pulses per curve')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--json', help='write every fit to this JSON file')
+    parser.add_argument('--settings', help='save the first fit as a GlobalState file (bursts and lgrb_A / lgrb_sigma)')
+    args = parser.parse_args(argv)
+
+    fits = fit_files(args.files, args.model, args.pulses, args.workers)
+    for fit in fits:
+        status = 'rms ' + str(round(fit.residual_rms, 3)) if fit.success else 'failed: ' + fit.message
+        print(str(fit.path) + ': ' + status)
+        for time, rate, width in fit.peaks():
+            print('\tpeak ' + str(round(time, 3)) + 's, rate ' + str(round(rate, 2)) + ', width ' + str(round(width, 3)) + 's')
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump([fit.to_dict() for fit in fits], file, indent=4)
+    if args.settings and fits:
+        fits[0].to_global_state().save(args.settings)
+
+if __name__ == "__main__":
+    main()
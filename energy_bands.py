@@ -0,0 +1,131 @@
+import numpy as np
+
+from photon_source import MAX_ENERGY, MIN_ENERGY, SPECTRAL_INDEX
+from trigger_engine import TriggerEngine, bin_photons, running_averages
+
+# Energy-band-resolved binning and triggering
+#
+# Every 1s and event-by-event bin gets a row of per-band counts. Bins still close on the full photon
+# stream, so all bands share the timestamps of the single-band path and summing the bands gives its
+# counts back. Per-photon band labels come from one np.searchsorted over the band edges
+# (band_indices()); the binned counts avoid a per-photon label array and instead count, for each
+# inner edge, the photons at or above it with np.add.reduceat (int32 sums, about three times faster
+# than int64) over the bins' photon ranges. On the 10 kHz benchmark scenario the banded path measures
+# about 1.2-1.55x the single-band one (python benchmark.py, 'energy_bands'), so it sits at or just
+# above the ~1.5x target; the shared bin_photons() loop dominates both. The trigger can run on any
+# group of bands (the counts of the group are summed) and several groups are evaluated over the same bins.
+#
+# Band edges and trigger groups come from the 'energy_band_edges' and 'trigger_bands' settings, e.g.
+# edges [1, 10, 100, 1000] keV and groups [[0, 1, 2]] (all bands) or [[0], [1], [2]] (each band).
+# `python -m cli run --bands` (or replay --bands) evaluates them over a run and saves the banded curve.
+
+# Band of each energy: band k holds edges[k] <= E < edges[k + 1]; energies outside the edges are
+# put in the first or last band
+def band_indices(energies, edges):
+    bands = np.searchsorted(edges, energies, side='right') - 1
+    return np.clip(bands, 0, len(edges) - 2)
+
+# One boolean mask per inner edge, True where the photon is at or above it
+def edge_masks(energies, edges):
+    energies = np.asarray(energies)
+    return [energies >= edge for edge in edges[1:-1]]
+
+# Per-band counts of the bins that closed at close_indices, shape (bins, bands). Photon i belongs to
+# the first bin closing at or after it, as in bin_photons(); photons after the last close are dropped.
+def band_counts(masks, close_indices, n_bands):
+    counts = np.zeros((len(close_indices), n_bands))
+    if len(close_indices) == 0:
+        return counts
+    end = close_indices[-1] + 1
+    starts = np.concatenate(([0], close_indices[:-1] + 1))
+    above = [np.diff(close_indices, prepend=-1)]
+    above += [np.add.reduceat(mask[:end], starts, dtype=np.int32) for mask in masks]
+    above.append(0)
+    for band in range(n_bands):
+        counts[:, band] = above[band] - above[band + 1]
+    return counts
+
+def bin_photons_by_band(times, energies, bin_length, edges, start_time=0.0, masks=None):
+    if masks is None:
+        masks = edge_masks(energies, edges)
+    _, close_times, close_indices = bin_photons(times, bin_length, start_time)
+    return band_counts(masks, close_indices, len(edges) - 1), close_times, close_indices
+
+# Expected fraction of power-law photons (power_law_energies) in each band, used to split burst
+# counts that are added to the bins rather than sampled as photons
+def band_fractions(edges, index=SPECTRAL_INDEX, min_energy=MIN_ENERGY, max_energy=MAX_ENERGY):
+    edges = np.clip(np.asarray(edges, dtype=np.float64), min_energy, max_energy)
+    cumulative = edges ** (index + 1)
+    return np.diff(cumulative) / (max_energy ** (index + 1) - min_energy ** (index + 1))
+
+class BandedLightCurve:
+    """
+    Per-band 1s and event-by-event counts of one photon stream.
+
+    second_counts / ebe_counts have one row per bin and one column per band; select(group) sums a
+    group of bands. save() adds the arrays to a run_io.RunWriter and write_csv() exports the
+    event-by-event curve with one column per band.
+    """
+
+    def __init__(self, edges, second_counts, second_timestamps, ebe_counts, ebe_timestamps):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.second_counts = second_counts
+        self.second_timestamps = second_timestamps
+        self.ebe_counts = ebe_counts
+        self.ebe_timestamps = ebe_timestamps
+
+    def band_names(self):
+        return [str(lo) + '-' + str(hi) + ' keV' for lo, hi in zip(self.edges[:-1].tolist(), self.edges[1:].tolist())]
+
+    def select(self, group):
+        return self.second_counts[:, group].sum(axis=1), self.ebe_counts[:, group].sum(axis=1)
+
+    def save(self, writer):
+        writer.add_array('band_edges', self.edges)
+        writer.add_array('second_band_counts', self.second_counts)
+        writer.add_array('second_band_timestamps', self.second_timestamps)
+        writer.add_array('ebe_band_counts', self.ebe_counts)
+        writer.add_array('ebe_band_timestamps', self.ebe_timestamps)
+
+    def write_csv(self, file):
+        file.write(','.join(['time'] + self.band_names()) + '\n')
+        table = np.column_stack((self.ebe_timestamps, self.ebe_counts))
+        np.savetxt(file, table, delimiter=',', fmt='%.10g')
+
+def banded_light_curve(times, energies, edges, ebe_bin_length, bursts=(), index=SPECTRAL_INDEX):
+    """
+    Bin a photon stream per band. bursts (grb list or BurstSet) are added at each bin close as
+    sim() does, split over the bands with band_fractions(); leave them out when the stream already
+    holds Poisson-sampled burst photons.
+    """
+    from grb import as_burst_set
+    times = np.asarray(times, dtype=np.float64)
+    masks = edge_masks(energies, edges)
+    second_counts, second_timestamps, _ = bin_photons_by_band(times, None, 1, edges, masks=masks)
+    ebe_counts, ebe_timestamps, _ = bin_photons_by_band(times, None, ebe_bin_length, edges, masks=masks)
+    burst_set = as_burst_set(bursts)
+    if len(burst_set):
+        fractions = band_fractions(edges, index)
+        second_counts += np.outer(burst_set.evaluate(second_timestamps), fractions)
+        ebe_counts += np.outer(burst_set.evaluate(ebe_timestamps), fractions)
+    return BandedLightCurve(edges, second_counts, second_timestamps, ebe_counts, ebe_timestamps)
+
+def evaluate_bands(vars, times, energies, bursts=(), edges=None, trigger_bands=None, duration=None):
+    """
+    Run the trigger engine on each group of bands in trigger_bands over one photon stream.
+    Returns ({group: TriggerResult}, BandedLightCurve), groups keyed as tuples of band indices.
+    edges and trigger_bands default to the 'energy_band_edges' / 'trigger_bands' settings.
+    """
+    edges = vars['energy_band_edges'] if edges is None else edges
+    trigger_bands = vars['trigger_bands'] if trigger_bands is None else trigger_bands
+    engine = TriggerEngine.from_vars(vars)
+    times = np.asarray(times, dtype=np.float64)
+    curve = banded_light_curve(times, energies, edges, engine.ebe_bin_length, bursts)
+    results = {}
+    for group in trigger_bands:
+        group = tuple(group)
+        counts, ebe_counts = curve.select(list(group))
+        running_average = running_averages(counts, engine.running_avg_length)
+        results[group] = engine.evaluate(running_average, curve.second_timestamps, ebe_counts, curve.ebe_timestamps,
+                                         times, duration)
+    return results, curve
@@ -1,3 +1,5 @@
+import json
+import os
 import numpy as np
 from config import *
 # Gamma ray burst class with default values
@@ -15,4 +17,283 @@ class grb :
         return self.amplitude * np.exp(exponent)
     
     def __str__(self) :
-        return 'Peak time: ' + str(round(self.peak_time, 2)) + 's, A=' + str(self.amplitude) + ', sigma=' + str(self.sigma)
\ No newline at end of file
+        return 'Peak time: ' + str(round(self.peak_time, 2)) + 's, A=' + str(self.amplitude) + ', sigma=' + str(self.sigma)
+
+# Tabulated burst shape from a measured count-rate curve (e.g. curve_fitting/lgrb.dat)
+#
+# The curve is background subtracted, clipped at zero and normalised to a peak of 1, with times taken
+# relative to the peak. Its cumulative intensity is integrated once, so a TemplateBurst can be placed
+# at any peak time, amplitude and time scale and evaluated, integrated or Poisson sampled over whole
+# arrays of times with np.interp.
+#
+# Saved templates refer to files inside this repository by their path relative to it, so settings
+# and run headers load on any checkout; templates from anywhere else are saved with their curve.
+REPOSITORY_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TEMPLATE = os.path.join(REPOSITORY_DIR, 'curve_fitting', 'lgrb.dat')
+FWHM_PER_STD = 2 * np.sqrt(2 * np.log(2))
+
+class RateTemplate :
+    CACHE_SIZE = 16                 # Templates kept by from_file(), least recently used dropped first
+    _loaded = {}                    # (path, size, mtime, background) -> RateTemplate, in use order
+
+    def __init__(self, times, rates, background=None, path=None):
+        times = np.asarray(times, dtype=np.float64)
+        rates = np.asarray(rates, dtype=np.float64)
+        if len(times) < 2 :
+            raise ValueError('a rate template needs at least two points')
+        if background is None :
+            # Median of the first and last 5% of the curve
+            edge = max(1, len(rates) // 20)
+            background = float(np.median(np.concatenate((rates[:edge], rates[-edge:]))))
+        self.path = path
+        self.background = background
+        shape = np.maximum(rates - background, 0.0)
+        peak = int(np.argmax(shape))
+        self.peak_rate = float(shape[peak])
+        if self.peak_rate <= 0 :
+            raise ValueError('the rate curve never rises above its background')
+        self.offsets = times - times[peak]
+        self.shape = shape / self.peak_rate
+        self.cumulative = np.concatenate(([0.0], np.cumsum(np.diff(self.offsets) * (self.shape[1:] + self.shape[:-1]) / 2)))
+        self.start = float(self.offsets[0])
+        self.end = float(self.offsets[-1])
+
+        # Variance of the Gaussian with the same FWHM, the template's equivalent of grb.sigma
+        above = self.offsets[self.shape >= 0.5]
+        self.fwhm = float(above[-1] - above[0]) if len(above) > 1 else float(np.min(np.diff(self.offsets)))
+        self.sigma = (self.fwhm / FWHM_PER_STD) ** 2
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_TEMPLATE, background=None) :
+        from qdp_reader import read_light_curve
+        if not os.path.isabs(path) and not os.path.exists(path) :
+            path = os.path.join(REPOSITORY_DIR, path)       # Saved relative to the repository
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, background)
+        template = cls._loaded.pop(key, None)
+        if template is None :
+            times, rates = read_light_curve(path)
+            template = cls(times, rates, background, os.path.abspath(path))
+            while len(cls._loaded) >= cls.CACHE_SIZE :
+                del cls._loaded[next(iter(cls._loaded))]
+        cls._loaded[key] = template
+        return template
+
+    # Shape (peak 1) at offsets from the peak, zero outside the curve
+    def rate(self, offsets) :
+        return np.interp(offsets, self.offsets, self.shape, left=0.0, right=0.0)
+
+    # Integrated shape from the start of the curve up to each offset
+    def integral(self, offsets) :
+        return np.interp(offsets, self.offsets, self.cumulative)
+
+    # Offsets at which the integrated shape reaches each value
+    def inverse(self, values) :
+        return np.interp(values, self.cumulative, self.offsets)
+
+    def to_dict(self) :
+        if self.path is not None :
+            relative = os.path.relpath(self.path, REPOSITORY_DIR)
+            if not relative.startswith(os.pardir) :
+                return {'path': relative.replace(os.sep, '/'), 'background': self.background}
+        return {'offsets': self.offsets.tolist(), 'rates': (self.shape * self.peak_rate).tolist(), 'background': 0.0}
+
+    @classmethod
+    def from_dict(cls, data) :
+        if 'path' in data :
+            return cls.from_file(data['path'], data.get('background'))
+        return cls(data['offsets'], data['rates'], data.get('background', 0.0))
+
+class TemplateBurst :
+    """
+    Burst with the shape of a RateTemplate, usable wherever a grb is. amplitude is the peak rate
+    above background (defaults to the template's own) and time_scale stretches the shape in time.
+    sigma is the variance of a Gaussian with the same FWHM; setting it changes time_scale.
+    """
+
+    def __init__(self, template=None, peak_time=50, amplitude=None, time_scale=1.0):
+        if template is None or isinstance(template, str) :
+            template = RateTemplate.from_file(template or DEFAULT_TEMPLATE)
+        self.template = template
+        self.peak_time = peak_time
+        self.amplitude = template.peak_rate if amplitude is None else amplitude
+        self.time_scale = time_scale
+
+    @property
+    def sigma(self) :
+        return self.template.sigma * self.time_scale ** 2
+
+    @sigma.setter
+    def sigma(self, sigma) :
+        self.time_scale = float(np.sqrt(sigma / self.template.sigma))
+
+    def burst_addition(self, curr_time):
+        return self.amplitude * self.template.rate((curr_time - self.peak_time) / self.time_scale)
+
+    def to_dict(self) :
+        return {'template': self.template.to_dict(), 'peak_time': self.peak_time, 'amplitude': self.amplitude, 'time_scale': self.time_scale}
+
+    @classmethod
+    def from_dict(cls, data) :
+        return cls(RateTemplate.from_dict(data['template']), data['peak_time'], data['amplitude'], data.get('time_scale', 1.0))
+
+    def __str__(self) :
+        name = os.path.basename(self.template.path) if self.template.path else 'tabulated'
+        return 'Template ' + name + ': Peak time: ' + str(round(self.peak_time, 2)) + 's, A=' + str(self.amplitude) + ', sigma=' + str(round(self.sigma, 4))
+
+# Array-of-parameters form of a list of grb pulses, for evaluating many pulses at many times at once
+BURST_COLUMNS = ('peak_time', 'amplitude', 'sigma')       # Column order of burst tables
+
+class BurstSet :
+    DEFAULT_SUPPORT_SIGMAS = 10     # Pulses are treated as zero further than this many widths from their peak
+    CHUNK_SIZE = 4096               # Times evaluated per broadcast, bounds the (times x pulses) temporaries
+
+    def __init__(self, peak_times=(), amplitudes=(), sigmas=(), support_sigmas=DEFAULT_SUPPORT_SIGMAS, templates=()):
+        self.peak_times = np.asarray(peak_times, dtype=np.float64).ravel()
+        self.amplitudes = np.asarray(amplitudes, dtype=np.float64).ravel()
+        self.sigmas = np.asarray(sigmas, dtype=np.float64).ravel()
+        if not len(self.peak_times) == len(self.amplitudes) == len(self.sigmas) :
+            raise ValueError('peak_times, amplitudes and sigmas must have the same length')
+        self.support_sigmas = support_sigmas
+
+        # burst_addition() divides by 2 * sigma, so a pulse's width (standard deviation) is sqrt(sigma)
+        self.support = support_sigmas * np.sqrt(self.sigmas)
+        self.starts = self.peak_times - self.support
+        self.ends = self.peak_times + self.support
+
+        # TemplateBurst pulses, evaluated and sampled after the Gaussian ones (pulse indices follow theirs)
+        self.templates = list(templates)
+        self.template_starts = np.array([t.peak_time + t.time_scale * t.template.start for t in self.templates], dtype=np.float64)
+        self.template_ends = np.array([t.peak_time + t.time_scale * t.template.end for t in self.templates], dtype=np.float64)
+
+    @classmethod
+    def from_grbs(cls, bursts, support_sigmas=DEFAULT_SUPPORT_SIGMAS) :
+        bursts = list(bursts)
+        templates = [b for b in bursts if isinstance(b, TemplateBurst)]
+        bursts = [b for b in bursts if not isinstance(b, TemplateBurst)]
+        return cls([b.peak_time for b in bursts], [b.amplitude for b in bursts], [b.sigma for b in bursts], support_sigmas, templates)
+
+    def to_grbs(self) :
+        gaussians = [grb(peak_time=p, amplitude=a, sigma=s) for p, a, s in zip(self.peak_times.tolist(), self.amplitudes.tolist(), self.sigmas.tolist())]
+        return gaussians + self.templates
+
+    def __len__(self) :
+        return len(self.peak_times) + len(self.templates)
+
+    # Columnar form used in saved settings files: {'peak_times': [...], 'amplitudes': [...], 'sigmas': [...]},
+    # plus a 'templates' list of TemplateBurst.to_dict() when there are template bursts
+    def to_dict(self) :
+        columns = {'peak_times': self.peak_times.tolist(), 'amplitudes': self.amplitudes.tolist(), 'sigmas': self.sigmas.tolist()}
+        if self.templates :
+            columns['templates'] = [template.to_dict() for template in self.templates]
+        return columns
+
+    @classmethod
+    def from_dict(cls, columns, support_sigmas=DEFAULT_SUPPORT_SIGMAS) :
+        templates = [TemplateBurst.from_dict(data) for data in columns['templates']] if 'templates' in columns else []
+        return cls(columns['peak_times'], columns['amplitudes'], columns['sigmas'], support_sigmas, templates)
+
+    @classmethod
+    def from_file(cls, path, support_sigmas=DEFAULT_SUPPORT_SIGMAS) :
+        """
+        Bulk import a burst table, straight into arrays.
+
+        .csv/.txt   columns peak_time, amplitude, sigma; a header line naming them (in any order)
+                    is optional, '#' starts a comment
+        .json       a list of {peak_time, amplitude, sigma} objects (run_io and cli format), the
+                    columnar to_dict() form, or a settings file holding one under 'bursts';
+                    the only form that holds template bursts
+        .npy        a structured array with peak_time/amplitude/sigma fields or an (n, 3) or (3,) array
+        .npz        arrays named peak_times, amplitudes and sigmas
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.json' :
+            with open(path, 'r') as file :
+                data = json.load(file)
+            if isinstance(data, dict) and 'bursts' in data :
+                data = data['bursts']
+            if isinstance(data, dict) :
+                return cls.from_dict(data, support_sigmas)
+            templates = [TemplateBurst.from_dict(b) for b in data if 'template' in b]
+            data = [b for b in data if 'template' not in b]
+            return cls([b['peak_time'] for b in data], [b['amplitude'] for b in data], [b['sigma'] for b in data], support_sigmas, templates)
+        if extension == '.npz' :
+            with np.load(path) as data :
+                return cls.from_dict(data, support_sigmas)
+        if extension == '.npy' :
+            data = np.load(path)
+            if data.dtype.names :
+                data = np.atleast_1d(data)
+                return cls(data['peak_time'], data['amplitude'], data['sigma'], support_sigmas)
+            data = np.atleast_2d(data)          # A single burst may be saved as a plain (3,) array
+            return cls(data[:, 0], data[:, 1], data[:, 2], support_sigmas)
+
+        columns = list(BURST_COLUMNS)
+        skip = 0
+        with open(path, 'r') as file :
+            for line in file :
+                stripped = line.split('#')[0].strip()
+                if not stripped :
+                    skip += 1
+                    continue
+                names = [name.strip() for name in stripped.replace(',', ' ').split()]
+                # A header names the burst columns; anything else (inf and nan included) is data
+                if any(name in BURST_COLUMNS for name in names) :
+                    columns = names
+                    skip += 1
+                break
+        delimiter = ',' if extension == '.csv' else None
+        data = np.loadtxt(path, delimiter=delimiter, skiprows=skip, ndmin=2,
+                          usecols=[columns.index(name) for name in BURST_COLUMNS])
+        return cls(data[:, 0], data[:, 1], data[:, 2], support_sigmas)
+
+    # Write the table as .csv, .json (columnar), .npy (structured) or .npz, chosen by extension; any
+    # other extension gets a whitespace separated table, as from_file() reads .txt
+    def save(self, path) :
+        extension = os.path.splitext(path)[1].lower()
+        if self.templates and extension != '.json' :
+            raise ValueError('template bursts can only be saved to .json')
+        if extension == '.json' :
+            with open(path, 'w') as file :
+                json.dump(self.to_dict(), file)
+        elif extension == '.npz' :
+            np.savez(path, **{k: np.asarray(v) for k, v in self.to_dict().items()})
+        elif extension == '.npy' :
+            table = np.zeros(len(self), dtype=[(name, '<f8') for name in BURST_COLUMNS])
+            table['peak_time'], table['amplitude'], table['sigma'] = self.peak_times, self.amplitudes, self.sigmas
+            np.save(path, table)
+        else :
+            delimiter = ',' if extension == '.csv' else ' '
+            np.savetxt(path, np.column_stack((self.peak_times, self.amplitudes, self.sigmas)),
+                       delimiter=delimiter, header=delimiter.join(BURST_COLUMNS), comments='', fmt='%.17g')
+
+    # Summed burst_addition() of every pulse, for a scalar time or an array of times
+    def evaluate(self, times) :
+        scalar = np.ndim(times) == 0
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        total = np.zeros(times.shape, dtype=np.float64)
+        if len(self) == 0 or len(times) == 0 :
+            return float(total[0]) if scalar else total
+
+        flat_times = times.ravel()
+        flat_total = total.ravel()
+        for start in range(0, len(flat_times), self.CHUNK_SIZE) :
+            chunk = flat_times[start:start + self.CHUNK_SIZE]
+            chunk_min, chunk_max = chunk.min(), chunk.max()
+            # Only pulses whose support overlaps this chunk of times are evaluated
+            for index in np.flatnonzero((self.template_starts <= chunk_max) & (self.template_ends >= chunk_min)) :
+                burst = self.templates[index]
+                flat_total[start:start + len(chunk)] += burst.amplitude * burst.template.rate((chunk - burst.peak_time) / burst.time_scale)
+            active = (self.starts <= chunk_max) & (self.ends >= chunk_min)
+            if not active.any() :
+                continue
+            dt = chunk[:, None] - self.peak_times[active]
+            values = self.amplitudes[active] * np.exp((dt ** 2) / (-2 * self.sigmas[active]))
+            flat_total[start:start + len(chunk)] += np.where(np.abs(dt) <= self.support[active], values, 0.0).sum(axis=1)
+        return float(total[0]) if scalar else total
+
+# Accept either a BurstSet or an iterable of grb objects
+def as_burst_set(bursts) :
+    if isinstance(bursts, BurstSet) :
+        return bursts
+    return BurstSet.from_grbs(bursts)
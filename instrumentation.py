@@ -0,0 +1,126 @@
+import io
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Opt-in instrumentation for the simulator
+#
+# Pass an Instrumentation to Simulator.run(instrumentation=...) to collect cumulative per-stage
+# timers and event counters. Without one the simulator only pays a None check per bin close.
+# Stages recorded by Simulator.run():
+#   photon_generation   drawing photon blocks from the source (RNG, file reading)
+#   burst_evaluation    evaluating the BurstSet at each block's bin closes
+#   bin_close_loop      the loop over each block's bin closes as a whole (includes trigger_evaluation
+#                       and the bin closing part of binning)
+#   trigger_evaluation  enter threshold and exit checks
+#   binning             finding each block's bin closes and closing 1s and event-by-event bins
+#                       (queues, running average, lookback)
+#   photon_list         copying blocks into the photon ring buffer and photon sink
+# sim.py adds 'plotting' around display_plots(); stages outside the run have no share of 'total'.
+
+RUN_STAGES = ('total', 'photon_generation', 'burst_evaluation', 'bin_close_loop', 'trigger_evaluation', 'binning', 'photon_list')
+
+class Instrumentation:
+    def __init__(self):
+        self.timers = defaultdict(float)
+        self.counters = defaultdict(int)
+
+    def add_time(self, stage, seconds):
+        self.timers[stage] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    # Iterate while charging the time spent producing each item to stage
+    def timed_iter(self, iterable, stage):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.timers[stage] += time.perf_counter() - start
+                return
+            self.timers[stage] += time.perf_counter() - start
+            yield item
+
+    # Machine-readable snapshot: {'timers': {stage: s}, 'counters': {name: n}, 'photons_per_second': x}
+    def metrics(self):
+        metrics = {'timers': dict(self.timers), 'counters': dict(self.counters)}
+        total = self.timers.get('total', 0)
+        if total > 0 and 'photons_generated' in self.counters:
+            metrics['photons_per_second'] = self.counters['photons_generated'] / total
+        return metrics
+
+    def summary_table(self):
+        total = self.timers.get('total', 0)
+        lines = ['Stage'.ljust(24) + 'Seconds'.rjust(12) + '% of run'.rjust(12)]
+        for stage, seconds in sorted(self.timers.items(), key=lambda item: -item[1]):
+            share = ('%.1f' % (100 * seconds / total)) if total and stage in RUN_STAGES else '-'
+            lines.append(stage.ljust(24) + ('%.4f' % seconds).rjust(12) + share.rjust(12))
+        lines.append('')
+        lines.append('Counter'.ljust(24) + 'Count'.rjust(12))
+        for name, value in sorted(self.counters.items()):
+            lines.append(name.ljust(24) + str(value).rjust(12))
+        return '\n'.join(lines)
+
+# Run fn() under a profiler and print the report. profiler is 'cprofile' or 'pyinstrument' (optional
+# dependency). Returns fn's return value.
+def profile_call(fn, profiler='cprofile', limit=25, output=None):
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError('pyinstrument is not installed, use profiler=\'cprofile\' or pip install pyinstrument')
+        profile = Profiler()
+        profile.start()
+        try:
+            value = fn()
+        finally:
+            profile.stop()
+        report = profile.output_text(unicode=True, color=False)
+    else:
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        value = profile.runcall(fn)
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(limit)
+        report = stream.getvalue()
+
+    if output is None:
+        print(report)
+    else:
+        with open(output, 'w') as file:
+            file.write(report)
+    return value
+
+def main(argv=None):
+    import argparse
+    from config import GlobalState
+    from simulator import Simulator
+
+    parser = argparse.ArgumentParser(description='Run one instrumented simulation and print per-stage timings')
+    parser.add_argument('--config', help='GlobalState JSON file')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], help='also run under a profiler')
+    args = parser.parse_args(argv)
+
+    state = GlobalState()
+    if args.config:
+        state.load(args.config)
+    instrumentation = Instrumentation()
+    run = lambda: Simulator(state).run(instrumentation=instrumentation)
+    result = profile_call(run, args.profile) if args.profile else run()
+    print(instrumentation.summary_table())
+    print('\nTriggered: ' + str(result.triggered_timestamp) + ', exited: ' + str(result.exit_timestamp))
+
+if __name__ == "__main__":
+    main()
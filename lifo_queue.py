@@ -1,20 +1,38 @@
 from collections import deque
 # Define the FixedLengthLIFOQueue class for photon counts
 class FixedLengthLIFOQueue:
+    # Number of pushes between exact recomputations of the running statistics, so rounding error
+    # from the incremental updates can't build up over multi-hour runs
+    RESYNC_INTERVAL = 100000
+
     def __init__(self, length):
         self.queue = deque(maxlen=length)       # Initialize the deque with a fixed length
         self.running_sum = 0                    # Initialize the running sum
+        self.running_mean = 0.0                 # Welford running mean
+        self.running_m2 = 0.0                   # Welford sum of squared deviations from the mean
+        self.pushes_since_resync = 0
 
     def push(self, item):
+        if self.queue.maxlen == 0:
+            return                              # Nothing is ever stored in a zero-length queue
         if len(self.queue) == self.queue.maxlen:
-            self.running_sum -= self.queue[-1]  # Subtract the rightmost item if the queue is full
+            evicted = self.queue.pop()          # appendleft would drop the rightmost item, so remove it explicitly
+            self.running_sum -= evicted         # Subtract the item that is actually dropped
+            self._replace_stat(evicted, item)
+        else:
+            self._add_stat(item)
         self.queue.appendleft(item)             # Append item to the left end of the queue
         self.running_sum += item                # Add the new item to the running sum
 
+        self.pushes_since_resync += 1
+        if self.pushes_since_resync >= self.RESYNC_INTERVAL:
+            self.resync()
+
     def pop(self):
         if self.queue:
             item = self.queue.pop()             # Pop the last item from the right end of the queue
             self.running_sum -= item            # Subtract the popped item from the running sum
+            self._remove_stat(item)
             return item
         else:
             return None                         # Return None if the queue is empty
@@ -45,4 +63,47 @@ class FixedLengthLIFOQueue:
             return self.running_sum / len(self.queue)  # Return the running average
         else:
             return 0                                   # Return 0 if the queue is empty
-        
\ No newline at end of file
+
+    def get_running_variance(self):
+        if self.queue:
+            return self.running_m2 / len(self.queue)   # Population variance, same as np.var
+        else:
+            return 0                                   # Return 0 if the queue is empty
+
+    def get_running_std(self):
+        return self.get_running_variance() ** 0.5      # Population standard deviation, same as np.std
+
+    # Recompute the running statistics exactly from the items in the queue
+    def resync(self):
+        n = len(self.queue)
+        self.running_sum = sum(self.queue)
+        self.running_mean = self.running_sum / n if n else 0.0
+        self.running_m2 = sum((x - self.running_mean) ** 2 for x in self.queue)
+        self.pushes_since_resync = 0
+
+    # Welford updates for adding, removing and replacing one item
+    def _add_stat(self, item):
+        n = len(self.queue) + 1
+        delta = item - self.running_mean
+        self.running_mean += delta / n
+        self.running_m2 += delta * (item - self.running_mean)
+
+    def _remove_stat(self, item):
+        n = len(self.queue)                     # Size after the item was removed
+        if n == 0:
+            self.running_mean = 0.0
+            self.running_m2 = 0.0
+            return
+        if n == 1:
+            self.running_mean = float(self.queue[0])   # One item left: its variance is exactly 0
+            self.running_m2 = 0.0
+            return
+        delta = item - self.running_mean
+        self.running_mean -= delta / n
+        self.running_m2 = max(self.running_m2 - delta * (item - self.running_mean), 0.0)
+
+    def _replace_stat(self, old, new):
+        n = len(self.queue) + 1                 # The old item has already been popped
+        old_mean = self.running_mean
+        self.running_mean += (new - old) / n
+        self.running_m2 = max(self.running_m2 + (new - old) * (new - self.running_mean + old - old_mean), 0.0)
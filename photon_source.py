@@ -0,0 +1,162 @@
+import numpy as np
+
+# Default background spectrum, the power law sim.py has always drawn energies from
+SPECTRAL_INDEX = -0.1       # Index of the spectrum
+MIN_ENERGY = 1.0            # Minimum energy (keV)
+MAX_ENERGY = 1000.0         # Maximum energy (keV)
+
+DEFAULT_BLOCK_SIZE = 65536  # Number of photons generated per block
+
+# Vectorized inverse-CDF sampling of the background power law
+def power_law_energies(rng, size, index=SPECTRAL_INDEX, min_energy=MIN_ENERGY, max_energy=MAX_ENERGY):
+    random_values = rng.random(size)
+    low = min_energy ** (index + 1)
+    high = max_energy ** (index + 1)
+    return ((high - low) * random_values + low) ** (1 / (index + 1))
+
+class PhotonSource:
+    """
+    Background photon generator producing arrival times and energies in blocks.
+
+    Iterating yields (times, energies) pairs of float64 arrays, where times are
+    absolute arrival times (cumulative sum of exponential gaps) and energies are
+    drawn from the power law spectrum. Photons at or after `duration` are never
+    yielded; duration=None generates forever.
+
+    Reproducibility: gaps and energies come from two independent streams spawned
+    from np.random.SeedSequence(random_seed), so the same random_seed always gives
+    the same photon stream regardless of block_size. The stream is not the same
+    as the per-photon np.random sequence sim.py drew from before.
+    """
+
+    def __init__(self, rate, duration=None, random_seed=None, block_size=DEFAULT_BLOCK_SIZE,
+                 index=SPECTRAL_INDEX, min_energy=MIN_ENERGY, max_energy=MAX_ENERGY, start_time=0.0):
+        self.rate = rate
+        self.duration = duration
+        self.random_seed = random_seed
+        self.block_size = block_size
+        self.index = index
+        self.min_energy = min_energy
+        self.max_energy = max_energy
+        self.start_time = start_time
+
+    def __iter__(self):
+        time_seed, energy_seed = np.random.SeedSequence(self.random_seed).spawn(2)
+        time_rng = np.random.default_rng(time_seed)
+        energy_rng = np.random.default_rng(energy_seed)
+
+        last_time = self.start_time
+        while self.duration is None or last_time < self.duration:
+            gaps = time_rng.exponential(1 / self.rate, self.block_size)
+            times = last_time + np.cumsum(gaps)
+            energies = power_law_energies(energy_rng, self.block_size, self.index, self.min_energy, self.max_energy)
+            last_time = times[-1]
+
+            if self.duration is not None and last_time >= self.duration:
+                keep = np.searchsorted(times, self.duration, side='left')
+                times = times[:keep]
+                energies = energies[:keep]
+            if len(times) > 0:
+                yield times, energies
+
+    # Flattens the blocks into (time_to_next_event, current_time, photon_energy) tuples for per-photon loops
+    def iter_photons(self):
+        previous_time = self.start_time
+        for times, energies in self:
+            gaps = np.diff(times, prepend=previous_time)
+            previous_time = times[-1]
+            yield from zip(gaps.tolist(), times.tolist(), energies.tolist())
+
+# Source tag of background photons; burst photons are tagged with their pulse index + 1
+BACKGROUND = 0
+
+# Poisson-sample the photons of every pulse in burst_set over [start, end). Each pulse is an
+# inhomogeneous Poisson process with intensity burst_addition(t) counts/s, truncated to the BurstSet
+# support window: the photon count is Poisson with the integrated intensity and the arrival times
+# come from the inverse CDF of the Gaussian profile, or of the precomputed cumulative intensity for
+# template bursts. Returns unsorted (times, pulse indices).
+def burst_photon_times(burst_set, rng, start, end):
+    from scipy.special import ndtr, ndtri
+
+    lo = np.maximum(burst_set.starts, start)
+    hi = np.minimum(burst_set.ends, end)
+    active = np.flatnonzero(lo < hi)
+    if len(active) == 0:
+        times, pulses = np.array([], dtype=np.float64), np.array([], dtype=np.int64)
+    else:
+        peaks = burst_set.peak_times[active]
+        widths = np.sqrt(burst_set.sigmas[active])
+        cdf_lo = ndtr((lo[active] - peaks) / widths)
+        cdf_hi = ndtr((hi[active] - peaks) / widths)
+        expected = burst_set.amplitudes[active] * widths * np.sqrt(2 * np.pi) * (cdf_hi - cdf_lo)
+        counts = rng.poisson(np.maximum(expected, 0.0))
+
+        pulse = np.repeat(np.arange(len(active)), counts)
+        u = rng.uniform(cdf_lo[pulse], cdf_hi[pulse])
+        times = peaks[pulse] + widths[pulse] * ndtri(u)
+        times = np.clip(times, lo[active][pulse], np.nextafter(hi[active][pulse], -np.inf))
+        pulses = active[pulse]
+    if not burst_set.templates:
+        return times, pulses
+
+    all_times, all_pulses = [times], [pulses]
+    for index, burst in enumerate(burst_set.templates, start=len(burst_set.peak_times)):
+        template, scale = burst.template, burst.time_scale
+        offset_lo = max(template.start, (start - burst.peak_time) / scale)
+        offset_hi = min(template.end, (end - burst.peak_time) / scale)
+        if offset_lo >= offset_hi:
+            continue
+        integral_lo, integral_hi = template.integral([offset_lo, offset_hi])
+        count = rng.poisson(max(burst.amplitude * scale * (integral_hi - integral_lo), 0.0))
+        if count == 0:
+            continue
+        offsets = template.inverse(rng.uniform(integral_lo, integral_hi, count))
+        template_times = np.clip(burst.peak_time + scale * offsets, start, np.nextafter(end, -np.inf))
+        all_times.append(template_times)
+        all_pulses.append(np.full(count, index, dtype=np.int64))
+    return np.concatenate(all_times), np.concatenate(all_pulses)
+
+class PoissonBurstSource:
+    """
+    Background photons merged in time order with Poisson-sampled burst photons.
+
+    Wraps a PhotonSource and, for the time span of each background block, samples the photons of
+    every pulse in bursts (a BurstSet or list of grb) with burst_photon_times(). Iterating yields
+    (times, energies, sources) where sources is BACKGROUND or the burst's pulse index + 1. Burst
+    photons use their own random stream spawned from random_seed, so adding bursts leaves the
+    background photons unchanged.
+    """
+
+    def __init__(self, background, bursts, random_seed=None, index=SPECTRAL_INDEX, min_energy=MIN_ENERGY, max_energy=MAX_ENERGY):
+        from grb import as_burst_set
+        self.background = background
+        self.burst_set = as_burst_set(bursts)
+        self.duration = background.duration
+        self.random_seed = background.random_seed if random_seed is None else random_seed
+        self.index = index
+        self.min_energy = min_energy
+        self.max_energy = max_energy
+
+    def __iter__(self):
+        rng = np.random.default_rng(np.random.SeedSequence(self.random_seed, spawn_key=(2,)))
+        window_start = self.background.start_time
+        for times, energies in self.background:
+            # Each window runs up to and including the block's last photon; the final one runs to duration
+            window_end = np.nextafter(times[-1], np.inf)
+            yield self._merge(rng, window_start, window_end, times, energies)
+            window_start = window_end
+        if self.background.duration is not None and window_start < self.background.duration:
+            empty = np.array([], dtype=np.float64)
+            block = self._merge(rng, window_start, self.background.duration, empty, empty)
+            if len(block[0]) > 0:
+                yield block
+
+    def _merge(self, rng, start, end, times, energies):
+        burst_times, pulses = burst_photon_times(self.burst_set, rng, start, end)
+        if len(burst_times) == 0:
+            return times, energies, np.full(len(times), BACKGROUND, dtype=np.int32)
+        burst_energies = power_law_energies(rng, len(burst_times), self.index, self.min_energy, self.max_energy)
+        all_times = np.concatenate((times, burst_times))
+        order = np.argsort(all_times, kind='stable')
+        sources = np.concatenate((np.full(len(times), BACKGROUND, dtype=np.int32), (pulses + 1).astype(np.int32)))
+        return all_times[order], np.concatenate((energies, burst_energies))[order], sources[order]
@@ -0,0 +1,317 @@
+import asyncio
+import contextlib
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+from config import GlobalState
+from photon_source import PhotonSource
+from ring_buffer import PHOTON_DTYPE
+from streaming_trigger import StreamingBinner, StreamingTrigger
+
+# asyncio event pipeline
+#
+# Generation, binning, triggering and recording run as separate tasks:
+#
+#   source --queue--> binner --queue--> trigger --+--queue--> sink
+#                                                 +--queue--> sink ...
+#
+# The source, binner and trigger queues are bounded and apply backpressure: a slow stage makes
+# the source wait. Each sink has its own bounded block queue and, by default, drops its oldest
+# block when full instead of waiting, so a slow sink (plotting) never stalls ingestion; the number
+# of dropped blocks is kept on the sink. Recording sinks wait instead, so recordings are lossless.
+# Trigger events go to each sink on a separate unbounded queue and are never dropped; a sink gets a
+# block's events right after the block (or after the next block it receives, if that one was
+# dropped). Blocking sinks run their hooks in a worker thread. If any stage or sink raises, the
+# other tasks are cancelled and Pipeline.run() re-raises the exception.
+#
+# Sources are any iterable of (times, energies[, ...]) blocks (PhotonSource, PoissonBurstSource,
+# tte_reader.EventFileSource; read in a worker thread) or async iterables such as
+# FakeDetectorSource and SocketSource.
+
+DEFAULT_QUEUE_SIZE = 8          # Blocks held between two stages
+DEFAULT_SINK_QUEUE_SIZE = 64
+
+class BinnedBlock:
+    def __init__(self, times, energies, second_closes, second_counts, ebe_closes, ebe_counts):
+        self.times = times
+        self.energies = energies
+        self.second_closes = second_closes          # Indices of the photons closing 1s bins
+        self.second_counts = second_counts
+        self.ebe_closes = ebe_closes                # Indices of the photons closing event-by-event bins
+        self.ebe_counts = ebe_counts
+
+class Sink:
+    """
+    Base class for pipeline sinks; override the hooks that are needed.
+
+    on_block() receives every BinnedBlock and on_event() every streaming_trigger.TriggerEvent, in
+    order. overflow is 'drop_oldest' (never stall ingestion) or 'wait' (backpressure, lossless);
+    it only applies to blocks, events are always delivered.
+    Sinks with blocking = True have their hooks run in a worker thread.
+    """
+
+    blocking = False
+    overflow = 'drop_oldest'
+    queue_size = DEFAULT_SINK_QUEUE_SIZE
+
+    def on_block(self, block):
+        pass
+
+    def on_event(self, event):
+        pass
+
+    def close(self):
+        pass
+
+# Collects the event-by-event light curve and the trigger events
+class LightCurveSink(Sink):
+    def __init__(self):
+        self.counts = []
+        self.timestamps = []
+        self.events = []
+        self.dropped = 0
+
+    def on_block(self, block):
+        self.counts.append(block.ebe_counts)
+        self.timestamps.append(block.times[block.ebe_closes])
+
+    def on_event(self, event):
+        self.events.append(event)
+
+    def light_curve(self):
+        if not self.counts:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate(self.counts), np.concatenate(self.timestamps)
+
+# Writes the photon stream and trigger markers as a run_io run directory. Waits for the disk by
+# default; overflow='drop_oldest' keeps ingestion going at the cost of gaps in the photon file.
+class RecordingSink(Sink):
+    blocking = True
+
+    def __init__(self, path, config=None, overflow='wait', queue_size=DEFAULT_SINK_QUEUE_SIZE):
+        from run_io import RunWriter
+        self.writer = RunWriter(path, config)
+        self.overflow = overflow
+        self.queue_size = queue_size
+        self.dropped = 0
+
+    def on_block(self, block):
+        self.writer.write_photons(block.times, block.energies)
+
+    def on_event(self, event):
+        if event.kind == 'enter':
+            self.writer.header['triggered_timestamp'] = event.time
+        else:
+            self.writer.header['exit_timestamp'] = event.time
+        self.writer.header.setdefault('events', []).append({'kind': event.kind, 'time': event.time})
+
+    def close(self):
+        self.writer.header['dropped_blocks'] = self.dropped
+        self.writer.close()
+
+class FakeDetectorSource:
+    """
+    Local stand-in for a detector: emits background photons at `rate` in slices of
+    block_seconds of detector time. With speed=1 the slices are paced to the wall clock, larger
+    speeds run faster than real time and speed=None emits as fast as the consumer accepts.
+    duration=None runs until the pipeline is cancelled.
+    """
+
+    def __init__(self, rate, duration=None, random_seed=None, block_seconds=0.1, speed=1.0):
+        self.rate = rate
+        self.duration = duration
+        self.random_seed = random_seed
+        self.block_seconds = block_seconds
+        self.speed = speed
+
+    async def __aiter__(self):
+        photons = iter(PhotonSource(self.rate, self.duration, self.random_seed, block_size=max(1, int(self.rate * self.block_seconds))))
+        pending_times, pending_energies = np.zeros(0), np.zeros(0)
+        slice_end = self.block_seconds
+        wall_start = perf_counter()
+        exhausted = False
+        while not exhausted or len(pending_times):
+            while not exhausted and (len(pending_times) == 0 or pending_times[-1] < slice_end):
+                try:
+                    times, energies = next(photons)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending_times = np.concatenate((pending_times, times))
+                pending_energies = np.concatenate((pending_energies, energies))
+            cut = np.searchsorted(pending_times, slice_end, side='left') if not exhausted else len(pending_times)
+            if self.speed:
+                await asyncio.sleep(max(0.0, wall_start + slice_end / self.speed - perf_counter()))
+            else:
+                await asyncio.sleep(0)
+            if cut:
+                yield pending_times[:cut], pending_energies[:cut]
+                pending_times, pending_energies = pending_times[cut:], pending_energies[cut:]
+            slice_end += self.block_seconds
+
+class SocketSource:
+    """
+    Photons read from a TCP stream of raw PHOTON_DTYPE records (the photons.bin format of run_io,
+    e.g. served with `nc -l 9000 < photons.bin`). Partial records are kept for the next read.
+    """
+
+    def __init__(self, host, port, read_bytes=1 << 16):
+        self.host = host
+        self.port = port
+        self.read_bytes = read_bytes
+        self.duration = None
+
+    async def __aiter__(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        record_size = np.dtype(PHOTON_DTYPE).itemsize
+        remainder = b''
+        try:
+            while True:
+                data = await reader.read(self.read_bytes)
+                if not data:
+                    break
+                data = remainder + data
+                cut = len(data) - len(data) % record_size
+                data, remainder = data[:cut], data[cut:]
+                if data:
+                    records = np.frombuffer(data, dtype=PHOTON_DTYPE)
+                    yield records['time'].astype(np.float64), records['energy'].astype(np.float64)
+        finally:
+            writer.close()
+
+# Async iteration over either kind of source; synchronous sources are read in a worker thread
+async def source_blocks(source):
+    if hasattr(source, '__aiter__'):
+        async for block in source:
+            yield block[0], block[1]
+        return
+    loop = asyncio.get_running_loop()
+    iterator = iter(source)
+    while True:
+        block = await loop.run_in_executor(None, next, iterator, None)
+        if block is None:
+            return
+        yield block[0], block[1]
+
+class Pipeline:
+    """
+    Source -> binner -> trigger -> sinks, each stage its own task.
+
+    config is a GlobalState or its vars dict; trigger arguments (on_enter, on_exit, rearm, ...)
+    are passed to streaming_trigger.StreamingTrigger. await run() processes the whole source and
+    returns the trigger, whose triggered/exit timestamps and latency_stats() describe the run; an
+    exception in any stage or sink cancels the rest and is raised from run().
+    """
+
+    def __init__(self, source, config=None, sinks=(), queue_size=DEFAULT_QUEUE_SIZE, **trigger_kwargs):
+        if config is None:
+            config = GlobalState()
+        vars = config.vars if isinstance(config, GlobalState) else config
+        self.source = source
+        self.sinks = list(sinks)
+        self.queue_size = queue_size
+        self.trigger = StreamingTrigger(vars, **trigger_kwargs)
+        self.second_binner = StreamingBinner(1)
+        self.ebe_binner = StreamingBinner(vars['ebe_bin_length'])
+
+    async def run(self):
+        binner_queue = asyncio.Queue(self.queue_size)
+        trigger_queue = asyncio.Queue(self.queue_size)
+        sink_queues = [(asyncio.Queue(sink.queue_size), deque()) for sink in self.sinks]
+        sink_tasks = [asyncio.create_task(self._sink_stage(sink, blocks, events)) for sink, (blocks, events) in zip(self.sinks, sink_queues)]
+        stages = [
+            asyncio.create_task(self._source_stage(binner_queue)),
+            asyncio.create_task(self._binner_stage(binner_queue, trigger_queue)),
+            asyncio.create_task(self._trigger_stage(trigger_queue, sink_queues)),
+        ]
+        tasks = stages + sink_tasks
+        try:
+            # A stage or sink that fails would leave the tasks feeding it waiting forever, so the
+            # first exception stops the whole pipeline
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in tasks:
+                if task in done and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let the cancelled tasks finish so their cleanup runs and none is left pending
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.trigger
+
+    async def _source_stage(self, output):
+        async for times, energies in source_blocks(self.source):
+            await output.put((np.asarray(times, dtype=np.float64), energies))
+        await output.put(None)
+
+    async def _binner_stage(self, input, output):
+        while True:
+            block = await input.get()
+            if block is None:
+                break
+            times, energies = block
+            second_closes, second_counts = self.second_binner.bin_block(times)
+            ebe_closes, ebe_counts = self.ebe_binner.bin_block(times)
+            await output.put(BinnedBlock(times, energies, second_closes, second_counts, ebe_closes, ebe_counts))
+        await output.put(None)
+
+    # Blocks are numbered so each sink can hand out a block's events right after it
+    async def _trigger_stage(self, input, sink_queues):
+        sequence = 0
+        while True:
+            block = await input.get()
+            if block is None:
+                break
+            events = self.trigger.push_binned(block.times, block.second_closes, block.second_counts,
+                                              block.ebe_closes, block.ebe_counts)
+            for sink, (blocks, sink_events) in zip(self.sinks, sink_queues):
+                sink_events.extend((sequence, event) for event in events)
+                await self._offer(sink, blocks, (sequence, block))
+            sequence += 1
+        for blocks, sink_events in sink_queues:
+            await blocks.put(None)
+
+    async def _offer(self, sink, queue, item):
+        if sink.overflow == 'wait':
+            await queue.put(item)
+            return
+        while queue.full():
+            queue.get_nowait()
+            sink.dropped = getattr(sink, 'dropped', 0) + 1
+        queue.put_nowait(item)
+
+    async def _sink_stage(self, sink, blocks, events):
+        loop = asyncio.get_running_loop()
+
+        async def call(hook, item):
+            if sink.blocking:
+                await loop.run_in_executor(None, hook, item)
+            else:
+                hook(item)
+
+        try:
+            while True:
+                item = await blocks.get()
+                if item is None:
+                    break
+                sequence, block = item
+                await call(sink.on_block, block)
+                while events and events[0][0] <= sequence:
+                    await call(sink.on_event, events.popleft()[1])
+            while events:
+                await call(sink.on_event, events.popleft()[1])
+        except BaseException:
+            # Stopped by its own error or by the pipeline cancelling it: still close the sink (e.g.
+            # write a recording's header) without hiding the exception that stopped it
+            with contextlib.suppress(Exception):
+                sink.close()
+            raise
+        if sink.blocking:
+            await loop.run_in_executor(None, sink.close)
+        else:
+            sink.close()
+
+def run_pipeline(source, config=None, sinks=(), **kwargs):
+    return asyncio.run(Pipeline(source, config, sinks, **kwargs).run())
@@ -0,0 +1,233 @@
+from time import perf_counter
+
+import numpy as np
+
+# Plotting from NumPy arrays
+#
+# Long curves are min-max decimated to the pixel width of the axes before they are drawn: each pixel
+# column keeps the lowest and highest sample it covers, so spikes survive but a 10,000 s run draws
+# ~2 points per pixel instead of one marker and error bar per second. Curves of up to 2 points per
+# pixel are drawn as before (markers, error bars, stairs).
+#
+#   figure = result_figure(result, headless=True)      # Agg canvas, no pyplot / GUI needed
+#   save_figure(figure, 'run.png')
+#
+#   live = LivePlot()                                   # non-blocking, blitted view while a run goes
+#   result = Simulator(state, bursts).run(bin_sink=live.bin_sink)
+#   live.finish(result)
+
+DEFAULT_PIXELS = 1000           # Used when the axes has no size yet
+DEFAULT_INTERVAL = 0.1          # Seconds between live redraws
+
+# Width of the axes in pixels
+def axis_pixels(ax):
+    try:
+        width = int(ax.get_window_extent().width)
+    except (AttributeError, RuntimeError):
+        return DEFAULT_PIXELS
+    return width if width > 0 else DEFAULT_PIXELS
+
+# Start index of each of (at most) buckets equal index ranges over n samples
+def bucket_starts(n, buckets):
+    return np.unique((np.arange(buckets) * n) // buckets)
+
+# Keep the minimum and maximum of each of buckets index ranges, in the order they occur
+def minmax_decimate(x, y, buckets):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    if n <= 2 * buckets:
+        return x, y
+    size = -(-n // buckets)
+    buckets = -(-n // size)
+    padded = np.concatenate((y, np.full(buckets * size - n, y[-1]))).reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    low = np.minimum(padded.argmin(axis=1) + offsets, n - 1)
+    high = np.minimum(padded.argmax(axis=1) + offsets, n - 1)
+    indices = np.sort(np.column_stack((low, high)), axis=1).ravel()
+    return x[indices], y[indices]
+
+# Counts per bin with Poisson (sqrt) errors: error bars for short curves, a decimated line inside the
+# decimated error envelope for long ones
+def plot_counts(ax, counts, timestamps=None, errors=True, pixels=None, label=None, **kwargs):
+    counts = np.asarray(counts, dtype=np.float64)
+    timestamps = np.arange(len(counts)) if timestamps is None else np.asarray(timestamps)
+    pixels = axis_pixels(ax) if pixels is None else pixels
+    if len(counts) == 0:
+        return
+    if len(counts) <= 2 * pixels:
+        if errors:
+            ax.errorbar(timestamps, counts, yerr=np.sqrt(np.maximum(counts, 0)), fmt='o', label=label, **kwargs)
+        else:
+            ax.plot(timestamps, counts, 'o', label=label, **kwargs)
+        return
+    if errors:
+        starts = bucket_starts(len(counts), pixels)
+        spread = np.sqrt(np.maximum(counts, 0))
+        ax.fill_between(timestamps[starts], np.minimum.reduceat(counts - spread, starts), np.maximum.reduceat(counts + spread, starts),
+                        step='post', alpha=0.3, linewidth=0, **kwargs)
+    ax.plot(*minmax_decimate(timestamps, counts, pixels), label=label, **kwargs)
+
+# A curve drawn with markers when short and as a decimated line when long
+def plot_points(ax, values, timestamps=None, fmt='o', pixels=None, **kwargs):
+    values = np.asarray(values, dtype=np.float64)
+    timestamps = np.arange(len(values)) if timestamps is None else np.asarray(timestamps)
+    pixels = axis_pixels(ax) if pixels is None else pixels
+    if len(values) <= 2 * pixels:
+        return ax.plot(timestamps, values, fmt, **kwargs)
+    return ax.plot(*minmax_decimate(timestamps, values, pixels), **kwargs)
+
+# ax.stairs(values, edges), decimated to a step line when there are more than 2 bins per pixel
+def plot_stairs(ax, values, edges, pixels=None, **kwargs):
+    values = np.asarray(values, dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.float64)
+    pixels = axis_pixels(ax) if pixels is None else pixels
+    if len(values) <= 2 * pixels:
+        return ax.stairs(values, edges, **kwargs)
+    x, y = minmax_decimate(edges[:-1], values, pixels)
+    return ax.plot(np.append(x, edges[-1]), np.append(y, y[-1]), drawstyle='steps-post', **kwargs)
+
+# A Figure on an Agg canvas (headless, for batch jobs) or a pyplot figure
+def new_figure(headless=False, **kwargs):
+    if headless:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        figure = Figure(**kwargs)
+        FigureCanvasAgg(figure)
+        return figure
+    import matplotlib.pyplot as plt
+    return plt.figure(**kwargs)
+
+def save_figure(figure, path, **kwargs):
+    figure.savefig(path, **kwargs)
+
+def mark_trigger(ax, result):
+    if result.triggered():
+        ax.axvline(result.triggered_timestamp, color='red')
+        ax.axvline(result.exit_timestamp, color='green')
+
+# Counts with their running average and the event-by-event light curve of a SimulationResult
+def result_figure(result, headless=False, figsize=(10, 6)):
+    figure = new_figure(headless, figsize=figsize)
+    counts_axis, light_curve_axis = figure.subplots(2, 1)
+    plot_points(counts_axis, result.photon_count_data, fmt='-', label='photons / s')
+    plot_points(counts_axis, result.running_average, fmt='-', label='running average')
+    counts_axis.legend()
+    if len(result.light_curve_timestamps) > 1:
+        plot_stairs(light_curve_axis, np.asarray(result.light_curve_counts)[1:], result.light_curve_timestamps)
+    light_curve_axis.set_xlabel('time (s)')
+    mark_trigger(counts_axis, result)
+    mark_trigger(light_curve_axis, result)
+    return figure
+
+class LivePlot:
+    """
+    Non-blocking view of the 1s photon counts while a simulation or replay runs.
+
+    bin_sink() is handed to Simulator.run(bin_sink=...) and gets every 1s bin as it closes. Other
+    photon streams can feed photon_sink(), which bins each photon block like sim()
+    (streaming_trigger.StreamingBinner) and adds bursts (grb list or BurstSet) at each bin close as
+    sim() does; leave them out for Poisson-sampled bursts, which are already photons. At most every
+    interval seconds the decimated curve is redrawn by blitting it over the cached axes background;
+    the axes are only fully redrawn when the data outgrows their limits. window limits the view to
+    the last window seconds. Works on any backend; on Agg nothing is shown, which keeps headless
+    runs cheap.
+    """
+
+    def __init__(self, bin_length=1, bursts=None, window=None, interval=DEFAULT_INTERVAL, figsize=(10, 4)):
+        import matplotlib.pyplot as plt
+        from grb import as_burst_set
+        from streaming_trigger import StreamingBinner
+
+        self.binner = StreamingBinner(bin_length)
+        self.burst_set = as_burst_set(bursts if bursts is not None else [])
+        self.window = window
+        self.interval = interval
+        self.counts = np.zeros(1024)
+        self.timestamps = np.zeros(1024)
+        self.size = 0
+        self.last_draw = 0.0
+
+        self.figure, self.ax = plt.subplots(figsize=figsize)
+        self.ax.set_xlabel('time (s)')
+        self.ax.set_ylabel('photons / s')
+        (self.line,) = self.ax.plot([], [], animated=True)
+        self.ax.set_xlim(0, 10)
+        self.ax.set_ylim(0, 1)
+        plt.show(block=False)
+        self._redraw()
+
+    def _redraw(self):
+        canvas = self.figure.canvas
+        canvas.draw()
+        self.background = canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+        canvas.blit(self.ax.bbox)
+
+    def bin_sink(self, time, count):
+        if self.size == len(self.counts):
+            self.counts = np.resize(self.counts, 2 * self.size)
+            self.timestamps = np.resize(self.timestamps, 2 * self.size)
+        self.counts[self.size] = count
+        self.timestamps[self.size] = time
+        self.size += 1
+        if perf_counter() - self.last_draw >= self.interval:
+            self.draw()
+
+    def photon_sink(self, times, energies=None, flags=None):
+        close_indices, counts = self.binner.bin_block(times)
+        if len(close_indices):
+            close_times = np.asarray(times)[close_indices]
+            if len(self.burst_set):
+                counts = counts + self.burst_set.evaluate(close_times)
+            self._append(close_times, counts)
+        if perf_counter() - self.last_draw >= self.interval:
+            self.draw()
+
+    def _append(self, timestamps, counts):
+        needed = self.size + len(counts)
+        if needed > len(self.counts):
+            capacity = max(needed, 2 * len(self.counts))
+            self.counts = np.resize(self.counts, capacity)
+            self.timestamps = np.resize(self.timestamps, capacity)
+        self.counts[self.size:needed] = counts
+        self.timestamps[self.size:needed] = timestamps
+        self.size = needed
+
+    def data(self):
+        timestamps = self.timestamps[:self.size]
+        counts = self.counts[:self.size]
+        if self.window is not None and self.size:
+            first = np.searchsorted(timestamps, timestamps[-1] - self.window)
+            timestamps, counts = timestamps[first:], counts[first:]
+        return timestamps, counts
+
+    def draw(self):
+        self.last_draw = perf_counter()
+        timestamps, counts = self.data()
+        if len(counts) == 0:
+            return
+        self.line.set_data(*minmax_decimate(timestamps, counts, axis_pixels(self.ax)))
+        (x_min, x_max), (_, y_max) = self.ax.get_xlim(), self.ax.get_ylim()
+        top = counts.max()
+        if timestamps[-1] > x_max or timestamps[0] < x_min or top > y_max:
+            span = timestamps[-1] - timestamps[0]
+            self.ax.set_xlim(timestamps[0], timestamps[-1] + max(span * 0.5, 10))
+            self.ax.set_ylim(0, top * 1.5)
+            self._redraw()
+        else:
+            canvas = self.figure.canvas
+            canvas.restore_region(self.background)
+            self.ax.draw_artist(self.line)
+            canvas.blit(self.ax.bbox)
+        self.figure.canvas.flush_events()
+
+    # Final draw with the trigger markers of the result, drawn normally from here on
+    def finish(self, result=None):
+        self.draw()
+        self.line.set_animated(False)
+        if result is not None:
+            mark_trigger(self.ax, result)
+        self.figure.canvas.draw_idle()
+        self.figure.canvas.flush_events()
+        return self.figure
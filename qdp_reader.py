@@ -0,0 +1,97 @@
+import io
+import os
+import re
+import warnings
+
+import numpy as np
+
+# Reader for QDP style light curve (.dat) files
+#
+#   # DP | Time (s) | Count rate (counts/s)
+#   # IP LinLin
+#   DP 20.0 1705.21
+#   ...
+#   EN
+#
+# Data lines are 'DP <columns>' or plain numeric rows; comments ('#', '!') and QDP commands (IP, EN,
+# NO, READ, ...) are skipped. The file is read in chunks, only the data lines of each chunk are handed
+# to np.loadtxt, and the parsed table is written next to the file as a .npy sidecar named after the
+# file's size and modification time. Later loads memory map the sidecar while the file is unchanged;
+# an edited file gets a new sidecar and the old one is removed. If the directory is not writable the
+# table is simply parsed every time.
+#
+#   times, rates = read_light_curve('curve_fitting/lgrb.dat')
+
+DEFAULT_CHUNK_BYTES = 1 << 22
+NUMERIC_START = b'0123456789+-.'
+
+def _data_lines(lines):
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith(b'DP'):
+            rows.append(line[2:])
+        elif line[:1] and line[:1] in NUMERIC_START:
+            rows.append(line)
+    return rows
+
+# Parse the whole table, shape (rows, columns)
+def parse_qdp(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    tables = []
+    remainder = b''
+    with open(path, 'rb') as file:
+        while True:
+            data = file.read(chunk_bytes)
+            if data:
+                data = remainder + data
+                cut = data.rfind(b'\n') + 1
+                data, remainder = data[:cut], data[cut:]
+            else:
+                data, remainder = remainder, b''
+            rows = _data_lines(data.splitlines())
+            if rows:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', UserWarning)
+                    tables.append(np.loadtxt(io.BytesIO(b'\n'.join(rows)), ndmin=2))
+            if not data and not remainder:
+                break
+    if not tables:
+        return np.zeros((0, 2))
+    return np.concatenate(tables)
+
+def sidecar_path(path):
+    stat = os.stat(path)
+    return path + '.' + str(stat.st_size) + '-' + str(stat.st_mtime_ns) + '.npy'
+
+# Whether filename is a sidecar of the file called name (any size and mtime), and nothing else
+def is_sidecar(filename, name):
+    return re.fullmatch(re.escape(name) + r'\.\d+--?\d+\.npy', filename) is not None
+
+# Table of a .dat file, memory mapped from its sidecar cache when it is current
+def load_qdp(path, cache=True):
+    if not cache:
+        return parse_qdp(path)
+    sidecar = sidecar_path(path)
+    if os.path.exists(sidecar):
+        try:
+            return np.load(sidecar, mmap_mode='r')
+        except (OSError, ValueError):
+            pass                            # Truncated or being replaced; parse again
+    table = parse_qdp(path)
+    directory, name = os.path.split(os.path.abspath(path))
+    try:
+        temporary = sidecar + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary, 'wb') as file:
+            np.save(file, table)
+        os.replace(temporary, sidecar)
+        for other in os.listdir(directory):
+            if is_sidecar(other, name) and os.path.join(directory, other) != os.path.abspath(sidecar):
+                os.remove(os.path.join(directory, other))
+    except OSError:
+        pass
+    return table
+
+# (times, rates) columns of a light curve file
+def read_light_curve(path, cache=True, time_column=0, rate_column=1):
+    table = load_qdp(path, cache)
+    return table[:, time_column], table[:, rate_column]
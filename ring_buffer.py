@@ -0,0 +1,110 @@
+import numpy as np
+
+# Photon record: arrival time (s), energy (keV) and free-form flags (e.g. source tag)
+PHOTON_DTYPE = np.dtype([('time', np.float64), ('energy', np.float32), ('flags', np.uint8)])
+
+class RingBuffer:
+    """
+    Preallocated fixed-capacity ring buffer on top of a NumPy array.
+
+    Behaves like deque(maxlen=capacity) with append() on the right: indexing is oldest first
+    (buffer[0] is the oldest item, buffer[-1] the newest) and appending to a full buffer
+    overwrites the oldest item. Nothing is allocated per append.
+    """
+
+    def __init__(self, capacity, dtype=np.float64):
+        self.capacity = capacity
+        self.maxlen = capacity                  # deque compatible name
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.head = 0                           # Index the next item is written to
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def clear(self):
+        self.head = 0
+        self.length = 0
+
+    def append(self, item):
+        if self.capacity == 0:
+            return
+        self.data[self.head] = item
+        self.head = (self.head + 1) % self.capacity
+        if self.length < self.capacity:
+            self.length += 1
+
+    # Bulk append; if more items than the capacity are given only the newest are kept
+    def extend(self, items):
+        items = np.asarray(items)
+        n = len(items)
+        if self.capacity == 0 or n == 0:
+            return
+        if n >= self.capacity:
+            self.data[:] = items[n - self.capacity:]
+            self.head = 0
+            self.length = self.capacity
+            return
+        first = min(n, self.capacity - self.head)
+        self.data[self.head:self.head + first] = items[:first]
+        self.data[:n - first] = items[first:]
+        self.head = (self.head + n) % self.capacity
+        self.length = min(self.length + n, self.capacity)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('ring buffer index out of range')
+        return self.data[(self.head - self.length + index) % self.capacity]
+
+    # Zero-copy views of the newest n items (all by default), oldest first. Returns one array if
+    # they are contiguous in memory, otherwise the two segments either side of the wrap point.
+    def last(self, n=None):
+        n = self.length if n is None else min(n, self.length)
+        start = (self.head - n) % self.capacity if self.capacity else 0
+        if start + n <= self.capacity:
+            return (self.data[start:start + n],)
+        return (self.data[start:], self.data[:self.head])
+
+    # Contiguous copy of the newest n items, oldest first
+    def to_array(self, n=None):
+        segments = self.last(n)
+        if len(segments) == 1:
+            return segments[0].copy()
+        return np.concatenate(segments)
+
+class PhotonRingBuffer(RingBuffer):
+    # Ring buffer of PHOTON_DTYPE records; field views are cached so per-photon appends are plain
+    # scalar stores instead of building a record
+    def __init__(self, capacity):
+        super().__init__(capacity, PHOTON_DTYPE)
+        self.times = self.data['time']
+        self.energies = self.data['energy']
+        self.flags = self.data['flags']
+
+    def append(self, time, energy, flags=0):
+        if self.capacity == 0:
+            return
+        self.times[self.head] = time
+        self.energies[self.head] = energy
+        self.flags[self.head] = flags
+        self.head = (self.head + 1) % self.capacity
+        if self.length < self.capacity:
+            self.length += 1
+
+    # Bulk append of a photon block. Only the newest capacity photons can be kept, so only those are
+    # copied into a record block
+    def extend(self, times, energies, flags=None):
+        if self.capacity == 0:
+            return
+        times = np.asarray(times)[-self.capacity:]
+        energies = np.asarray(energies)[-self.capacity:]
+        if flags is not None:
+            flags = np.asarray(flags)[-self.capacity:]
+        block = np.zeros(len(times), dtype=PHOTON_DTYPE)
+        block['time'] = times
+        block['energy'] = energies
+        if flags is not None:
+            block['flags'] = flags
+        super().extend(block)
@@ -0,0 +1,149 @@
+import json
+import os
+
+import numpy as np
+
+from ring_buffer import PHOTON_DTYPE
+
+# Binary run output
+#
+# A run is saved as a directory holding a header.json and one file per array:
+#   header.json                 format version, settings, bursts, trigger markers and a manifest
+#                               of the array files (dtype and shape of each)
+#   <name>.npy                  binned curves (photon_count_data, running_average, light curves)
+#   photons.bin                 optional full photon stream as raw PHOTON_DTYPE records, appended
+#                               block by block while the run is going
+# open_run() maps every array with np.memmap / np.load(mmap_mode='r'), so multi-GB outputs can be
+# analysed without reading them into memory. photons.bin is also readable by tte_reader, so a saved
+# run can be replayed.
+
+FORMAT_VERSION = 1
+HEADER_FILE = 'header.json'
+PHOTON_FILE = 'photons.bin'
+
+RESULT_ARRAYS = ('photon_count_data', 'running_average', 'light_curve_counts', 'light_curve_timestamps')
+
+def _burst_dicts(bursts):
+    if bursts is None:
+        return []
+    if hasattr(bursts, 'to_grbs'):
+        bursts = bursts.to_grbs()
+    return [dict(b.to_dict(), sigma=b.sigma) if hasattr(b, 'to_dict') else {'peak_time': b.peak_time, 'amplitude': b.amplitude, 'sigma': b.sigma}
+            for b in bursts]
+
+class RunWriter:
+    """
+    Writes one run into a directory.
+
+    write_photons() can be handed to Simulator.run(photon_sink=...) to stream every photon block to
+    disk as it is generated; add_array() stores a finished array; close() writes the header.
+    """
+
+    def __init__(self, path, config=None, bursts=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.header = {
+            'format_version': FORMAT_VERSION,
+            'config': dict(config.vars if hasattr(config, 'vars') else (config or {})),
+            'bursts': _burst_dicts(bursts),
+            'triggered_timestamp': None,
+            'exit_timestamp': None,
+            'arrays': {},
+        }
+        self.photon_file = None
+        self.photon_count = 0
+
+    def write_photons(self, times, energies, flags=None):
+        if self.photon_file is None:
+            self.photon_file = open(os.path.join(self.path, PHOTON_FILE), 'wb')
+        records = np.zeros(len(times), dtype=PHOTON_DTYPE)
+        records['time'] = times
+        records['energy'] = energies
+        if flags is not None:
+            records['flags'] = flags
+        records.tofile(self.photon_file)
+        self.photon_count += len(records)
+
+    def add_array(self, name, values):
+        values = np.asarray(values)
+        np.save(os.path.join(self.path, name + '.npy'), values)
+        self.header['arrays'][name] = {'file': name + '.npy', 'dtype': values.dtype.str, 'shape': list(values.shape)}
+
+    def add_result(self, result):
+        for name in RESULT_ARRAYS:
+            self.add_array(name, np.asarray(getattr(result, name), dtype=np.float64))
+        self.header['triggered_timestamp'] = result.triggered_timestamp
+        self.header['exit_timestamp'] = result.exit_timestamp
+
+    def close(self):
+        if self.photon_file is not None:
+            self.photon_file.close()
+            self.photon_file = None
+            self.header['arrays']['photons'] = {'file': PHOTON_FILE, 'dtype': PHOTON_DTYPE.descr, 'shape': [self.photon_count]}
+        with open(os.path.join(self.path, HEADER_FILE), 'w') as file:
+            json.dump(self.header, file, indent=4)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Save a finished SimulationResult (binned curves and trigger markers only)
+def save_run(path, result, config=None, bursts=None):
+    with RunWriter(path, config, bursts) as writer:
+        writer.add_result(result)
+    return path
+
+# Save a table (list of row dicts, e.g. sweep.run_sweep() output) with one .npy file per column
+def save_table(path, rows, config=None, **metadata):
+    with RunWriter(path, config) as writer:
+        writer.header.update(metadata)
+        writer.header['columns'] = list(rows[0].keys()) if rows else []
+        for column in writer.header['columns']:
+            writer.add_array(column, np.array([row[column] for row in rows]))
+    return path
+
+class RunData:
+    """
+    Saved run opened for analysis.
+
+    header, config, bursts and the trigger markers come from header.json; every array in the
+    manifest is available as an attribute (or run['name']) and is memory mapped on first access.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, HEADER_FILE), 'r') as file:
+            self.header = json.load(file)
+        if self.header.get('format_version', 0) > FORMAT_VERSION:
+            raise ValueError('run format version ' + str(self.header['format_version']) + ' is newer than supported')
+        self.config = self.header['config']
+        self.bursts = self.header['bursts']
+        self.triggered_timestamp = self.header['triggered_timestamp']
+        self.exit_timestamp = self.header['exit_timestamp']
+        self._arrays = {}
+
+    def names(self):
+        return list(self.header['arrays'].keys())
+
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            entry = self.header['arrays'][name]
+            file = os.path.join(self.path, entry['file'])
+            if file.endswith('.npy'):
+                self._arrays[name] = np.load(file, mmap_mode='r')
+            elif entry['shape'][0] == 0:
+                self._arrays[name] = np.zeros(0, dtype=PHOTON_DTYPE)
+            else:
+                dtype = np.dtype([tuple(field) for field in entry['dtype']])
+                self._arrays[name] = np.memmap(file, dtype=dtype, mode='r', shape=tuple(entry['shape']))
+        return self._arrays[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self.__dict__.get('header', {}).get('arrays', {}):
+            raise AttributeError(name)
+        return self[name]
+
+def open_run(path):
+    return RunData(path)
@@ -1,14 +1,17 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
-from lifo_queue import FixedLengthLIFOQueue
 from grb import *
-from collections import deque
 import sys
 import os
 from os import system
 import fnmatch
+import copy
 from config import *
+from simulator import Simulator
+from run_io import RunWriter
+from instrumentation import Instrumentation, profile_call
+from plotting import LivePlot, plot_counts, plot_points, plot_stairs
 
 state = GlobalState()
 
@@ -16,12 +19,13 @@ def init_vars():
     global duration, rate, size_list, running_avg_length, ebe_bin_length, enter_significance_constant, tail
     global enter_look_back_to, trigger_threshold_met, triggered_timestamp, exit_timestamp, exit_significance_constant
     global exit_look_back_to, show_peak_data, random_seed, sgrb_peak_time, sgrb_A, sgrb_sigma, lgrb_peak_time, lgrb_A, lgrb_sigma
-    global default_A, default_sigma
+    global default_A, default_sigma, poisson_bursts
 
     duration = state.vars['duration']                        # Duration of the simulation in seconds
     rate = state.vars['rate']                             # Rate of photon arrival per second
     size_list = state.vars['size_list']                      # Length of the photon list queue
     running_avg_length = state.vars['running_avg_length']               # Length of running average
+    poisson_bursts = state.vars['poisson_bursts']                   # Sample bursts as photons instead of adding expected counts to bins
     ebe_bin_length = state.vars['ebe_bin_length']                  # Event-by-event bin length (in s) --- this should be configured later on to be variable, discuss with science people for how to go about this
 
     # Default trigger parameters
@@ -64,28 +68,6 @@ def init_vars():
     bursts = [default_burst]
 
 init_vars()
-np.random.seed(random_seed) 
-
-# Define the power law function - this is used to create random background energy
-def power_law(index, min_energy, max_energy):
-    random_value = np.random.uniform(0, 1)
-    energy = ((max_energy**(index + 1) - min_energy**(index + 1)) * random_value + min_energy**(index + 1))**(1/(index + 1))
-    return energy
-
-# Define the Get_Energy function
-def Get_Energy():
-    index = -0.1                # Index of the spectrum.
-    min_energy = 1.0            # Minimum energy.
-    max_energy = 1000.0         # Maximum energy.
-    energy = power_law(index, min_energy, max_energy)
-    return energy
-
-# Function to return the next photon's occurrence time and energy.
-def get_photon_next(rate):
-    time_to_next_event = np.random.exponential(1 / rate)
-    photon_energy = Get_Energy()
-    return time_to_next_event, photon_energy
-
 bursts = [default_burst]
 
 # Store data for plotting
@@ -94,163 +76,42 @@ running_average = []
 light_curve_counts = []
 light_curve_timestamps = []
 
-# Initialize the FixedLengthLIFOQueue for photon counts
-photon_list_queue = deque(maxlen=size_list)
-
-
-
-def sim() : 
-    # Start the simulation
-    #init_vars()
-    
-    photon_count_data.clear()
-    running_average.clear()
-    photon_list_queue.clear()
-    light_curve_counts.clear()
-    light_curve_timestamps.clear()
-    tail_counts = deque(maxlen=int(tail / ebe_bin_length))
-    tail_timestamps = deque(maxlen=int(tail / ebe_bin_length))
-    
-    # Initialize deque for delay ring buffer
-    delay_buffer = deque(maxlen=rate)
-    delay_buffer_binsize = ebe_bin_length
-    
-    global bursts
-    current_time = 0
-    
-    ra_accumulated_time = 0         # running average accumulated time (helper)
-    ebe_accumulated_time = 0        # event-by-event accumulated time (helper)
-    tail_accumulated_time = 0
-    
-    photon_count_in_last_second = 0
-    ebe_binned_photon_count = 0
-    tail_count = 0
-    
-    trigger_threshold_met = False
-    already_triggered = False
-    get_end_tail = False
-
-    entered_ebe_threshold = -99
-
-    # Initialize the FixedLengthLIFOQueue for running averages
-    photon_count_queue = FixedLengthLIFOQueue(running_avg_length)
-
-    while current_time < duration:
-        time_to_next_event, photon_energy = get_photon_next(rate)
-
-        current_time += time_to_next_event
-        ra_accumulated_time += time_to_next_event
-        tail_accumulated_time += time_to_next_event
-
-        # Logic determining if trigger threshold has been met
-        if current_time > enter_look_back_to and not already_triggered:
-            
-            # standard devation of the last n seconds, not including a tail
-            look_back_std = np.std(running_average[(-1 * enter_look_back_to) : (-1 * tail)])
-            
-            # threshold to trigger is last running average count (not including tail) + c * look_back_std       
-            #threshold = running_average[-1 * tail] + enter_significance_constant * look_back_std    
-            threshold = tail_counts[0] + enter_significance_constant * look_back_std
-
-            #if (trigger_threshold_met == False and running_average[-1] >= threshold) :
-            if (trigger_threshold_met == False and tail_counts[-1] >= threshold) :
-                entered_ebe_threshold = running_average[-1]
-                trigger_threshold_met = True
-                
-                global triggered_timestamp
-                triggered_timestamp = current_time
-
-                light_curve_counts.extend(list(tail_counts))
-                light_curve_timestamps.extend(list(tail_timestamps))
-        
-        # Exit trigger logic
-        if trigger_threshold_met :
-            ## OLD LOGIC - DOESN'T WORK ALL THAT WELL 
-            # look_back_std = np.std(running_average[(-1 * exit_look_back_to) : (-1 * tail)])
-            # threshold = running_average[-1 * tail] - exit_significance_constant * look_back_std
-            # if running_average[-1] <= threshold  and running_average[-1] < 1.5 * entered_ebe_threshold: 
-            #     trigger_threshold_met = False
-            #     global exit_timestamp
-            #     exit_timestamp = current_time
-            #     already_triggered = True
-            #     get_end_tail = True
-            #     tail_counts.clear()
-            #    tail_timestamps.clear()
-
-            der = approximate_derivative(tail_counts[-1], tail_counts[-2], tail_timestamps[-1] - tail_timestamps[-2])
-            if (-0.001 < der < 0.001 and tail_counts[-1] < 1.25 * entered_ebe_threshold) :
-                trigger_threshold_met = False
-                global exit_timestamp
-                exit_timestamp = current_time
-                already_triggered = True
-                get_end_tail = True
-                tail_counts.clear()
-                tail_timestamps.clear()
-
-        # Filling running average list
-        if current_time < duration:
-            photon_list_queue.appendleft((current_time, photon_energy))
-            photon_count_in_last_second += 1
-            # for burst in bursts :
-            #     photon_count_in_last_second += burst.burst_addition(current_time)
-            tail_count += 1
-                
-            
-            if ra_accumulated_time >= 1:
-                for burst in bursts :
-                    photon_count_in_last_second += burst.burst_addition(current_time)
-                
-                # Push the photon count for the last second into the photon count queues
-                photon_count_queue.push(photon_count_in_last_second)
-                
-                # Calculate the running averages
-                running_average.append(photon_count_queue.get_running_average())
-
-                # Store data for plotting
-                photon_count_data.append(photon_count_in_last_second)
-
-                # Reset for the next second
-                photon_count_in_last_second = 0
-                ra_accumulated_time = 0
-            
-            if tail_accumulated_time >= ebe_bin_length :
-                for burst in bursts :
-                    tail_count += burst.burst_addition(current_time)
-                tail_counts.append(tail_count)
-                tail_timestamps.append(current_time)
-                tail_count = 0
-                tail_accumulated_time = 0
-                if get_end_tail and tail_counts.__len__() == tail_counts.maxlen :
-                    light_curve_counts.extend(tail_counts)
-                    light_curve_timestamps.extend(tail_timestamps)
-                    get_end_tail = False 
-
-            # Filling lists for light curve
-            if trigger_threshold_met :
-                # for burst in bursts :
-                #     ebe_binned_photon_count += burst.burst_addition(current_time)
-                ebe_accumulated_time += time_to_next_event
-                ebe_binned_photon_count += 1 
-                if ebe_accumulated_time >= ebe_bin_length :
-                    for burst in bursts :
-                        ebe_binned_photon_count += burst.burst_addition(current_time)
-                    light_curve_counts.append(ebe_binned_photon_count)
-                    light_curve_timestamps.append(current_time)
-
-                    ebe_accumulated_time = 0
-                    ebe_binned_photon_count = 0
-    if triggered_timestamp > 0 and exit_timestamp < 0 :
-        exit_timestamp = duration
+# Most recent photons and the full result of the last run
+photon_list_queue = None
+last_result = None
+last_run_state = None           # Copies of the settings and bursts last_result was simulated with
+last_run_bursts = None
+
+# Instrumentation settings, changed from the main menu
+instrument_runs = False         # Collect per-stage timers and counters for every run
+profiler = None                 # None, 'cprofile' or 'pyinstrument'
+live_view = False               # Show the photon counts while the simulation runs
+
+# Run the simulation with the current settings and bursts, keeping the results for plotting
+def sim(instrumentation=None) : 
+    global triggered_timestamp, exit_timestamp, photon_list_queue, last_result, last_run_state, last_run_bursts
+    live = LivePlot() if live_view else None
+    result = Simulator(state, bursts).run(instrumentation=instrumentation, bin_sink=live.bin_sink if live else None)
+    if live is not None :
+        live.finish(result)
+    last_result = result
+    last_run_state = copy.deepcopy(state)
+    last_run_bursts = copy.deepcopy(bursts)
+
+    photon_count_data[:] = result.photon_count_data
+    running_average[:] = result.running_average
+    light_curve_counts[:] = result.light_curve_counts
+    light_curve_timestamps[:] = result.light_curve_timestamps
+    triggered_timestamp = result.triggered_timestamp
+    exit_timestamp = result.exit_timestamp
+    photon_list_queue = result.photon_list
+    return result
 
 def display_plots() :
     # Determine the common y-axis range
-    y_min = min(photon_count_data)
-    y_max = max(photon_count_data)
-    y_range_min = y_min * 0.8
-    y_range_max = y_max * 1.2
-
-    # Calculate errors for photon count data
-    photon_count_errors = [np.sqrt(count) for count in photon_count_data]
+    counts = np.asarray(photon_count_data, dtype=np.float64)
+    y_range_min = counts.min() * 0.8
+    y_range_max = counts.max() * 1.2
 
     fig = plt.figure(figsize=(10,6))
     gs = gridspec.GridSpec(3, 2, width_ratios=[3, 1])
@@ -262,8 +123,8 @@ def display_plots() :
     # # Plotting the results
     # fig, axs = plt.subplots(2, 1, figsize=(12, 10))
 
-    # Plot photon counts with error bars
-    ax1.errorbar(range(len(photon_count_data)), photon_count_data, yerr=photon_count_errors, fmt='o', label='Photon Count')
+    # Plot photon counts with error bars (an error envelope once there are more seconds than pixels)
+    plot_counts(ax1, counts, label='Photon Count')
     ax1.set_xlabel('Time (seconds)')
     ax1.set_ylabel('Photon Count')
     ax1.set_title('Photon Count per Second')
@@ -282,7 +143,7 @@ def display_plots() :
 
     # Plot light curve
     try : 
-        ax3.stairs(light_curve_counts[1:], light_curve_timestamps, color='red')
+        plot_stairs(ax3, light_curve_counts[1:], light_curve_timestamps, color='red')
     except :
         ax3.text(1,1,'No light curve available')
     ax3.set_xlabel('Time')
@@ -297,11 +158,8 @@ def display_plots() :
     plt.tight_layout()
     plt.show()
 
-def approximate_derivative(curr_val, prev_value, time_between) :
-    return (curr_val - prev_value) / (2 * time_between)
-
 def plot_running_avg(ax, y_min, y_max, A, sigma) :
-    ax.plot(running_average, 'o', label='Running Average', color='orange')
+    plot_points(ax, running_average, label='Running Average', color='orange')
     if (triggered_timestamp > 0) :
         ax.vlines(triggered_timestamp, y_min, y_max, label='EBE Entered', colors='red')
     if (exit_timestamp > 0) :
@@ -346,10 +204,10 @@ def plot_tests(sigmas, amplitudes) :
             init_vars()
             sim()
             ax = running_avg.add_subplot(gs[row, column])
-            ax.plot(running_average, 'o', color='blue')
+            plot_points(ax, running_average, color='blue')
             ax.set_xlabel('time (s)', fontsize='small')
             ax.set_ylabel('running avg\n(counts/s)', fontsize='small')
-            ax.set_ylim(top=max(running_average) * 1.2)
+            ax.set_ylim(top=np.max(running_average) * 1.2)
             if (triggered_timestamp > 0) :
                 ax.axvline(triggered_timestamp, color='orange')
                 ax.axvline(triggered_timestamp - tail, color='gray', linestyle='dashed')
@@ -363,8 +221,8 @@ def plot_tests(sigmas, amplitudes) :
 
             ax2 = light_curve.add_subplot(lc_gs[row, column])
             if (light_curve_counts != [] and light_curve_timestamps != []) :
-                lc_counts_per_s = [i / ebe_bin_length for i in light_curve_counts]
-                ax2.stairs(lc_counts_per_s[1:], light_curve_timestamps, color='red')
+                lc_counts_per_s = np.asarray(light_curve_counts, dtype=np.float64) / ebe_bin_length
+                plot_stairs(ax2, lc_counts_per_s[1:], light_curve_timestamps, color='red')
                 ax2.set_xlabel('Time')
                 ax2.set_ylabel('Counts/s')
                 ax2.axhline(rate, color='blue')
@@ -438,6 +296,11 @@ def change_event_by_event_bin_length() :
     state.vars['ebe_bin_length'] = change_var(ebe_bin_length, 'EVENT-BY-EVENT BIN LENGTH', float, 's')
     init_vars()
 
+def toggle_poisson_bursts() :
+    state.vars['poisson_bursts'] = not state.vars['poisson_bursts']
+    init_vars()
+    print('\nBursts are now ' + ('sampled as Poisson photons' if poisson_bursts else 'added to bins as expected counts') + '!\n')
+
 # tab function (pyplot won't allow \t)
 def t() :
     return '     '
@@ -453,7 +316,8 @@ def basic_sim_variables_str() :
                 '\n' + t() + 'Rate of photon arrival per second: ' + str(rate) + 
                 '\n' + t() + 'Length of the photon list queue: ' + str(size_list) +
                 '\n' + t() + 'Running average length (in seconds): ' + str(running_avg_length) + 
-                '\n' + t() + 'Event-by-event bin duration (in seconds): ' + str(ebe_bin_length))
+                '\n' + t() + 'Event-by-event bin duration (in seconds): ' + str(ebe_bin_length) +
+                '\n' + t() + 'Poisson-sampled burst photons: ' + str(poisson_bursts))
     return summary
 
 def trigger_variables_str() : 
@@ -530,9 +394,27 @@ def clear_bursts() :
         bursts.clear()
         print('\nBurst list was successfully cleared.')
 
+def import_bursts() :
+    system('cls')
+    path = input('Enter a burst table to import (.csv, .json, .npy or .npz): ')
+    try :
+        imported = BurstSet.from_file(path)
+    except (OSError, ValueError, KeyError) as error :
+        print('\nCould not import ' + path + ': ' + str(error))
+        press_enter_to_continue()
+        return
+    ans = ''
+    while ans != 'a' and ans != 'r' :
+        ans = input('\nImported ' + str(len(imported)) + ' bursts. (a)ppend to or (r)eplace the current ' + str(len(bursts)) + '? ')
+    if ans == 'r' :
+        bursts.clear()
+    bursts.extend(imported.to_grbs())
+    print('\nThere are now ' + str(len(bursts)) + ' bursts.')
+    press_enter_to_continue()
+
 def add_burst_helper() :
     system('cls')
-    functions_names = [add_sgrb, add_lgrb, return_to_burst_menu]
+    functions_names = [add_sgrb, add_lgrb, add_template_burst, return_to_burst_menu]
     menu_items = dict(enumerate(functions_names, start=0))
     selection = -99
     while selection not in range(len(menu_items) + 1):
@@ -567,6 +449,17 @@ def add_sgrb() :
 def add_lgrb() :
     add_grb(grb(lgrb_peak_time, lgrb_A, lgrb_sigma))
 
+# Burst shaped like a measured light curve (.dat file), by default the lgrb.dat flare
+def add_template_burst() :
+    path = input('\nEnter a light curve .dat file (leave blank for ' + os.path.basename(DEFAULT_TEMPLATE) + '): ').strip()
+    try :
+        burst = TemplateBurst(path or DEFAULT_TEMPLATE, peak_time=lgrb_peak_time)
+    except (OSError, ValueError) as error :
+        print('\nCould not load ' + (path or DEFAULT_TEMPLATE) + ': ' + str(error))
+        press_enter_to_continue()
+        return
+    add_grb(burst)
+
 def add_grb(burst) :
     system('cls')
  
@@ -682,8 +575,25 @@ def save_current_settings() :
         ans = input('Would you like to save the current settings? (y/n) ')
     if ans == 'y' : 
         filename = input('Enter your desired filename: ')
+        state.bursts = BurstSet.from_grbs(bursts)
         state.save(filename + '.json')
-        print('The simulation was saved as ' + filename + '.json')
+        print('The simulation and ' + str(len(bursts)) + ' bursts were saved as ' + filename + '.json')
+
+def save_last_run() :
+    if last_result is None :
+        print('Run a simulation first, there is nothing to save yet.')
+        return
+    dirname = input('Enter a directory name for the run output: ')
+    ans = ''
+    while ans != 'y' and ans != 'n' :
+        ans = input('Include the full photon stream? (y/n) ')
+    # Saved with the settings and bursts of that run, even if they have been changed since
+    with RunWriter(dirname, last_run_state, last_run_bursts) as writer :
+        writer.add_result(last_result)
+        if ans == 'y' :
+            # Runs are reproducible from random_seed, so the photons are regenerated straight to disk
+            Simulator(last_run_state, last_run_bursts).run(photon_sink=writer.write_photons)
+    print('The run was saved in ' + dirname)
 
 def load_settings() :
     ans = ''
@@ -702,9 +612,15 @@ def load_settings() :
                 )
             except:
                 continue
-        bursts.clear()
         state.load(file_options[selection])
-        init_vars()
+        current_bursts = list(bursts)
+        init_vars()             # Resets the burst list to the default burst
+        # Files saved before bursts were stored leave the current bursts in place
+        if state.bursts is not None :
+            bursts[:] = state.bursts.to_grbs()
+            print('Loaded ' + str(len(bursts)) + ' bursts.')
+        else :
+            bursts[:] = current_bursts
         
         
 def list_json_files():
@@ -735,7 +651,7 @@ def modify_variables() :
 
 def modify_basic_simulation_variables() :
     functions_names = [display_all_variables, change_duration, change_rate, change_photon_list_length, change_running_average_length, 
-                       change_event_by_event_bin_length, return_to_modification_menu, return_to_main_menu]
+                       change_event_by_event_bin_length, toggle_poisson_bursts, return_to_modification_menu, return_to_main_menu]
     menu('SIMULATION VARIABLE MODIFICATION MENU', functions_names)
 
 def modify_trigger_variables() :
@@ -744,7 +660,7 @@ def modify_trigger_variables() :
     menu('TRIGGER VARIABLE MODIFICATION MENU', functions_names)
 
 def modify_bursts() :
-    functions_names = [display_burst_info, add_burst, delete_burst, clear_bursts, return_to_modification_menu, return_to_main_menu]
+    functions_names = [display_burst_info, add_burst, import_bursts, delete_burst, clear_bursts, return_to_modification_menu, return_to_main_menu]
     menu('BURST MODIFICATION MENU', functions_names)
 
 def run_simulation_and_plot() :
@@ -759,8 +675,35 @@ def run_simulation_and_plot() :
     else :
         show_peak_data = False
     system('cls')
-    sim()
-    display_plots()
+    instrumentation = Instrumentation() if instrument_runs else None
+    if profiler is not None :
+        profile_call(lambda: sim(instrumentation), profiler)
+    else :
+        sim(instrumentation)
+    if instrumentation is not None :
+        with instrumentation.stage('plotting') :
+            display_plots()
+        print(instrumentation.summary_table())
+    else :
+        display_plots()
+
+def toggle_live_view() :
+    global live_view
+    live_view = not live_view
+    print('\nLive view is now ' + ('on' if live_view else 'off') + '!\n')
+    press_enter_to_continue()
+
+def change_instrumentation() :
+    global instrument_runs, profiler
+    print('Instrumentation is ' + ('on' if instrument_runs else 'off') + ', profiler: ' + str(profiler))
+    ans = ''
+    while ans != 'y' and ans != 'n' :
+        ans = input('Collect per-stage timers and counters for each run? (y/n) ')
+    instrument_runs = ans == 'y'
+    selection = ''
+    while selection not in ('0', '1', '2') :
+        selection = input('Profiler: 0 none, 1 cProfile, 2 pyinstrument: ')
+    profiler = [None, 'cprofile', 'pyinstrument'][int(selection)]
 
 def display_menu(menu):
     """
@@ -773,7 +716,7 @@ def display_menu(menu):
 
 def main():
     init_vars()
-    functions_names = [run_simulation_and_plot, display_all_variables, modify_variables, run_tests, save_current_settings, load_settings, exit]
+    functions_names = [run_simulation_and_plot, display_all_variables, modify_variables, run_tests, save_current_settings, save_last_run, load_settings, change_instrumentation, toggle_live_view, exit]
     menu('MAIN MENU', functions_names)
 
 def menu(name, functions):
@@ -0,0 +1,291 @@
+from collections import deque
+from itertools import repeat
+from time import perf_counter
+
+import numpy as np
+
+from config import GlobalState
+from grb import grb, as_burst_set
+from lifo_queue import FixedLengthLIFOQueue
+from photon_source import PhotonSource, PoissonBurstSource, BACKGROUND
+from ring_buffer import RingBuffer, PhotonRingBuffer
+
+NOT_TRIGGERED = -999        # Sentinel for triggered_timestamp / exit_timestamp, as in config.GlobalState
+
+def approximate_derivative(curr_val, prev_value, time_between) :
+    return (curr_val - prev_value) / (2 * time_between)
+
+# Everything a single run produces
+class SimulationResult:
+    def __init__(self):
+        self.photon_count_data = []         # Photon count of every 1s bin
+        self.running_average = []           # Running average after every 1s bin
+        self.light_curve_counts = []        # Event-by-event light curve around the trigger
+        self.light_curve_timestamps = []
+        self.triggered_timestamp = NOT_TRIGGERED
+        self.exit_timestamp = NOT_TRIGGERED
+        self.photon_list = None             # PhotonRingBuffer with the most recent photons
+        self.metrics = None                 # Instrumentation.metrics() if the run was instrumented
+
+    def triggered(self):
+        return self.triggered_timestamp != NOT_TRIGGERED
+
+class Simulator:
+    """
+    Reentrant GRB trigger simulation.
+
+    Built from a config.GlobalState (or its vars dict) and a list of grb bursts or a BurstSet; if
+    bursts is None the GlobalState's saved bursts are used, or else the default burst from the
+    settings. The settings are copied on
+    construction and run() keeps all of its working state local, so simulators can run side by
+    side in threads or worker processes. The trigger is the simulator's own significance algorithm,
+    inlined in run(); the pluggable trigger_algorithms only apply to streaming_trigger.StreamingTrigger.
+    """
+
+    def __init__(self, config=None, bursts=None):
+        if config is None:
+            config = GlobalState()
+        vars = config.vars if isinstance(config, GlobalState) else config
+        self.vars = dict(vars)
+        if bursts is None and isinstance(config, GlobalState):
+            bursts = config.bursts
+        if bursts is None:
+            bursts = [grb(peak_time=self.vars['duration'] / 2, amplitude=self.vars['default_A'], sigma=self.vars['default_sigma'])]
+        self.burst_set = as_burst_set(bursts)
+
+    # Run the simulation. source replaces the generated background with any iterable of
+    # (times, energies) photon blocks, e.g. a tte_reader.EventFileSource replaying recorded data.
+    # photon_sink(times, energies, flags) is called with every photon block, e.g. to record the
+    # whole stream with run_io.RunWriter.write_photons. bin_sink(time, count) is called as each 1s bin
+    # closes, bursts included, e.g. for plotting.LivePlot. instrumentation is an optional
+    # instrumentation.Instrumentation collecting per-stage timers and counters.
+    def run(self, source=None, photon_sink=None, instrumentation=None, bin_sink=None):
+        timing = instrumentation is not None
+        run_start = perf_counter()
+        duration = self.vars['duration']
+        rate = self.vars['rate']
+        size_list = self.vars['size_list']
+        running_avg_length = self.vars['running_avg_length']
+        ebe_bin_length = self.vars['ebe_bin_length']
+        enter_significance_constant = self.vars['enter_significance_constant']
+        tail = self.vars['tail']
+        enter_look_back_to = self.vars['enter_look_back_to']
+        random_seed = self.vars['random_seed']
+        poisson_bursts = self.vars.get('poisson_bursts', False)
+        burst_set = self.burst_set
+
+        result = SimulationResult()
+        photon_count_data = result.photon_count_data
+        running_average = result.running_average
+        light_curve_counts = result.light_curve_counts
+        light_curve_timestamps = result.light_curve_timestamps
+        photon_list_queue = PhotonRingBuffer(size_list)
+        result.photon_list = photon_list_queue
+
+        tail_counts = RingBuffer(int(tail / ebe_bin_length))
+        tail_timestamps = RingBuffer(int(tail / ebe_bin_length))
+
+        trigger_threshold_met = False
+        already_triggered = False
+        get_end_tail = False
+
+        entered_ebe_threshold = -99
+        enter_check_pending = False     # set when a bin closes, cleared once the trigger has been checked
+        exit_check_pending = False
+
+        # Initialize the FixedLengthLIFOQueue for running averages
+        photon_count_queue = FixedLengthLIFOQueue(running_avg_length)
+
+        # Running averages from the last enter_look_back_to seconds, not including a tail. The newest
+        # tail entries wait in look_back_delay before moving into look_back_queue, which keeps the
+        # standard deviation of running_average[-enter_look_back_to:-tail] up to date in O(1)
+        look_back_delay = deque()
+        look_back_queue = FixedLengthLIFOQueue(max(0, enter_look_back_to - tail))
+
+        # Photons are generated in vectorized blocks, seeded from random_seed so every run is reproducible.
+        # With poisson_bursts the bursts arrive as sampled photons merged into the stream, otherwise
+        # their expected count is added to each bin as it closes.
+        if source is None :
+            source = PhotonSource(rate, duration, random_seed)
+        if poisson_bursts :
+            source = PoissonBurstSource(source, burst_set)
+
+        # Each block is binned at once: a bin closes on the first photon at least a bin length after
+        # the previous close, and every photon in between only adds to the count. The trigger's inputs
+        # only change when a bin closes, so the loop below visits the bin closes of a block, not its
+        # photons, and checks the trigger on the first photon after each close. Bursts are only
+        # evaluated at the closes.
+        from streaming_trigger import StreamingBinner
+        second_binner = StreamingBinner(1)
+        tail_binner = StreamingBinner(ebe_bin_length)
+        light_curve_binner = None       # Bins the light curve from the photon that triggered
+        add_bursts = len(burst_set) > 0 and not poisson_bursts
+
+        previous_time = 0
+        for block in (instrumentation.timed_iter(source, 'photon_generation') if timing else source) :
+            times, energies = block[0], block[1]
+            block_start_time = previous_time
+            previous_time = times[-1]
+            if timing :
+                instrumentation.count('photons_generated', len(times))
+                stage_start = perf_counter()
+            second_closes, second_bin_counts = second_binner.bin_block(times)
+            tail_closes, tail_bin_counts = tail_binner.bin_block(times)
+            if timing :
+                instrumentation.add_time('binning', perf_counter() - stage_start)
+                stage_start = perf_counter()
+            if add_bursts :
+                second_bursts = burst_set.evaluate(times[second_closes]).tolist()
+                tail_bursts = burst_set.evaluate(times[tail_closes]).tolist()
+            else :
+                second_bursts = tail_bursts = repeat(0.0)
+            if timing :
+                instrumentation.add_time('burst_evaluation', perf_counter() - stage_start)
+                loop_start = perf_counter()
+
+            # Bin closes of both resolutions in photon order (1s before tail at the same photon),
+            # then the last photon of the block so the photons after the last close are checked too
+            closes = list(zip(second_closes.tolist(), repeat(0), second_bin_counts.tolist(), second_bursts))
+            closes += zip(tail_closes.tolist(), repeat(1), tail_bin_counts.tolist(), tail_bursts)
+            closes.sort()
+            closes.append((len(times) - 1, None, 0, 0.0))
+
+            first = 0
+            for index, kind, count, burst_value in closes :
+                # Photons first..index: the trigger is checked on the first of them (the first one past
+                # enter_look_back_to for the enter check), then they all join the light curve while
+                # triggered. The closing photon is checked before its bin closes.
+                if first <= index :
+                    check_index = first
+                    light_curve_start = first
+                    if enter_check_pending and not already_triggered :
+                        if times[first] <= enter_look_back_to :
+                            check_index = int(np.searchsorted(times, enter_look_back_to, side='right'))
+                        if check_index <= index :
+                            current_time = float(times[check_index])
+                            enter_check_pending = False
+                            if timing :
+                                stage_start = perf_counter()
+                                instrumentation.count('threshold_evaluations')
+
+                            # standard devation of the last n seconds, not including a tail
+                            look_back_std = look_back_queue.get_running_std() if look_back_queue.size() > 0 else np.nan
+
+                            # threshold to trigger is last running average count (not including tail) + c * look_back_std
+                            threshold = tail_counts[0] + enter_significance_constant * look_back_std
+
+                            if (trigger_threshold_met == False and tail_counts[-1] >= threshold) :
+                                entered_ebe_threshold = running_average[-1]
+                                trigger_threshold_met = True
+                                result.triggered_timestamp = current_time
+                                light_curve_start = check_index
+                                light_curve_binner = StreamingBinner(ebe_bin_length, float(times[check_index - 1]) if check_index > 0 else block_start_time)
+
+                                light_curve_counts.extend(tail_counts.to_array())
+                                light_curve_timestamps.extend(tail_timestamps.to_array())
+                                if timing :
+                                    instrumentation.count('trigger_entries')
+                            if timing :
+                                instrumentation.add_time('trigger_evaluation', perf_counter() - stage_start)
+
+                    # Exit trigger logic
+                    if exit_check_pending and trigger_threshold_met and check_index <= index :
+                        current_time = float(times[check_index])
+                        exit_check_pending = False
+                        if timing :
+                            stage_start = perf_counter()
+                            instrumentation.count('exit_evaluations')
+                        ## OLD LOGIC - DOESN'T WORK ALL THAT WELL
+                        # look_back_std = np.std(running_average[(-1 * exit_look_back_to) : (-1 * tail)])
+                        # threshold = running_average[-1 * tail] - exit_significance_constant * look_back_std
+                        # if running_average[-1] <= threshold  and running_average[-1] < 1.5 * entered_ebe_threshold:
+                        #     trigger_threshold_met = False
+                        #     exit_timestamp = current_time
+                        #     already_triggered = True
+                        #     get_end_tail = True
+                        #     tail_counts.clear()
+                        #     tail_timestamps.clear()
+
+                        der = approximate_derivative(tail_counts[-1], tail_counts[-2], tail_timestamps[-1] - tail_timestamps[-2])
+                        if (-0.001 < der < 0.001 and tail_counts[-1] < 1.25 * entered_ebe_threshold) :
+                            trigger_threshold_met = False
+                            result.exit_timestamp = current_time
+                            already_triggered = True
+                            get_end_tail = True
+                            tail_counts.clear()
+                            tail_timestamps.clear()
+                            if timing :
+                                instrumentation.count('trigger_exits')
+                        if timing :
+                            instrumentation.add_time('trigger_evaluation', perf_counter() - stage_start)
+
+                    # Filling lists for light curve
+                    if trigger_threshold_met :
+                        light_curve_closes, light_curve_bin_counts = light_curve_binner.bin_block(times[light_curve_start:index + 1])
+                        if len(light_curve_closes) :
+                            close_times = times[light_curve_start + light_curve_closes]
+                            if add_bursts :
+                                light_curve_bin_counts += burst_set.evaluate(close_times)
+                            light_curve_counts.extend(light_curve_bin_counts.tolist())
+                            light_curve_timestamps.extend(close_times.tolist())
+
+                first = index + 1
+                if kind is None :
+                    continue
+                current_time = float(times[index])
+                if timing :
+                    stage_start = perf_counter()
+
+                if kind == 0 :
+                    if timing :
+                        instrumentation.count('second_bins_closed')
+                    photon_count_in_last_second = count + burst_value
+
+                    # Push the photon count for the last second into the photon count queues
+                    photon_count_queue.push(photon_count_in_last_second)
+
+                    # Calculate the running averages
+                    running_average.append(photon_count_queue.get_running_average())
+                    look_back_delay.append(running_average[-1])
+                    if len(look_back_delay) > tail :
+                        look_back_queue.push(look_back_delay.popleft())
+
+                    # Store data for plotting
+                    photon_count_data.append(photon_count_in_last_second)
+                    if bin_sink is not None :
+                        bin_sink(current_time, photon_count_in_last_second)
+                else :
+                    if timing :
+                        instrumentation.count('ebe_bins_closed')
+                    tail_counts.append(count + burst_value)
+                    tail_timestamps.append(current_time)
+                    if get_end_tail and len(tail_counts) == tail_counts.maxlen :
+                        light_curve_counts.extend(tail_counts.to_array())
+                        light_curve_timestamps.extend(tail_timestamps.to_array())
+                        get_end_tail = False
+
+                enter_check_pending = True
+                exit_check_pending = True
+                if timing :
+                    instrumentation.add_time('binning', perf_counter() - stage_start)
+
+            if timing :
+                instrumentation.add_time('bin_close_loop', perf_counter() - loop_start)
+                stage_start = perf_counter()
+
+            # Keep the most recent photons, flagging burst photons; the whole block is copied in at once
+            flags = block[2] != BACKGROUND if poisson_bursts else None
+            photon_list_queue.extend(times, energies, flags)
+            if photon_sink is not None :
+                photon_sink(times, energies, flags)
+            if timing :
+                instrumentation.add_time('photon_list', perf_counter() - stage_start)
+
+        if result.triggered() and result.exit_timestamp == NOT_TRIGGERED :
+            # Sources without a fixed duration (recorded data) end at their last photon
+            end_time = getattr(source, 'duration', None)
+            result.exit_timestamp = end_time if end_time is not None else previous_time
+        if timing :
+            instrumentation.add_time('total', perf_counter() - run_start)
+            result.metrics = instrumentation.metrics()
+        return result
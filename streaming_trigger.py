@@ -0,0 +1,266 @@
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+from config import GlobalState
+from ring_buffer import RingBuffer
+from simulator import NOT_TRIGGERED
+
+# Real-time streaming trigger
+#
+# StreamingTrigger accepts photons as they arrive (one at a time or in blocks) and runs an
+# enter/exit algorithm from trigger_algorithms (by default the one in Simulator.run()), emitting
+# TriggerEvents through callbacks and/or an asyncio.Queue. Bins are closed with vectorized searches
+# over each block and the trigger is only evaluated once per bin close, so the Python work per
+# photon is O(1) amortized and independent of the rate. State is bounded: the binners, the tail
+# bins and whatever the algorithm declares in state_size().
+
+# Incremental version of the binning in Simulator.run() / trigger_engine.bin_photons(): a bin closes
+# on the first photon at least bin_length after the previous close, and that photon belongs to it
+class StreamingBinner:
+    SPARSE_PHOTONS_PER_BIN = 16     # Above this many photons per bin, closes are searched one at a time
+
+    def __init__(self, bin_length, start_time=0.0):
+        self.bin_length = bin_length
+        self.last_close = start_time
+        self.open_count = 0                 # Photons already in the open bin from earlier blocks
+
+    # Returns (close_indices, counts) for the bins closed by this block of sorted times
+    def bin_block(self, times):
+        close_indices = []
+        i = int(np.searchsorted(times, self.last_close + self.bin_length, side='left'))
+        if len(times) and (times[-1] - self.last_close) * self.SPARSE_PHOTONS_PER_BIN < self.bin_length * len(times):
+            # Many photons per bin: search for each close on its own
+            while i < len(times):
+                close_indices.append(i)
+                i = max(i + 1, int(np.searchsorted(times, times[i] + self.bin_length, side='left')))
+        else:
+            # next_close[i] is where the bin opened by a close at photon i closes, found for all i at once
+            next_close = np.searchsorted(times, times + self.bin_length, side='left').tolist()
+            while i < len(next_close):
+                close_indices.append(i)
+                i = max(i + 1, next_close[i])
+        close_indices = np.array(close_indices, dtype=np.int64)
+        if len(close_indices):
+            self.last_close = times[close_indices[-1]]
+        counts = np.diff(close_indices, prepend=-1).astype(np.float64)
+        if len(counts):
+            counts[0] += self.open_count
+            self.open_count = len(times) - 1 - close_indices[-1]
+        else:
+            self.open_count += len(times)
+        return close_indices, counts
+
+    # bin_block() for one photon: the count of the bin it closes, or None if it closes none
+    def bin_photon(self, time):
+        if time < self.last_close + self.bin_length:
+            self.open_count += 1
+            return None
+        count = self.open_count + 1.0
+        self.last_close = time
+        self.open_count = 0
+        return count
+
+class TriggerEvent:
+    def __init__(self, kind, time, light_curve_counts=None, light_curve_timestamps=None, significance=None):
+        self.kind = kind                                    # 'enter' or 'exit'
+        self.time = time
+        self.light_curve_counts = light_curve_counts        # Tail bins before the trigger for 'enter'
+        self.light_curve_timestamps = light_curve_timestamps
+        self.significance = significance                    # Tail excess over the oldest tail bin in lookback stds
+
+    def __repr__(self):
+        return 'TriggerEvent(' + self.kind + ', ' + str(round(self.time, 4)) + 's)'
+
+class StreamingTrigger:
+    """
+    Push-based enter/exit trigger.
+
+    Built from a config.GlobalState or its vars dict. Feed photons with push(time) or
+    push_block(times) in time order; both return the TriggerEvents they caused, which are also
+    passed to on_enter/on_exit and put on queue (an asyncio.Queue) if given. The decision itself
+    is made by a trigger_algorithms.TriggerAlgorithm (the simulator's SignificanceTrigger by
+    default, or a name from trigger_algorithms.ALGORITHMS), checked on the first photon after a bin
+    closes, so the default timestamps match Simulator.run() for the same photons. With rearm=True
+    the trigger can fire again once the algorithm is ready after an exit; otherwise, like the
+    simulator, it fires at most once.
+    """
+
+    LATENCY_SAMPLES = 10000         # Recent push timings kept for latency percentiles
+
+    def __init__(self, config=None, on_enter=None, on_exit=None, queue=None, rearm=False, algorithm=None):
+        from trigger_algorithms import SignificanceTrigger, make_algorithm
+        if config is None:
+            config = GlobalState()
+        vars = config.vars if isinstance(config, GlobalState) else config
+        if algorithm is None:
+            algorithm = SignificanceTrigger.from_vars(vars)
+        elif isinstance(algorithm, str):
+            algorithm = make_algorithm(algorithm, vars)
+        self.algorithm = algorithm
+        self.ebe_bin_length = vars['ebe_bin_length']
+        self.on_enter = on_enter
+        self.on_exit = on_exit
+        self.queue = queue
+        self.rearm = rearm
+
+        self.second_binner = StreamingBinner(1)
+        self.ebe_binner = StreamingBinner(self.ebe_bin_length)
+        tail_length = int(vars['tail'] / self.ebe_bin_length)
+        self.tail_counts = RingBuffer(tail_length)          # Recent ebe bins, sent with 'enter' events
+        self.tail_timestamps = RingBuffer(tail_length)
+
+        self.trigger_threshold_met = False
+        self.already_triggered = False
+        self.enter_check_pending = False     # set when a bin closes, cleared once checked
+        self.exit_check_pending = False
+        self.triggered_timestamp = NOT_TRIGGERED
+        self.exit_timestamp = NOT_TRIGGERED
+
+        self.photons = 0
+        self.push_seconds = 0.0
+        self.push_timings = deque(maxlen=self.LATENCY_SAMPLES)     # (seconds, photons) of recent pushes
+
+    # Scalar fast path of push_block() for one photon: no arrays are built, and the algorithm is only
+    # consulted after a bin has closed. The photon is checked before its own bin closes, as in
+    # _process()
+    def push(self, time, energy=None):
+        start = perf_counter()
+        events = []
+        if self.enter_check_pending or self.exit_check_pending:
+            self._check_photon(time, events)
+        count = self.second_binner.bin_photon(time)
+        if count is not None:
+            self.algorithm.close_second(count, time)
+            self.enter_check_pending = True
+            self.exit_check_pending = True
+        count = self.ebe_binner.bin_photon(time)
+        if count is not None:
+            self._close_ebe(count, time)
+            self.enter_check_pending = True
+            self.exit_check_pending = True
+        self._record_timing(start, 1)
+        return events
+
+    # Timed as a whole, binning included
+    def push_block(self, times, energies=None):
+        start = perf_counter()
+        times = np.asarray(times, dtype=np.float64)
+        if len(times) == 0:
+            return []
+        second_closes, second_counts = self.second_binner.bin_block(times)
+        ebe_closes, ebe_counts = self.ebe_binner.bin_block(times)
+        events = self._process(times, second_closes, second_counts, ebe_closes, ebe_counts)
+        self._record_timing(start, len(times))
+        return events
+
+    # Same as push_block() for a block already binned by StreamingBinners of 1s and ebe_bin_length
+    # (e.g. by a separate pipeline stage); the trigger's own binners are not used
+    def push_binned(self, times, second_closes, second_counts, ebe_closes, ebe_counts):
+        start = perf_counter()
+        if len(times) == 0:
+            return []
+        events = self._process(times, second_closes, second_counts, ebe_closes, ebe_counts)
+        self._record_timing(start, len(times))
+        return events
+
+    def _record_timing(self, start, photons):
+        elapsed = perf_counter() - start
+        self.photons += photons
+        self.push_seconds += elapsed
+        self.push_timings.append((elapsed, photons))
+
+    def _process(self, times, second_closes, second_counts, ebe_closes, ebe_counts):
+        events = []
+
+        # Bin closes from both resolutions, in photon order
+        closes = [(i, 0, c) for i, c in zip(second_closes.tolist(), second_counts.tolist())]
+        closes += [(i, 1, c) for i, c in zip(ebe_closes.tolist(), ebe_counts.tolist())]
+        closes.sort()
+
+        # Checks between closes run on photons first..last; the closing photon is checked before
+        # its bin is updated, as in the simulator
+        first = 0
+        for index, kind, count in closes:
+            self._check(times, first, index, events)
+            if kind == 0:
+                self.algorithm.close_second(count, times[index])
+            else:
+                self._close_ebe(count, times[index])
+            self.enter_check_pending = True
+            self.exit_check_pending = True
+            first = index + 1
+        self._check(times, first, len(times) - 1, events)
+        return events
+
+    def _check(self, times, first, last, events):
+        if first > last:
+            return
+        if self.enter_check_pending and not self.already_triggered and not self.trigger_threshold_met:
+            j = max(first, int(np.searchsorted(times, self.algorithm.warm_up, side='right')))
+            if j <= last:
+                self.enter_check_pending = False
+                self._check_enter(times[j], events)
+                if self.trigger_threshold_met:
+                    self._check_exit(times[j], events)
+                return
+        if self.exit_check_pending and self.trigger_threshold_met:
+            self._check_exit(times[first], events)
+
+    # _check() for a single photon
+    def _check_photon(self, time, events):
+        if self.enter_check_pending and not self.already_triggered and not self.trigger_threshold_met:
+            if time > self.algorithm.warm_up:
+                self.enter_check_pending = False
+                self._check_enter(time, events)
+                if self.trigger_threshold_met:
+                    self._check_exit(time, events)
+                return
+        if self.exit_check_pending and self.trigger_threshold_met:
+            self._check_exit(time, events)
+
+    def _check_enter(self, time, events):
+        significance = self.algorithm.check_enter(time)
+        if significance is not None:
+            self.trigger_threshold_met = True
+            self.triggered_timestamp = time
+            self.exit_timestamp = NOT_TRIGGERED
+            self._emit(TriggerEvent('enter', time, self.tail_counts.to_array(), self.tail_timestamps.to_array(), significance), events)
+
+    def _check_exit(self, time, events):
+        self.exit_check_pending = False
+        if self.algorithm.check_exit(time):
+            self.trigger_threshold_met = False
+            self.exit_timestamp = time
+            self.already_triggered = True
+            self.algorithm.reset_after_exit()
+            self._emit(TriggerEvent('exit', time), events)
+
+    def _close_ebe(self, count, time):
+        self.algorithm.close_ebe(count, time)
+        self.tail_counts.append(count)
+        self.tail_timestamps.append(time)
+        if self.rearm and self.already_triggered and self.algorithm.ready():
+            self.already_triggered = False
+
+    def _emit(self, event, events):
+        events.append(event)
+        if event.kind == 'enter' and self.on_enter is not None:
+            self.on_enter(event)
+        if event.kind == 'exit' and self.on_exit is not None:
+            self.on_exit(event)
+        if self.queue is not None:
+            self.queue.put_nowait(event)
+
+    # Processing time per photon: mean over the whole stream, and percentiles / max over the
+    # recent pushes (for push() these are per-photon latencies)
+    def latency_stats(self):
+        per_photon = np.array([seconds / photons for seconds, photons in self.push_timings])
+        return {
+            'photons': self.photons,
+            'mean_seconds_per_photon': self.push_seconds / self.photons if self.photons else 0.0,
+            'p50_seconds_per_photon': float(np.percentile(per_photon, 50)) if len(per_photon) else 0.0,
+            'p99_seconds_per_photon': float(np.percentile(per_photon, 99)) if len(per_photon) else 0.0,
+            'max_push_seconds': max(seconds for seconds, photons in self.push_timings) if self.push_timings else 0.0,
+        }
@@ -0,0 +1,188 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from background_cache import DEFAULT_MAX_BYTES, BackgroundCache
+from config import GlobalState
+from grb import grb
+from photon_source import PhotonSource, PoissonBurstSource
+from run_io import save_table
+from simulator import Simulator
+from trigger_engine import TriggerEngine
+
+# Monte Carlo trigger efficiency sweep
+#
+# Every cell of a parameter grid is simulated with n_seeds independent background realizations and
+# the trigger outcome of each run is reduced to detection fraction, false trigger fraction and
+# trigger latency per cell. Runs are fanned out over a process pool. The default 'engine' backend
+# only uses the vectorized PhotonSource and TriggerEngine, which give the same trigger timestamps
+# as the full photon-by-photon Simulator used by the 'simulator' backend.
+#
+# Realization r of every cell is seeded with the entropy [random_seed, r], so cells are compared
+# on matching random streams and a sweep is reproducible for a given random_seed. Because of that
+# the engine backend can take its backgrounds from a background_cache.BackgroundCache (cache_dir):
+# every cell with the same rate and duration then reuses the cached, already binned background and
+# only adds its burst.
+
+# Burst parameters in a grid; every other key is a GlobalState variable
+BURST_KEYS = ('amplitude', 'sigma', 'peak_time')
+
+# Same grid run_tests() plots
+DEFAULT_GRID = {
+    'amplitude': [8.7, 87, 870, 8700],
+    'sigma': [0.005, 0.05, 0.5, 5, 50, 500],
+}
+
+# Expand {'name': [values]} into a list of cells, one dict per combination
+def expand_grid(grid):
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+# Settings for one cell: the base GlobalState variables overridden by the cell's values
+def cell_vars(base_vars, cell):
+    vars = dict(base_vars)
+    vars.update({k: v for k, v in cell.items() if k not in BURST_KEYS})
+    return vars
+
+def cell_burst(vars, cell):
+    return grb(peak_time=cell.get('peak_time', vars['duration'] / 2),
+               amplitude=cell.get('amplitude', vars['default_A']),
+               sigma=cell.get('sigma', vars['default_sigma']))
+
+# Window counted as a detection: peak_time +/- window_sigmas widths. grb.burst_addition() divides
+# by 2 * sigma rather than 2 * sigma ** 2, so the pulse width is sqrt(sigma).
+def burst_window(burst, window_sigmas):
+    width = window_sigmas * np.sqrt(burst.sigma)
+    return burst.peak_time - width, burst.peak_time + width
+
+# Simulate one realization of one cell; runs in a worker process
+def run_realization(task):
+    base_vars, cell, realization, window_sigmas, backend, cache_dir, cache_max_bytes = task
+    vars = cell_vars(base_vars, cell)
+    vars['random_seed'] = [vars['random_seed'], realization]
+    burst = cell_burst(vars, cell)
+    bursts = [burst] if burst.amplitude != 0 else []
+
+    cache = BackgroundCache(cache_dir, cache_max_bytes) if cache_dir is not None else None
+    if backend == 'simulator':
+        result = Simulator(vars, bursts).run()
+    elif cache is not None and not vars.get('poisson_bursts', False):
+        # Cached background bins plus the burst's expected counts
+        engine = TriggerEngine.from_vars(vars)
+        background = (vars['rate'], vars['duration'], vars['random_seed'])
+        times, _ = cache.photons(*background)
+        counts, ra_timestamps = cache.binned(1, *background)
+        ebe_counts, ebe_timestamps = cache.binned(vars['ebe_bin_length'], *background)
+        result = engine.evaluate_counts(counts, ra_timestamps, ebe_counts, ebe_timestamps, bursts, times, vars['duration'])
+    else:
+        # Bursts are either sampled as photons or added to the bins as their expected counts
+        if cache is not None:
+            source = cache.source(vars['rate'], vars['duration'], vars['random_seed'])
+        else:
+            source = PhotonSource(vars['rate'], vars['duration'], vars['random_seed'])
+        binned_bursts = bursts
+        if vars.get('poisson_bursts', False):
+            source = PoissonBurstSource(source, bursts)
+            binned_bursts = []
+        times = np.concatenate([block[0] for block in source] or [np.array([])])
+        result = TriggerEngine.from_vars(vars).evaluate_photons(times, binned_bursts, vars['duration'])
+
+    window_start, window_end = burst_window(burst, window_sigmas)
+    triggered = result.triggered()
+    detected = bool(triggered and bursts and window_start <= result.triggered_timestamp <= window_end)
+    return {
+        'triggered': triggered,
+        'detected': detected,
+        'false_trigger': triggered and not detected,
+        'latency': float(result.triggered_timestamp - burst.peak_time) if detected else np.nan,
+    }
+
+# Aggregate the runs of one cell into a table row
+def summarize(cell, runs):
+    latencies = np.array([run['latency'] for run in runs if run['detected']])
+    n = len(runs)
+    row = dict(cell)
+    row.update({
+        'runs': n,
+        'detection_fraction': float(sum(run['detected'] for run in runs) / n),
+        'false_trigger_fraction': float(sum(run['false_trigger'] for run in runs) / n),
+        'mean_latency': float(latencies.mean()) if len(latencies) else np.nan,
+        'median_latency': float(np.median(latencies)) if len(latencies) else np.nan,
+        'std_latency': float(latencies.std()) if len(latencies) else np.nan,
+    })
+    return row
+
+def run_sweep(grid=None, n_seeds=100, base_vars=None, workers=None, window_sigmas=3, backend='engine',
+              cache_dir=None, cache_max_bytes=None):
+    """
+    Run n_seeds realizations of every cell in grid and return one summary row (dict) per cell.
+
+    grid maps burst parameters (amplitude, sigma, peak_time) or GlobalState variables (rate,
+    enter_significance_constant, tail, enter_look_back_to, ...) to lists of values. base_vars
+    defaults to a fresh GlobalState. workers=1 runs in-process, None uses every core. backend is
+    'engine' (vectorized, default) or 'simulator'. With cache_dir the engine backend reads and
+    stores backgrounds in a BackgroundCache there, capped at cache_max_bytes.
+    """
+    grid = DEFAULT_GRID if grid is None else grid
+    base_vars = GlobalState().vars if base_vars is None else base_vars
+    cells = expand_grid(grid)
+    cache_max_bytes = DEFAULT_MAX_BYTES if cache_max_bytes is None else cache_max_bytes
+    tasks = [(base_vars, cell, realization, window_sigmas, backend, cache_dir, cache_max_bytes)
+             for cell in cells for realization in range(n_seeds)]
+
+    if workers == 1:
+        runs = list(map(run_realization, tasks))
+    else:
+        workers = workers or os.cpu_count()
+        chunksize = max(1, len(tasks) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            runs = list(executor.map(run_realization, tasks, chunksize=chunksize))
+
+    return [summarize(cell, runs[i * n_seeds:(i + 1) * n_seeds]) for i, cell in enumerate(cells)]
+
+def write_table(rows, file):
+    writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Monte Carlo trigger efficiency sweep')
+    parser.add_argument('--grid', help='JSON file mapping parameter names to lists of values')
+    parser.add_argument('--config', help='GlobalState JSON file with the base settings')
+    parser.add_argument('--seeds', type=int, default=100, help='realizations per cell')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--window', type=float, default=3, help='detection window around the peak, in burst widths')
+    parser.add_argument('--backend', choices=['engine', 'simulator'], default='engine', help='how each run is simulated')
+    parser.add_argument('--out', help='CSV file for the results (default: stdout)')
+    parser.add_argument('--save-dir', help='also save the table as a binary run_io directory')
+    parser.add_argument('--cache-dir', help='reuse backgrounds from this BackgroundCache directory (engine backend)')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_BYTES / 2 ** 20, help='background cache size cap')
+    args = parser.parse_args(argv)
+
+    grid = None
+    if args.grid:
+        with open(args.grid, 'r') as file:
+            grid = json.load(file)
+    state = GlobalState()
+    if args.config:
+        state.load(args.config)
+
+    rows = run_sweep(grid, args.seeds, state.vars, args.workers, args.window, args.backend,
+                     args.cache_dir, int(args.cache_max_mb * 2 ** 20))
+    if args.out:
+        with open(args.out, 'w', newline='') as file:
+            write_table(rows, file)
+        print('Wrote ' + str(len(rows)) + ' cells to ' + args.out)
+    else:
+        write_table(rows, sys.stdout)
+    if args.save_dir:
+        save_table(args.save_dir, rows, state, grid=grid or DEFAULT_GRID, seeds=args.seeds, backend=args.backend)
+
+if __name__ == "__main__":
+    main()
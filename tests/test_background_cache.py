@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+
+from background_cache import BackgroundCache, background_key
+from config import GlobalState
+from photon_source import PhotonSource
+from simulator import Simulator
+from trigger_engine import bin_photons
+
+def test_cached_photons_match_photon_source(tmp_path):
+    cache = BackgroundCache(str(tmp_path))
+    times, energies = cache.photons(57, 200, 4)
+    expected = list(PhotonSource(57, 200, 4))
+    assert np.array_equal(times, np.concatenate([block[0] for block in expected]))
+    assert np.array_equal(energies, np.concatenate([block[1] for block in expected]))
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    again, _ = cache.photons(57, 200, 4)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert isinstance(again, np.memmap) or isinstance(again.base, np.memmap)
+    assert np.array_equal(again, times)
+
+def test_cached_source_gives_the_same_simulation(tmp_path):
+    state = GlobalState()
+    state.vars['random_seed'] = 2
+    cache = BackgroundCache(str(tmp_path))
+    vars = state.vars
+    expected = Simulator(state).run()
+    for attempt in range(2):
+        result = Simulator(state).run(source=cache.source(vars['rate'], vars['duration'], vars['random_seed']))
+        assert result.triggered_timestamp == expected.triggered_timestamp
+        assert result.exit_timestamp == expected.exit_timestamp
+
+def test_binned_matches_bin_photons(tmp_path):
+    cache = BackgroundCache(str(tmp_path))
+    counts, close_times = cache.binned(0.04, 57, 100, 1)
+    expected_counts, expected_times, _ = bin_photons(cache.photons(57, 100, 1)[0], 0.04)
+    assert np.array_equal(counts, expected_counts)
+    assert np.array_equal(close_times, expected_times)
+
+def test_keys_differ_by_configuration():
+    assert background_key(57, 100, 1) != background_key(57, 100, 2)
+    assert background_key(57, 100, 1) != background_key(58, 100, 1)
+    assert background_key(57, 100, 1) == background_key(57, 100, 1)
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = BackgroundCache(str(tmp_path), max_bytes=1)
+    cache.photons(57, 100, 1)
+    cache.photons(57, 100, 2)
+    names = os.listdir(str(tmp_path))
+    assert names == [background_key(57, 100, 2) + '-photons.npy']
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from grb import BurstSet, grb
+
+def mixed_bursts(rng, n=40, duration=1000):
+    sigmas = 10 ** rng.uniform(-4, 3, n)
+    return [grb(peak_time=p, amplitude=a, sigma=s)
+            for p, a, s in zip(rng.uniform(0, duration, n).tolist(), (10 ** rng.uniform(-1, 4, n)).tolist(), sigmas.tolist())]
+
+def scalar_sum(bursts, times):
+    return np.array([sum(b.burst_addition(t) for b in bursts) for t in times.tolist()])
+
+@pytest.mark.parametrize('chunk_size', [7, 100, BurstSet.CHUNK_SIZE])
+@pytest.mark.parametrize('sort', [True, False])
+def test_evaluate_matches_the_sum_of_burst_additions(monkeypatch, chunk_size, sort):
+    monkeypatch.setattr(BurstSet, 'CHUNK_SIZE', chunk_size)
+    rng = np.random.default_rng(7)
+    bursts = mixed_bursts(rng)
+    # Random times plus times right at every peak, so narrow pulses are sampled where they are large
+    times = np.concatenate((rng.uniform(-50, 1050, 3000), [b.peak_time for b in bursts]))
+    if sort:
+        times.sort()
+    # Beyond support_sigmas widths a pulse is below 1e-21 of its amplitude, which evaluate() drops
+    assert BurstSet.from_grbs(bursts).evaluate(times) == pytest.approx(scalar_sum(bursts, times), rel=1e-12, abs=1e-12)
+
+def test_pulses_straddling_chunk_edges(monkeypatch):
+    monkeypatch.setattr(BurstSet, 'CHUNK_SIZE', 10)
+    times = np.linspace(0, 100, 95)
+    # Each pulse covers the end of one chunk and the start of the next
+    bursts = [grb(peak_time=p, amplitude=100, sigma=0.5) for p in times[9::10].tolist()]
+    assert BurstSet.from_grbs(bursts).evaluate(times) == pytest.approx(scalar_sum(bursts, times), rel=1e-12, abs=1e-12)
+
+def test_support_truncation():
+    burst_set = BurstSet([50.0], [100.0], [4.0], support_sigmas=3)
+    width = 2.0
+    inside = 50 + 3 * width
+    assert burst_set.evaluate(inside) == pytest.approx(grb(50, 100, 4).burst_addition(inside))
+    assert burst_set.evaluate(np.nextafter(inside, np.inf)) == 0.0
+    assert burst_set.evaluate(50 - 3 * width - 1e-9) == 0.0
+
+def test_scalar_and_shaped_times():
+    bursts = [grb(peak_time=10, amplitude=5, sigma=2), grb(peak_time=12, amplitude=3, sigma=0.1)]
+    burst_set = BurstSet.from_grbs(bursts)
+    value = burst_set.evaluate(11.0)
+    assert isinstance(value, float) and value == pytest.approx(sum(b.burst_addition(11.0) for b in bursts))
+    grid = np.linspace(5, 15, 12).reshape(3, 4)
+    assert burst_set.evaluate(grid).shape == (3, 4)
+    assert burst_set.evaluate(grid).ravel() == pytest.approx(scalar_sum(bursts, grid.ravel()))
+    assert BurstSet().evaluate(np.arange(3.0)).tolist() == [0.0, 0.0, 0.0]
@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pytest
+
+from config import GlobalState
+from grb import BurstSet, grb
+
+def sample_set():
+    return BurstSet([50.0, 120.5, 300.25], [90.0, 1e-3, 12345.678901234567], [5.0, 0.25, 400.0])
+
+def assert_same(bursts, expected):
+    assert np.array_equal(bursts.peak_times, expected.peak_times)
+    assert np.array_equal(bursts.amplitudes, expected.amplitudes)
+    assert np.array_equal(bursts.sigmas, expected.sigmas)
+
+@pytest.mark.parametrize('extension', ['.csv', '.json', '.npy', '.npz', '.txt'])
+def test_save_and_import_round_trip(tmp_path, extension):
+    path = str(tmp_path / ('bursts' + extension))
+    sample_set().save(path)
+    assert_same(BurstSet.from_file(path), sample_set())
+
+def test_import_csv_with_reordered_header_and_comments(tmp_path):
+    path = tmp_path / 'bursts.csv'
+    path.write_text('# bursts from a sweep\nsigma,peak_time,amplitude\n5,50,90\n0.25,120.5,0.001  # faint\n')
+    bursts = BurstSet.from_file(str(path))
+    assert bursts.peak_times.tolist() == [50.0, 120.5]
+    assert bursts.amplitudes.tolist() == [90.0, 0.001]
+    assert bursts.sigmas.tolist() == [5.0, 0.25]
+
+def test_import_headerless_whitespace_table(tmp_path):
+    path = tmp_path / 'bursts.txt'
+    path.write_text('50 90 5\n120.5 1e-3 0.25\n')
+    assert BurstSet.from_file(str(path)).peak_times.tolist() == [50.0, 120.5]
+
+def test_import_json_list_and_settings_file(tmp_path):
+    listed = tmp_path / 'list.json'
+    listed.write_text(json.dumps([{'peak_time': 50, 'amplitude': 90, 'sigma': 5}]))
+    assert BurstSet.from_file(str(listed)).to_grbs()[0].peak_time == 50
+
+    state = GlobalState()
+    state.bursts = sample_set()
+    settings = str(tmp_path / 'settings.json')
+    state.save(settings)
+    assert_same(BurstSet.from_file(settings), sample_set())
+
+def test_settings_keep_their_bursts(tmp_path):
+    state = GlobalState()
+    state.vars['rate'] = 42
+    state.bursts = BurstSet.from_grbs([grb(peak_time=10, amplitude=20, sigma=3)])
+    path = str(tmp_path / 'settings.json')
+    state.save(path)
+
+    loaded = GlobalState()
+    loaded.load(path)
+    assert loaded.vars['rate'] == 42
+    assert_same(loaded.bursts, state.bursts)
+
+def test_settings_without_bursts_and_new_settings_load(tmp_path):
+    path = tmp_path / 'old.json'
+    vars = GlobalState().vars
+    del vars['bank_enter_z_score']
+    path.write_text(json.dumps(vars))
+    loaded = GlobalState()
+    loaded.load(str(path))
+    assert loaded.bursts is None
+    assert loaded.vars['bank_enter_z_score'] == GlobalState().vars['bank_enter_z_score']
+
+def test_import_single_burst_npy(tmp_path):
+    path = str(tmp_path / 'one.npy')
+    np.save(path, np.array([50.0, 90.0, 5.0]))
+    bursts = BurstSet.from_file(path)
+    assert (bursts.peak_times.tolist(), bursts.amplitudes.tolist(), bursts.sigmas.tolist()) == ([50.0], [90.0], [5.0])
+
+    structured = str(tmp_path / 'structured.npy')
+    np.save(structured, np.array((50.0, 90.0, 5.0), dtype=[('peak_time', '<f8'), ('amplitude', '<f8'), ('sigma', '<f8')]))
+    assert BurstSet.from_file(structured).peak_times.tolist() == [50.0]
+
+def test_first_row_with_inf_or_nan_is_data(tmp_path):
+    path = tmp_path / 'bursts.txt'
+    path.write_text('50 inf 5\n120.5 nan 0.25\n')
+    bursts = BurstSet.from_file(str(path))
+    assert bursts.peak_times.tolist() == [50.0, 120.5]
+    assert np.isinf(bursts.amplitudes[0]) and np.isnan(bursts.amplitudes[1])
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import cli
+from config import GlobalState
+from grb import BurstSet
+from run_io import open_run
+from simulator import Simulator
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_cli(capsys, *argv):
+    cli.main(list(argv))
+    return json.loads(capsys.readouterr().out)
+
+def test_run_matches_simulator(capsys):
+    output = run_cli(capsys, 'run', '--seed', '1')
+    state = GlobalState()
+    state.vars['random_seed'] = 1
+    expected = Simulator(state).run()
+    assert output['triggered'] is True
+    assert output['triggered_timestamp'] == expected.triggered_timestamp
+    assert output['exit_timestamp'] == expected.exit_timestamp
+    assert output['seconds_binned'] == len(expected.photon_count_data)
+    assert 0 < output['timing']['startup_seconds']
+
+def test_set_no_bursts_and_out(capsys, tmp_path):
+    out = str(tmp_path / 'run')
+    output = run_cli(capsys, 'run', '--seed', '2', '--set', 'duration=50', '--no-bursts', '--out', out, '--photons')
+    assert output['triggered'] is False and output['triggered_timestamp'] is None
+    run = open_run(out)
+    assert run.header['config']['duration'] == 50
+    assert len(run.photons) > 0 and run.photons['time'].max() < 50
+
+def test_bursts_file(capsys, tmp_path):
+    path = str(tmp_path / 'bursts.json')
+    BurstSet([60.0], [90.0], [5.0]).save(path)
+    output = run_cli(capsys, 'run', '--seed', '1', '--bursts', path)
+    state = GlobalState()
+    state.vars['random_seed'] = 1
+    expected = Simulator(state, BurstSet.from_file(path)).run()
+    assert output['triggered_timestamp'] == expected.triggered_timestamp
+
+def test_unknown_setting_is_rejected():
+    with pytest.raises(SystemExit):
+        cli.main(['run', '--set', 'no_such_setting=1'])
+
+def test_replay_of_a_saved_run(capsys, tmp_path):
+    out = str(tmp_path / 'run')
+    recorded = run_cli(capsys, 'run', '--seed', '3', '--no-bursts', '--out', out, '--photons')
+    replayed = run_cli(capsys, 'replay', os.path.join(out, 'photons.bin'), '--seed', '3')
+    assert replayed['seconds_binned'] == recorded['seconds_binned']
+
+def test_continuous_writes_segments(capsys, tmp_path):
+    out = str(tmp_path / 'continuous')
+    output = run_cli(capsys, 'continuous', '--seed', '1', '--set', 'duration=300', '--scatter', '2', '--segment', '100', '--out', out)
+    assert output['segments'] == 3
+    assert sorted(name for name in os.listdir(out) if name.startswith('segment_')) == ['segment_00000', 'segment_00001', 'segment_00002']
+
+def test_headless_run_does_not_import_matplotlib():
+    code = 'import sys, cli; cli.main(["run", "--seed", "1"]); assert "matplotlib" not in sys.modules'
+    subprocess.run([sys.executable, '-c', code], cwd=REPOSITORY_DIR, check=True, capture_output=True)
+
+def test_bands_trigger_per_group_and_save_the_banded_curve(capsys, tmp_path):
+    out = str(tmp_path / 'run')
+    output = run_cli(capsys, 'run', '--seed', '1', '--bands', '--set', 'trigger_bands=[[0, 1, 2], [2]]', '--out', out)
+    assert output['bands']['edges'] == [1.0, 10.0, 100.0, 1000.0]
+    assert [group['bands'] for group in output['bands']['groups']] == [[0, 1, 2], [2]]
+    all_bands = output['bands']['groups'][0]
+    assert all_bands['triggered'] is True
+    assert all_bands['triggered_timestamp'] == pytest.approx(output['triggered_timestamp'])
+    assert all_bands['exit_timestamp'] == pytest.approx(output['exit_timestamp'])
+
+    run = open_run(out)
+    assert run['ebe_band_counts'].shape[1] == 3
+    with open(os.path.join(out, cli.BANDS_CSV)) as file:
+        lines = file.read().splitlines()
+    assert lines[0] == 'time,1.0-10.0 keV,10.0-100.0 keV,100.0-1000.0 keV'
+    assert len(lines) == len(run['ebe_band_timestamps']) + 1
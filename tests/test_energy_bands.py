@@ -0,0 +1,59 @@
+import io
+
+import numpy as np
+import pytest
+
+from config import GlobalState
+from energy_bands import band_fractions, band_indices, banded_light_curve, bin_photons_by_band, evaluate_bands
+from grb import grb
+from photon_source import PhotonSource, power_law_energies
+from simulator import Simulator
+from trigger_engine import bin_photons
+
+EDGES = [1, 10, 100, 1000]
+
+def photons(seed=1, duration=200):
+    blocks = list(PhotonSource(57, duration, seed))
+    return np.concatenate([block[0] for block in blocks]), np.concatenate([block[1] for block in blocks])
+
+def test_band_indices():
+    assert band_indices(np.array([0.5, 1, 9.99, 10, 999, 1000, 5000]), EDGES).tolist() == [0, 0, 0, 1, 2, 2, 2]
+
+def test_band_counts_sum_to_the_single_band_counts():
+    times, energies = photons()
+    counts, close_times, close_indices = bin_photons_by_band(times, energies, 0.04, EDGES)
+    expected_counts, expected_times, expected_indices = bin_photons(times, 0.04)
+    assert np.array_equal(counts.sum(axis=1), expected_counts)
+    assert np.array_equal(close_times, expected_times)
+    # Each band's count is the number of the bin's photons in that band
+    bands = band_indices(energies, EDGES)
+    last = close_indices[5]
+    first = close_indices[4] + 1
+    assert counts[5].tolist() == np.bincount(bands[first:last + 1], minlength=3).tolist()
+
+def test_band_fractions_match_sampled_energies():
+    fractions = band_fractions(EDGES)
+    assert fractions.sum() == pytest.approx(1.0)
+    energies = power_law_energies(np.random.default_rng(0), 200000)
+    sampled = np.bincount(band_indices(energies, EDGES), minlength=3) / len(energies)
+    assert sampled == pytest.approx(fractions, abs=0.005)
+
+def test_all_bands_trigger_like_the_simulator():
+    state = GlobalState()
+    state.vars.update(random_seed=1, duration=200)
+    bursts = [grb(peak_time=100, amplitude=90, sigma=5)]
+    expected = Simulator(state, bursts).run()
+    times, energies = photons(1, 200)
+    results, curve = evaluate_bands(state.vars, times, energies, bursts, EDGES, [[0, 1, 2], [2]], duration=200)
+    assert results[(0, 1, 2)].triggered_timestamp == pytest.approx(expected.triggered_timestamp)
+    assert results[(0, 1, 2)].exit_timestamp == pytest.approx(expected.exit_timestamp)
+    assert set(results) == {(0, 1, 2), (2,)}
+
+def test_csv_has_one_column_per_band():
+    times, energies = photons(2, 20)
+    curve = banded_light_curve(times, energies, EDGES, 0.04)
+    file = io.StringIO()
+    curve.write_csv(file)
+    lines = file.getvalue().splitlines()
+    assert lines[0] == 'time,1.0-10.0 keV,10.0-100.0 keV,100.0-1000.0 keV'
+    assert len(lines) == len(curve.ebe_timestamps) + 1
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from curve_fitting.fitting import FWHM_PER_STD, FredPulse, GaussianPulse, MultiPulseModel, fit_curve, fit_file, fit_files
+
+pytest.importorskip('scipy')
+
+# Width of the region where values >= half the maximum, on a dense grid
+def measured_fwhm(t, values):
+    above = t[values >= values.max() / 2]
+    return above[-1] - above[0]
+
+@pytest.mark.parametrize('amplitude, start, tau1, tau2', [(100, 2, 3, 5), (1, 0, 0.1, 20), (5e4, -10, 40, 0.5)])
+def test_fred_peak_width_is_the_measured_fwhm(amplitude, start, tau1, tau2):
+    t = np.linspace(start, start + 4 * np.sqrt(tau1 * tau2) + 20 * tau2, 2000001)
+    values = FredPulse.evaluate(t, amplitude, start, tau1, tau2)
+    peak_time, peak_rate, width = FredPulse.peak(amplitude, start, tau1, tau2)
+    assert width * FWHM_PER_STD == pytest.approx(measured_fwhm(t, values), rel=1e-4)
+    assert peak_time == pytest.approx(t[np.argmax(values)], abs=1e-4 * (tau1 + tau2))
+    assert peak_rate == pytest.approx(values.max())
+
+def test_fred_example_fwhm():
+    assert FredPulse.peak(100, 2, 3, 5)[2] * FWHM_PER_STD == pytest.approx(8.106, abs=1e-3)
+
+def test_gaussian_peak_width_is_the_measured_fwhm():
+    t = np.linspace(-50, 50, 1000001)
+    assert GaussianPulse.peak(3, 0, 4)[2] * FWHM_PER_STD == pytest.approx(measured_fwhm(t, GaussianPulse.evaluate(t, 3, 0, 4)), rel=1e-4)
+
+@pytest.mark.parametrize('pulse, name', [(GaussianPulse, 'gaussian'), (FredPulse, 'fred')])
+def test_jacobian_matches_finite_differences(pulse, name):
+    parameters = [50.0, 3.0, 1.5] if name == 'gaussian' else [50.0, 1.0, 2.0, 4.0]
+    t = np.linspace(0, 20, 101)
+    analytic = pulse.jacobian(t, *parameters)
+    for column, value in enumerate(parameters):
+        step = 1e-6 * max(abs(value), 1)
+        up = list(parameters)
+        down = list(parameters)
+        up[column] += step
+        down[column] -= step
+        numeric = (pulse.evaluate(t, *up) - pulse.evaluate(t, *down)) / (2 * step)
+        assert analytic[:, column] == pytest.approx(numeric, rel=1e-4, abs=1e-6)
+
+def test_fit_recovers_a_noisy_gaussian():
+    rng = np.random.default_rng(1)
+    t = np.linspace(0, 100, 2000)
+    rate = MultiPulseModel('gaussian', 1).evaluate(t, 800.0, 42.0, 3.5, 100.0)
+    fit = fit_curve(t, rate + rng.normal(0, 10, len(t)), 'gaussian', 1)
+    assert fit.success
+    assert fit.parameters == pytest.approx([800.0, 42.0, 3.5, 100.0], rel=0.02)
+    assert fit.residual_rms == pytest.approx(10, rel=0.1)
+
+def test_fit_recovers_a_noisy_fred():
+    rng = np.random.default_rng(2)
+    t = np.linspace(0, 100, 4000)
+    truth = [600.0, 20.0, 4.0, 9.0, 50.0]
+    rate = MultiPulseModel('fred', 1).evaluate(t, *truth)
+    fit = fit_curve(t, rate + rng.normal(0, 5, len(t)), 'fred', 1)
+    assert fit.success
+    assert fit.parameters == pytest.approx(truth, rel=0.05)
+    # The exported burst has the pulse's peak and a Gaussian sigma (variance) of the same FWHM
+    burst = fit.to_grbs()[0]
+    peak_time, peak_rate, width = FredPulse.peak(*truth[:4])
+    assert burst.peak_time == pytest.approx(peak_time, rel=0.02)
+    assert np.sqrt(burst.sigma) == pytest.approx(width, rel=0.05)
+
+def test_fit_two_gaussians_and_export_state():
+    rng = np.random.default_rng(3)
+    t = np.linspace(0, 100, 3000)
+    truth = [500.0, 30.0, 2.0, 300.0, 70.0, 5.0, 20.0]
+    rate = MultiPulseModel('gaussian', 2).evaluate(t, *truth)
+    fit = fit_curve(t, rate + rng.normal(0, 5, len(t)), 'gaussian', 2)
+    peaks = sorted(fit.peaks())
+    assert [peak[0] for peak in peaks] == pytest.approx([30.0, 70.0], abs=0.1)
+    state = fit.to_global_state(kind='lgrb')
+    assert len(state.bursts) == 2
+    assert state.vars['lgrb_A'] == pytest.approx(500.0, rel=0.02)
+    assert state.vars['lgrb_sigma'] == pytest.approx(4.0, rel=0.05)
+
+def test_fit_file_and_fit_files(tmp_path):
+    t = np.linspace(0, 60, 600)
+    rate = MultiPulseModel('gaussian', 1).evaluate(t, 200.0, 25.0, 2.0, 10.0)
+    path = tmp_path / 'curve.dat'
+    path.write_text('# DP | Time (s) | Count rate (counts/s)\n# IP LinLin\n' +
+                    ''.join('DP ' + repr(x) + ' ' + repr(y) + '\n' for x, y in zip(t.tolist(), rate.tolist())))
+    fit = fit_file(str(path))
+    assert fit.parameters == pytest.approx([200.0, 25.0, 2.0, 10.0], rel=1e-4)
+    fits = fit_files([str(path), str(path)], workers=1)
+    assert [f.parameters.tolist() for f in fits] == [fit.parameters.tolist()] * 2
@@ -0,0 +1,55 @@
+import time
+
+from config import GlobalState
+from instrumentation import RUN_STAGES, Instrumentation, profile_call
+from photon_source import PhotonSource
+from simulator import Simulator
+
+def test_counters_and_timers_add_up():
+    instrumentation = Instrumentation()
+    items = list(instrumentation.timed_iter(iter([1, 2, 3]), 'produce'))
+    assert items == [1, 2, 3]
+    assert instrumentation.timers['produce'] >= 0
+
+    def slow():
+        time.sleep(0.01)
+        yield 'item'
+    list(instrumentation.timed_iter(slow(), 'slow'))
+    list(instrumentation.timed_iter(slow(), 'slow'))
+    assert instrumentation.timers['slow'] >= 0.02
+
+    instrumentation.count('blocks')
+    instrumentation.count('blocks', 4)
+    instrumentation.add_time('manual', 0.25)
+    instrumentation.add_time('manual', 0.5)
+    with instrumentation.stage('context'):
+        time.sleep(0.01)
+    assert instrumentation.counters['blocks'] == 5
+    assert instrumentation.timers['manual'] == 0.75
+    assert instrumentation.timers['context'] >= 0.01
+
+def test_metrics_and_summary_table_list_the_run_stages():
+    state = GlobalState()
+    state.vars['random_seed'] = 1
+    instrumentation = Instrumentation()
+    result = Simulator(state).run(instrumentation=instrumentation)
+    metrics = result.metrics
+    assert metrics == instrumentation.metrics()
+    assert set(RUN_STAGES) <= set(metrics['timers'])
+    timers = metrics['timers']
+    assert timers['photon_generation'] + timers['burst_evaluation'] + timers['bin_close_loop'] + timers['photon_list'] <= timers['total']
+    assert timers['trigger_evaluation'] <= timers['bin_close_loop']
+    photons = sum(len(times) for times, energies in PhotonSource(state.vars['rate'], state.vars['duration'], 1))
+    assert metrics['counters']['photons_generated'] == photons
+    assert metrics['counters']['second_bins_closed'] == len(result.photon_count_data)
+    assert metrics['counters']['trigger_entries'] == 1 and metrics['counters']['trigger_exits'] == 1
+    assert metrics['photons_per_second'] == metrics['counters']['photons_generated'] / metrics['timers']['total']
+
+    table = instrumentation.summary_table()
+    for name in list(RUN_STAGES) + list(metrics['counters']):
+        assert name in table
+
+def test_profile_call_returns_the_result_and_writes_the_report(tmp_path):
+    output = tmp_path / 'profile.txt'
+    assert profile_call(lambda: sum(range(100)), output=str(output)) == 4950
+    assert 'function calls' in output.read_text()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from lifo_queue import FixedLengthLIFOQueue
+
+def assert_stats_match(queue):
+    items = np.array(queue.queue, dtype=np.float64)
+    expected_var = np.var(items) if len(items) else 0.0
+    expected_std = np.std(items) if len(items) else 0.0
+    assert queue.get_running_variance() == pytest.approx(expected_var, rel=1e-9, abs=1e-9)
+    assert queue.get_running_std() == pytest.approx(expected_std, rel=1e-9, abs=1e-9)
+
+def test_running_variance_matches_numpy_while_filling_and_evicting():
+    rng = np.random.default_rng(3)
+    queue = FixedLengthLIFOQueue(7)
+    for count in rng.poisson(50, size=40):
+        queue.push(int(count))
+        assert_stats_match(queue)
+    assert queue.size() == 7
+
+def test_running_variance_matches_numpy_after_pops():
+    queue = FixedLengthLIFOQueue(5)
+    for count in (4, 9, 1, 16, 25, 3):
+        queue.push(count)
+    while queue.size():
+        queue.pop()
+        assert_stats_match(queue)
+    assert queue.pop() is None
+    assert queue.get_running_variance() == 0
+    queue.push(12)
+    assert_stats_match(queue)
+
+def test_zero_and_one_length_queues():
+    empty = FixedLengthLIFOQueue(0)
+    for count in (3, 8, 1):
+        empty.push(count)
+    assert empty.size() == 0
+    assert empty.get_running_variance() == 0 and empty.get_running_std() == 0
+
+    single = FixedLengthLIFOQueue(1)
+    for count in (3, 8, 1):
+        single.push(count)
+        assert single.get_running_variance() == 0
+        assert single.get_running_std() == 0
+    assert single.get_running_average() == 1
+
+def test_running_variance_stays_exact_past_the_resync_interval(monkeypatch):
+    monkeypatch.setattr(FixedLengthLIFOQueue, 'RESYNC_INTERVAL', 50)
+    rng = np.random.default_rng(11)
+    queue = FixedLengthLIFOQueue(10)
+    for count in rng.poisson(1e6, size=175):
+        queue.push(int(count))
+    assert queue.pushes_since_resync == 175 % 50
+    assert_stats_match(queue)
+    assert queue.running_sum == sum(queue.queue)
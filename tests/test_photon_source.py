@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from grb import BurstSet, grb
+from photon_source import BACKGROUND, PhotonSource, PoissonBurstSource, burst_photon_times
+
+DRAWS = 400
+
+# Integral of amplitude * exp(-(t - peak)^2 / (2 sigma)) over its support window, numerically
+def integrated_intensity(burst_set, start, end):
+    grid = np.linspace(start, end, 200001)
+    values = burst_set.evaluate(grid)
+    return float(np.sum((values[1:] + values[:-1]) * np.diff(grid)) / 2)
+
+def mean_count(burst_set, windows, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.mean([sum(len(burst_photon_times(burst_set, rng, lo, hi)[0]) for lo, hi in windows) for _ in range(DRAWS)])
+
+def test_sampled_counts_match_the_integrated_intensity():
+    burst_set = BurstSet([50.0, 53.0], [100.0, 40.0], [4.0, 0.25])
+    expected = integrated_intensity(burst_set, 0, 100)
+    assert expected == pytest.approx(100 * 2 * np.sqrt(2 * np.pi) + 40 * 0.5 * np.sqrt(2 * np.pi), rel=1e-6)
+    # Poisson: the mean of DRAWS counts has standard deviation sqrt(expected / DRAWS)
+    assert abs(mean_count(burst_set, [(0, 100)]) - expected) < 4 * np.sqrt(expected / DRAWS)
+
+def test_splitting_the_window_keeps_the_expected_count():
+    burst_set = BurstSet([50.0], [100.0], [4.0])
+    expected = integrated_intensity(burst_set, 0, 100)
+    for windows in ([(0, 48.5), (48.5, 100)], [(0, 50), (50, 51), (51, 100)]):
+        assert abs(mean_count(burst_set, windows, seed=1) - expected) < 4 * np.sqrt(expected / DRAWS)
+    # Only the part of the pulse inside the window is sampled
+    part = integrated_intensity(burst_set, 50, 52)
+    assert abs(mean_count(burst_set, [(50, 52)], seed=2) - part) < 4 * np.sqrt(part / DRAWS)
+
+def test_sampled_times_stay_in_the_window_and_follow_the_pulse():
+    burst_set = BurstSet([50.0], [2000.0], [4.0])
+    times, pulses = burst_photon_times(burst_set, np.random.default_rng(3), 45, 60)
+    assert len(times) > 1000
+    assert times.min() >= 45 and times.max() < 60
+    assert np.all(pulses == 0)
+    # The share of photons before the peak follows the pulse's intensity over the window
+    before = np.mean(times < 50)
+    share = integrated_intensity(burst_set, 45, 50) / integrated_intensity(burst_set, 45, 60)
+    assert before == pytest.approx(share, abs=4 * np.sqrt(share * (1 - share) / len(times)))
+
+def test_merged_stream_is_sorted_and_tagged():
+    bursts = [grb(peak_time=30, amplitude=500, sigma=1), grb(peak_time=70, amplitude=300, sigma=4)]
+    background = list(PhotonSource(57, 100, 5, block_size=512))
+    blocks = list(PoissonBurstSource(PhotonSource(57, 100, 5, block_size=512), bursts))
+    times = np.concatenate([block[0] for block in blocks])
+    sources = np.concatenate([block[2] for block in blocks])
+    assert np.all(np.diff(times) >= 0)
+    assert times.max() < 100
+
+    # The background photons come through unchanged and tagged BACKGROUND
+    assert np.array_equal(times[sources == BACKGROUND], np.concatenate([block[0] for block in background]))
+    # Burst photons carry their pulse index + 1 and lie in that pulse's support
+    burst_set = BurstSet.from_grbs(bursts)
+    assert set(np.unique(sources).tolist()) == {BACKGROUND, 1, 2}
+    for pulse in range(2):
+        pulse_times = times[sources == pulse + 1]
+        assert pulse_times.min() >= burst_set.starts[pulse] and pulse_times.max() <= burst_set.ends[pulse]
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from config import GlobalState
+from grb import grb
+from photon_source import PhotonSource, PoissonBurstSource
+from pipeline import LightCurveSink, Pipeline, RecordingSink, Sink, run_pipeline
+from run_io import open_run
+from simulator import Simulator
+
+def burst_run(block_size=2048):
+    state = GlobalState()
+    state.vars.update(random_seed=3, duration=200, poisson_bursts=True)
+    bursts = [grb(peak_time=100, amplitude=2000, sigma=1)]
+    source = PoissonBurstSource(PhotonSource(state.vars['rate'], 200, 3, block_size=block_size), bursts)
+    return state, bursts, source
+
+class SlowSink(Sink):
+    blocking = True
+    queue_size = 2
+
+    def __init__(self):
+        self.blocks = 0
+        self.events = []
+        self.dropped = 0
+
+    def on_block(self, block):
+        time.sleep(0.02)
+        self.blocks += 1
+
+    def on_event(self, event):
+        self.events.append(event)
+
+def test_pipeline_matches_simulator_and_records_losslessly(tmp_path):
+    state, bursts, source = burst_run()
+    expected = Simulator(state, bursts).run()
+    light_curve = LightCurveSink()
+    recording = RecordingSink(str(tmp_path / 'run'), state)
+    trigger = run_pipeline(source, state, [light_curve, recording])
+
+    assert trigger.triggered_timestamp == expected.triggered_timestamp
+    assert trigger.exit_timestamp == expected.exit_timestamp
+    assert [event.kind for event in light_curve.events] == ['enter', 'exit']
+    counts, timestamps = light_curve.light_curve()
+    assert len(counts) == len(timestamps) > 0 and np.all(np.diff(timestamps) > 0)
+
+    run = open_run(str(tmp_path / 'run'))
+    assert len(run.photons) == trigger.photons
+    assert run.header['triggered_timestamp'] == expected.triggered_timestamp
+    assert run.header['dropped_blocks'] == 0
+
+def test_slow_sink_drops_blocks_but_not_events():
+    state, bursts, source = burst_run(block_size=256)
+    slow = SlowSink()
+    trigger = run_pipeline(source, state, [slow])
+    assert slow.dropped > 0
+    assert slow.blocks > 0
+    assert [(event.kind, event.time) for event in slow.events] == [('enter', trigger.triggered_timestamp), ('exit', trigger.exit_timestamp)]
+
+class FailingSink(Sink):
+    def __init__(self, overflow, queue_size=1):
+        self.overflow = overflow
+        self.queue_size = queue_size
+        self.blocks = 0
+        self.dropped = 0
+
+    def on_block(self, block):
+        self.blocks += 1
+        if self.blocks == 3:
+            raise OSError('disk full')
+
+@pytest.mark.parametrize('overflow', ['wait', 'drop_oldest'])
+def test_failing_sink_stops_the_pipeline(overflow):
+    state, bursts, source = burst_run(block_size=64)
+    failing = FailingSink(overflow)
+    light_curve = LightCurveSink()
+    pipeline = Pipeline(source, state, [light_curve, failing])
+    with pytest.raises(OSError, match='disk full'):
+        asyncio.run(asyncio.wait_for(pipeline.run(), timeout=30))
+    assert failing.blocks == 3
+
+def test_failing_sink_leaves_no_pending_tasks_and_closes_the_other_sinks(tmp_path):
+    state, bursts, source = burst_run(block_size=64)
+    recording = RecordingSink(str(tmp_path / 'run'), state)
+
+    async def run():
+        with pytest.raises(OSError, match='disk full'):
+            await Pipeline(source, state, [recording, FailingSink('wait')]).run()
+        return asyncio.all_tasks() - {asyncio.current_task()}
+
+    assert asyncio.run(run()) == set()
+    # The recording was cut short but still closed, so its header and photons can be read
+    run_data = open_run(str(tmp_path / 'run'))
+    assert len(run_data.photons) == recording.writer.photon_count > 0
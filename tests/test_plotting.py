@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from config import GlobalState
+from plotting import minmax_decimate, new_figure, plot_counts, result_figure, save_figure
+from simulator import SimulationResult, Simulator
+
+def test_minmax_decimate_keeps_each_buckets_extremes_in_order():
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=1000)
+    x = np.arange(1000) * 0.5
+    decimated_x, decimated_y = minmax_decimate(x, y, 10)
+    assert len(decimated_y) == 20
+    assert np.all(np.diff(decimated_x) >= 0)
+    for bucket in range(10):
+        chunk = y[bucket * 100:(bucket + 1) * 100]
+        pair = decimated_y[2 * bucket:2 * bucket + 2]
+        assert sorted(pair.tolist()) == [chunk.min(), chunk.max()]
+        # The extremes come out in the order they occur in the bucket
+        first = 'min' if chunk.argmin() < chunk.argmax() else 'max'
+        assert pair[0] == (chunk.min() if first == 'min' else chunk.max())
+
+def test_minmax_decimate_keeps_a_spike_in_an_uneven_last_bucket():
+    y = np.zeros(1001)
+    y[-1] = 50.0
+    decimated_x, decimated_y = minmax_decimate(np.arange(1001), y, 10)
+    assert decimated_y.max() == 50.0 and decimated_x[-1] == 1000
+
+def test_minmax_decimate_returns_short_inputs_unchanged():
+    x = np.arange(20.0)
+    y = x ** 2
+    decimated_x, decimated_y = minmax_decimate(x, y, 10)
+    assert np.array_equal(decimated_x, x) and np.array_equal(decimated_y, y)
+
+def test_long_curves_are_drawn_decimated():
+    figure = new_figure(headless=True)
+    ax = figure.subplots()
+    plot_counts(ax, np.arange(100000.0), pixels=100)
+    (line,) = ax.get_lines()
+    assert len(line.get_xdata()) == 200
+
+@pytest.mark.parametrize('duration', [100, 5000])
+def test_headless_result_figure_saves_a_png(tmp_path, duration):
+    state = GlobalState()
+    state.vars.update(random_seed=1, duration=duration)
+    result = Simulator(state).run()
+    figure = result_figure(result, headless=True)
+    path = tmp_path / 'run.png'
+    save_figure(figure, str(path))
+    with open(path, 'rb') as file:
+        assert file.read(8) == b'\x89PNG\r\n\x1a\n'
+
+def test_result_figure_of_an_untriggered_run(tmp_path):
+    result = SimulationResult()
+    result.photon_count_data = [1.0, 2.0, 3.0]
+    result.running_average = [1.0, 1.5, 2.0]
+    path = tmp_path / 'empty.png'
+    save_figure(result_figure(result, headless=True), str(path))
+    assert path.stat().st_size > 0
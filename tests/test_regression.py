@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from config import GlobalState
+from continuous import ContinuousRun
+from grb import grb
+from photon_source import PhotonSource, PoissonBurstSource
+from simulator import NOT_TRIGGERED, Simulator
+from streaming_trigger import StreamingTrigger
+from trigger_engine import TriggerEngine, bin_photons, running_averages
+
+# Seeded regression checks: the offline, streaming and continuous triggers must give the same first
+# trigger as Simulator.run() for the same photons and bursts.
+
+SEEDS = (1, 2, 3)
+DURATION = 200
+
+def make_state(seed, poisson_bursts=False):
+    state = GlobalState()
+    state.vars.update(random_seed=seed, duration=DURATION, poisson_bursts=poisson_bursts)
+    return state
+
+# Deterministic bursts add amplitude to every bin as it closes; Poisson-sampled ones are amplitude
+# counts/s, so they need to be brighter to trigger
+def bursts(poisson_bursts=False):
+    if poisson_bursts:
+        return [grb(peak_time=100, amplitude=2000, sigma=1)]
+    return [grb(peak_time=100, amplitude=90, sigma=5)]
+
+def background_times(vars):
+    return np.concatenate([times for times, energies in PhotonSource(vars['rate'], vars['duration'], vars['random_seed'])])
+
+def test_simulator_default_run_is_unchanged():
+    state = GlobalState()
+    state.vars['random_seed'] = 1
+    result = Simulator(state).run()
+    assert result.triggered_timestamp == pytest.approx(46.33883741846333)
+    assert result.exit_timestamp == pytest.approx(61.02638254453206)
+
+def test_simulator_is_reentrant():
+    first = Simulator(make_state(1), bursts()).run()
+    Simulator(make_state(2), bursts()).run()
+    again = Simulator(make_state(1), bursts()).run()
+    assert again.triggered_timestamp == first.triggered_timestamp
+    assert again.exit_timestamp == first.exit_timestamp
+    assert again.light_curve_counts == first.light_curve_counts
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_trigger_engine_matches_simulator(seed):
+    state = make_state(seed)
+    expected = Simulator(state, bursts()).run()
+    assert expected.triggered()
+    result = TriggerEngine.from_vars(state.vars).evaluate_photons(background_times(state.vars), bursts(), DURATION)
+    assert result.triggered_timestamp == pytest.approx(expected.triggered_timestamp)
+    assert result.exit_timestamp == pytest.approx(expected.exit_timestamp)
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_streaming_trigger_matches_simulator(seed):
+    state = make_state(seed, poisson_bursts=True)
+    expected = Simulator(state, bursts(True)).run()
+    assert expected.triggered()
+    trigger = StreamingTrigger(state.vars)
+    for block in PoissonBurstSource(PhotonSource(state.vars['rate'], DURATION, seed), bursts(True)):
+        trigger.push_block(block[0])
+    assert trigger.triggered_timestamp == expected.triggered_timestamp
+    assert trigger.exit_timestamp == expected.exit_timestamp
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_continuous_run_first_trigger_matches_simulator(seed, tmp_path):
+    state = make_state(seed)
+    expected = Simulator(state, bursts()).run()
+    assert expected.triggered() and expected.exit_timestamp != NOT_TRIGGERED
+    summary = ContinuousRun(state, bursts(), str(tmp_path), segment_seconds=50, window_seconds=30).run()
+    assert summary['triggers'] >= 1
+    assert summary['segments'] == DURATION // 50
+    with open(os.path.join(tmp_path, 'triggers.jsonl')) as file:
+        first = json.loads(file.readline())
+    assert first['enter'] == expected.triggered_timestamp
+    assert first['exit'] == expected.exit_timestamp
+
+def test_continuous_run_without_the_resource_module(monkeypatch):
+    # Windows has no resource module; the run still completes with the RSS left out
+    monkeypatch.setitem(sys.modules, 'resource', None)
+    summary = ContinuousRun(make_state(1), bursts(), segment_seconds=50, window_seconds=30).run()
+    assert summary['segments'] == DURATION // 50
+    assert summary['memory']['max_rss_bytes'] is None
+    assert summary['memory']['segment_max_rss_bytes'] == [None] * (DURATION // 50)
+    json.dumps(summary)
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_simulator_bins_match_trigger_engine(seed):
+    state = make_state(seed)
+    state.vars['rate'] = 5000
+    result = Simulator(state, []).run()
+    counts, _, _ = bin_photons(background_times(state.vars), 1)
+    assert result.photon_count_data == counts.tolist()
+    assert result.running_average == pytest.approx(running_averages(counts, state.vars['running_avg_length']).tolist())
@@ -0,0 +1,37 @@
+from collections import deque
+
+import numpy as np
+
+from ring_buffer import PhotonRingBuffer, RingBuffer
+
+def test_ring_buffer_matches_deque():
+    buffer = RingBuffer(5)
+    reference = deque(maxlen=5)
+    for chunk in ([1.0], [2.0, 3.0], [4.0, 5.0, 6.0, 7.0], np.arange(8.0, 20.0), [20.0]):
+        buffer.extend(chunk)
+        reference.extend(chunk)
+        assert buffer.to_array().tolist() == list(reference)
+        assert buffer[0] == reference[0] and buffer[-1] == reference[-1]
+    buffer.append(21.0)
+    reference.append(21.0)
+    assert buffer.to_array().tolist() == list(reference)
+
+def test_photon_ring_buffer_keeps_the_newest_photons_of_a_large_block():
+    buffer = PhotonRingBuffer(600)
+    buffer.append(-1.0, 5.0, 1)
+    times = np.arange(65536, dtype=np.float64)
+    energies = times.astype(np.float32) + 0.5
+    flags = (np.arange(65536) % 3).astype(np.uint8)
+    buffer.extend(times, energies, flags)
+    photons = buffer.to_array()
+    assert len(photons) == 600
+    assert photons['time'].tolist() == times[-600:].tolist()
+    assert photons['energy'].tolist() == energies[-600:].tolist()
+    assert photons['flags'].tolist() == flags[-600:].tolist()
+
+def test_photon_ring_buffer_extend_wraps_around():
+    buffer = PhotonRingBuffer(4)
+    buffer.extend([0.0, 1.0, 2.0], [10.0, 11.0, 12.0])
+    buffer.extend([3.0, 4.0], [13.0, 14.0])
+    assert buffer.to_array()['time'].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert buffer.to_array()['energy'].tolist() == [11.0, 12.0, 13.0, 14.0]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from config import GlobalState
+from grb import grb
+from photon_source import PhotonSource, PoissonBurstSource
+from simulator import Simulator
+from streaming_trigger import StreamingBinner, StreamingTrigger
+from trigger_engine import bin_photons
+
+def burst_state(seed):
+    state = GlobalState()
+    state.vars.update(random_seed=seed, duration=200, poisson_bursts=True)
+    return state
+
+def photon_times(vars, bursts):
+    source = PoissonBurstSource(PhotonSource(vars['rate'], vars['duration'], vars['random_seed']), bursts)
+    return np.concatenate([block[0] for block in source])
+
+def test_bin_photon_matches_bin_block():
+    times = np.sort(np.random.default_rng(0).uniform(0, 50, 3000))
+    expected_counts, expected_times, _ = bin_photons(times, 0.04)
+    binner = StreamingBinner(0.04)
+    closes = [(count, time) for time in times.tolist() for count in [binner.bin_photon(time)] if count is not None]
+    assert [count for count, time in closes] == expected_counts.tolist()
+    assert [time for count, time in closes] == expected_times.tolist()
+
+@pytest.mark.parametrize('seed', (1, 2, 3))
+def test_push_matches_push_block_and_simulator(seed):
+    state = burst_state(seed)
+    bursts = [grb(peak_time=100, amplitude=2000, sigma=1)]
+    expected = Simulator(state, bursts).run()
+    assert expected.triggered()
+    times = photon_times(state.vars, bursts)
+
+    single = StreamingTrigger(state.vars, rearm=True)
+    single_events = [event for time in times.tolist() for event in single.push(time)]
+    block = StreamingTrigger(state.vars, rearm=True)
+    block_events = [event for start in range(0, len(times), 4096) for event in block.push_block(times[start:start + 4096])]
+
+    assert [(event.kind, event.time) for event in single_events] == [(event.kind, event.time) for event in block_events]
+    assert single_events[0].time == expected.triggered_timestamp
+    assert single_events[1].time == expected.exit_timestamp
+    assert single.photons == len(times)
+
+def test_push_keeps_state_bounded_through_a_bright_burst():
+    state = burst_state(4)
+    bursts = [grb(peak_time=100, amplitude=20000, sigma=1)]
+    times = photon_times(state.vars, bursts)
+    assert len(times) > StreamingTrigger.LATENCY_SAMPLES
+    trigger = StreamingTrigger(state.vars)
+    events = []
+    state_sizes = set()
+    for i, time in enumerate(times.tolist()):
+        events += trigger.push(time)
+        if time > state.vars['enter_look_back_to'] and i % 100 == 0:
+            state_sizes.add(trigger.algorithm.state_size())
+    # The algorithm's state stops growing once its look back window has filled, and only the most
+    # recent push timings are kept
+    assert len(state_sizes) == 1
+    assert len(trigger.tail_counts) <= trigger.tail_counts.maxlen
+    assert len(trigger.push_timings) == StreamingTrigger.LATENCY_SAMPLES
+    assert trigger.photons == len(times)
+
+    assert [event.kind for event in events] == ['enter', 'exit']
+    assert 95 < events[0].time < 100 < events[1].time
+    assert len(events[0].light_curve_counts) == trigger.tail_counts.maxlen
+    expected = Simulator(state, bursts).run()
+    assert (events[0].time, events[1].time) == (expected.triggered_timestamp, expected.exit_timestamp)
@@ -0,0 +1,26 @@
+import json
+
+from config import GlobalState
+from sweep import run_sweep
+
+GRID = {'amplitude': [0, 90], 'sigma': [0.5, 5]}
+
+def base_vars():
+    vars = GlobalState().vars
+    vars.update(duration=60, random_seed=5)
+    return vars
+
+def test_workers_and_cache_give_identical_rows(tmp_path):
+    rows = run_sweep(GRID, 3, base_vars(), workers=1)
+    assert len(rows) == 4
+    assert [row['runs'] for row in rows] == [3] * 4
+    for row in rows:
+        assert type(row['detection_fraction']) is float
+        assert type(row['false_trigger_fraction']) is float
+    assert any(row['detection_fraction'] > 0 for row in rows)
+
+    expected = json.dumps(rows)
+    assert json.dumps(run_sweep(GRID, 3, base_vars(), workers=2)) == expected
+    cache_dir = str(tmp_path / 'cache')
+    assert json.dumps(run_sweep(GRID, 3, base_vars(), workers=1, cache_dir=cache_dir)) == expected
+    assert json.dumps(run_sweep(GRID, 3, base_vars(), workers=2, cache_dir=cache_dir)) == expected
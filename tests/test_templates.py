@@ -0,0 +1,146 @@
+import json
+
+import numpy as np
+import pytest
+
+from config import GlobalState
+from grb import BurstSet, RateTemplate, TemplateBurst, grb
+from photon_source import PhotonSource, PoissonBurstSource, burst_photon_times
+
+DRAWS = 400
+
+# Triangle on a background of 10: rises from -2 s to its peak of 50 counts/s at 0 and falls to 6 s.
+# Sampled every 10 ms, as integral() and inverse() interpolate linearly between the points.
+def triangle():
+    times = np.linspace(-4, 8, 1201)
+    return RateTemplate(times, 10 + 50 * np.interp(times, [-2, 0, 6], [0, 1, 0]))
+
+def test_shape_is_background_subtracted_and_peak_normalised():
+    template = triangle()
+    assert template.background == 10.0
+    assert template.peak_rate == pytest.approx(50.0)
+    assert template.offsets[400] == 0.0 and template.shape.max() == 1.0
+    assert template.shape == pytest.approx(np.interp(template.offsets, [-2, 0, 6], [0, 1, 0]), abs=1e-12)
+    assert (template.start, template.end) == (-4.0, 8.0)
+    # Half maximum at -1 and 3
+    assert template.fwhm == pytest.approx(4.0)
+
+    # An explicit background is used as given and the peak moves to offset 0
+    shifted = RateTemplate([10.0, 11.0, 12.0, 13.0], [3.0, 5.0, 9.0, 4.0], background=1.0)
+    assert shifted.offsets.tolist() == [-2.0, -1.0, 0.0, 1.0]
+    assert shifted.shape.tolist() == pytest.approx([0.25, 0.5, 1.0, 0.375])
+    assert shifted.rate([-3.0, -0.5, 0.0, 2.0]).tolist() == pytest.approx([0.0, 0.75, 1.0, 0.0])
+
+    with pytest.raises(ValueError):
+        RateTemplate([0.0, 1.0], [5.0, 5.0])
+
+def test_cumulative_integral_and_inverse():
+    template = triangle()
+    # The triangle's area is (2 + 6) / 2, all of it between -2 and 6
+    assert template.cumulative[-1] == pytest.approx(4.0)
+    assert template.integral([-4.0, -2.0, -1.0, 0.0, 3.0, 8.0, 20.0]).tolist() == pytest.approx([0.0, 0.0, 0.25, 1.0, 3.25, 4.0, 4.0], abs=1e-4)
+
+    lgrb = RateTemplate.from_file()
+    grid = np.linspace(lgrb.start, lgrb.end, 400001)
+    values = lgrb.rate(grid)
+    numeric = np.concatenate(([0.0], np.cumsum((values[1:] + values[:-1]) * np.diff(grid) / 2)))
+    checks = np.linspace(lgrb.start, lgrb.end, 50)
+    assert lgrb.integral(checks) == pytest.approx(np.interp(checks, grid, numeric), rel=1e-4, abs=1e-6)
+    assert lgrb.shape.max() == 1.0 and lgrb.shape.min() >= 0.0
+
+    # Where the shape is non-zero the cumulative integral is strictly increasing and inverse() undoes it
+    for curve in (template, lgrb):
+        offsets = curve.offsets[curve.shape > 0]
+        assert curve.inverse(curve.integral(offsets)) == pytest.approx(offsets, abs=1e-9)
+    assert template.inverse([0.25, 1.0, 3.25]).tolist() == pytest.approx([-1.0, 0.0, 3.0], abs=1e-3)
+
+def test_time_scale_stretches_the_pulse():
+    template = triangle()
+    burst = TemplateBurst(template, peak_time=100, time_scale=2.0)
+    assert burst.amplitude == template.peak_rate
+    assert burst.sigma == pytest.approx(4 * template.sigma)
+    # The peak stays at peak_time and every point of the shape lies twice as far from it
+    for offset in (-3.0, -1.0, 0.0, 2.5, 7.0):
+        assert burst.burst_addition(100 + 2 * offset) == pytest.approx(50 * template.rate(offset))
+    assert burst.burst_addition(100 - 4.1) == 0.0 and burst.burst_addition(100 + 12.1) == 0.0
+
+    burst.sigma = 9 * template.sigma
+    assert burst.time_scale == pytest.approx(3.0)
+    assert TemplateBurst(template, amplitude=5, time_scale=0.5).burst_addition(51.0) == pytest.approx(5 * template.rate(2.0))
+
+def test_burst_set_evaluates_templates_with_the_gaussians(monkeypatch):
+    monkeypatch.setattr(BurstSet, 'CHUNK_SIZE', 100)
+    bursts = [grb(peak_time=40, amplitude=30, sigma=2), TemplateBurst(triangle(), 45, 20, 1.5),
+              TemplateBurst(RateTemplate.from_file(), 60, 1000, 0.25)]
+    burst_set = BurstSet.from_grbs(bursts)
+    assert len(burst_set) == 3 and burst_set.templates == bursts[1:]
+    assert burst_set.template_starts.tolist() == pytest.approx([45 - 6, 60 + 0.25 * burst_set.templates[1].template.start])
+    assert burst_set.template_ends.tolist() == pytest.approx([45 + 12, 60 + 0.25 * burst_set.templates[1].template.end])
+
+    times = np.concatenate((np.linspace(0, 120, 2001), [40.0, 45.0, 60.0]))
+    expected = np.array([sum(float(b.burst_addition(t)) for b in bursts) for t in times.tolist()])
+    assert burst_set.evaluate(times) == pytest.approx(expected, rel=1e-12, abs=1e-12)
+
+def test_sampled_template_photons_follow_the_integrated_rate():
+    burst = TemplateBurst(triangle(), peak_time=20, amplitude=40, time_scale=2.0)
+    burst_set = BurstSet.from_grbs([burst])
+    rng = np.random.default_rng(11)
+    for start, end in ((0, 100), (18, 26)):
+        # Counts per second integrate to amplitude * time_scale * (area of the shape over the window)
+        offsets = np.clip([(start - 20) / 2, (end - 20) / 2], -4, 8)
+        expected = 40 * 2 * float(np.diff(burst.template.integral(offsets))[0])
+        counts = [len(burst_photon_times(burst_set, rng, start, end)[0]) for _ in range(DRAWS)]
+        assert abs(np.mean(counts) - expected) < 4 * np.sqrt(expected / DRAWS)
+
+    times, pulses = burst_photon_times(BurstSet.from_grbs([TemplateBurst(triangle(), 20, 2000, 2.0)]), rng, 10, 30)
+    assert times.min() >= 16 and times.max() < 30
+    assert np.all(pulses == 0)
+    # The window cuts the stretched triangle at offset 5, keeping 1 + 35 / 12 of its area, 1 before the peak
+    share = 1 / (1 + 35 / 12)
+    before = np.mean(times < 20)
+    assert before == pytest.approx(share, abs=4 * np.sqrt(share * (1 - share) / len(times)))
+    assert np.mean(times < 18) == pytest.approx(0.25 * share, abs=4 * np.sqrt(share / 4 / len(times)))
+
+def test_template_pulses_are_tagged_after_the_gaussians():
+    bursts = [grb(peak_time=30, amplitude=500, sigma=1), TemplateBurst(triangle(), 70, 300, 1.0)]
+    blocks = list(PoissonBurstSource(PhotonSource(57, 100, 5, block_size=512), bursts))
+    times = np.concatenate([block[0] for block in blocks])
+    sources = np.concatenate([block[2] for block in blocks])
+    assert np.all(np.diff(times) >= 0)
+    template_times = times[sources == 2]
+    assert len(template_times) > 0 and template_times.min() >= 68 and template_times.max() <= 76
+
+def test_to_dict_saves_the_repository_relative_path(tmp_path):
+    burst = TemplateBurst(peak_time=80, amplitude=500, time_scale=0.5)
+    data = burst.to_dict()
+    assert data['template']['path'] == 'curve_fitting/lgrb.dat'
+    assert (data['peak_time'], data['amplitude'], data['time_scale']) == (80, 500, 0.5)
+    loaded = TemplateBurst.from_dict(json.loads(json.dumps(data)))
+    assert loaded.template.path == burst.template.path
+    assert loaded.template.background == burst.template.background
+    assert np.array_equal(loaded.template.shape, burst.template.shape)
+
+    state = GlobalState()
+    state.bursts = BurstSet.from_grbs([grb(peak_time=10, amplitude=20, sigma=3), burst])
+    path = str(tmp_path / 'settings.json')
+    state.save(path)
+    with open(path) as file:
+        assert json.load(file)['bursts']['templates'][0]['template']['path'] == 'curve_fitting/lgrb.dat'
+    restored = GlobalState()
+    restored.load(path)
+    times = np.linspace(0, 120, 601)
+    assert restored.bursts.evaluate(times).tolist() == state.bursts.evaluate(times).tolist()
+
+def test_templates_outside_the_repository_save_their_curve(tmp_path):
+    path = tmp_path / 'curve.dat'
+    path.write_text('\n'.join(str(t) + ' ' + str(r) for t, r in zip(triangle().offsets + 4, 10 + 50 * triangle().shape)) + '\n')
+    template = RateTemplate.from_file(str(path))
+    data = template.to_dict()
+    assert 'path' not in data and data['background'] == 0.0
+    assert data['offsets'] == pytest.approx(triangle().offsets.tolist())
+    loaded = RateTemplate.from_dict(json.loads(json.dumps(data)))
+    assert loaded.shape.tolist() == template.shape.tolist()
+    assert loaded.peak_rate == template.peak_rate == pytest.approx(50.0)
+
+    # Tabulated templates have no path at all
+    assert RateTemplate.from_dict(triangle().to_dict()).cumulative.tolist() == triangle().cumulative.tolist()
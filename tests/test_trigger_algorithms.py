@@ -0,0 +1,54 @@
+import pytest
+
+from config import GlobalState
+from photon_source import PhotonSource
+from streaming_trigger import StreamingTrigger
+from trigger_algorithms import ALGORITHMS, CusumTrigger, make_algorithm
+
+def background_events(vars, algorithm, seed, duration=300):
+    trigger = StreamingTrigger(vars, algorithm=algorithm, rearm=True)
+    events = []
+    for times, energies in PhotonSource(vars['rate'], duration, seed):
+        events.extend(trigger.push_block(times))
+    return events
+
+@pytest.mark.parametrize('seed', range(6))
+def test_cusum_background_only_never_enters(seed):
+    vars = GlobalState().vars
+    assert background_events(vars, 'cusum', seed) == []
+
+def test_cusum_does_not_accumulate_before_the_background_is_known():
+    vars = GlobalState().vars
+    algorithm = CusumTrigger.from_vars(vars)
+    for i in range(100):
+        algorithm.close_ebe(5, i * vars['ebe_bin_length'])
+    assert algorithm.score == 0.0
+    assert algorithm.check_enter(4.0) is None
+
+def test_make_algorithm():
+    vars = GlobalState().vars
+    for name, cls in ALGORITHMS.items():
+        assert isinstance(make_algorithm(name, vars), cls)
+    with pytest.raises(ValueError):
+        make_algorithm('nope', vars)
+
+@pytest.mark.parametrize('seed', (1, 2, 3, 4))
+@pytest.mark.parametrize('amplitude, sigma', [(2000, 1), (300, 0.1), (600, 4), (400, 9)])
+def test_significance_trigger_matches_simulator(seed, amplitude, sigma):
+    from grb import grb
+    from photon_source import PoissonBurstSource
+    from simulator import Simulator
+    from trigger_algorithms import SignificanceTrigger
+
+    state = GlobalState()
+    state.vars.update(random_seed=seed, duration=200, poisson_bursts=True)
+    bursts = [grb(peak_time=100, amplitude=amplitude, sigma=sigma)]
+    expected = Simulator(state, bursts).run()
+    trigger = StreamingTrigger(state.vars, algorithm=SignificanceTrigger.from_vars(state.vars))
+    for block in PoissonBurstSource(PhotonSource(state.vars['rate'], 200, seed), bursts):
+        trigger.push_block(block[0])
+    assert trigger.triggered_timestamp == expected.triggered_timestamp
+    if trigger.trigger_threshold_met:
+        assert expected.exit_timestamp == 200       # The simulator exits at the end of the run
+    else:
+        assert trigger.exit_timestamp == expected.exit_timestamp
@@ -0,0 +1,53 @@
+import pytest
+
+from config import GlobalState
+from grb import grb
+from photon_source import PhotonSource, PoissonBurstSource
+from trigger_algorithms import poisson_significance
+from trigger_bank import MIN_BACKGROUND_BINS, Timescale, TriggerBank, default_timescales
+
+@pytest.mark.parametrize('seed', range(5))
+def test_background_only_never_enters(seed):
+    vars = GlobalState().vars
+    bank = TriggerBank(default_timescales(vars))
+    bank.run(PhotonSource(vars['rate'], 1000, seed))
+    assert bank.first_trigger() is None
+    assert bank.events == []
+
+def test_bright_burst_fires_and_exits_on_every_ready_timescale():
+    vars = GlobalState().vars
+    bursts = [grb(peak_time=150, amplitude=vars['lgrb_A'], sigma=vars['lgrb_sigma'])]
+    bank = TriggerBank(default_timescales(vars))
+    report = bank.run(PoissonBurstSource(PhotonSource(vars['rate'], 300, 1), bursts))
+    for row in report:
+        assert len(row['triggers']) >= 1
+        enter, exit, peak = row['triggers'][0]
+        assert 140 < enter < 150 and exit is not None and exit > enter and peak >= row['enter_z_score']
+
+def test_default_timescales_have_enough_background_bins():
+    for timescale in default_timescales():
+        assert (timescale.look_back - timescale.tail) / timescale.bin_length >= MIN_BACKGROUND_BINS - 1e-9
+
+def test_bin_lengths_must_be_multiples_of_the_base():
+    with pytest.raises(ValueError):
+        TriggerBank([Timescale(0.04, 17, 5, 5.5), Timescale(0.1, 17, 5, 5.5)])
+
+def test_poisson_significance():
+    assert poisson_significance(10, 10) == 0
+    assert poisson_significance(5, 10) < 0 < poisson_significance(15, 10)
+    # Close to the Gaussian z-score at high counts
+    assert poisson_significance(10500, 10000) == pytest.approx(5, rel=0.02)
+
+def test_blocks_reaching_back_into_closed_bins_are_rejected():
+    bank = TriggerBank([Timescale(0.04, 17, 5, 5.5)], start_time=10.0)
+    with pytest.raises(ValueError, match='start_time'):
+        bank.push_block([9.5, 10.5])
+    bank.push_block([10.5, 11.0, 12.0])
+    with pytest.raises(ValueError, match='sorted'):
+        bank.push_block([11.5, 12.5])
+    with pytest.raises(ValueError, match='sorted'):
+        bank.push_block([12.5, 12.1])
+    # A photon in the open bin is still accepted, and the rejected blocks changed nothing
+    bank.push_block([12.01, 13.0])
+    assert bank.closed[1] == int((13.0 - 10.0) / 0.04)
+    assert bank.open_count == 1
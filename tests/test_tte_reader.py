@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from config import GlobalState
+from grb import grb
+from photon_source import PhotonSource, PoissonBurstSource
+from simulator import Simulator
+from tte_reader import EventFileSource, convert_text_to_binary, read_binary_events, read_text_events, replay, write_binary_events
+
+DURATION = 200
+
+def photons(seed=3):
+    source = PoissonBurstSource(PhotonSource(57, DURATION, seed), [grb(peak_time=100, amplitude=2000, sigma=1)])
+    blocks = list(source)
+    return np.concatenate([block[0] for block in blocks]), np.concatenate([block[1] for block in blocks])
+
+def write_text(path, times, energies):
+    with open(path, 'w') as file:
+        file.write('# time energy\n')
+        for time, energy in zip(times.tolist(), energies.tolist()):
+            file.write(repr(time) + ', ' + repr(energy) + '\n')
+    return str(path)
+
+def concatenate(blocks):
+    blocks = list(blocks)
+    return np.concatenate([block[0] for block in blocks]), np.concatenate([block[1] for block in blocks])
+
+def test_text_chunks_that_split_lines_read_every_event(tmp_path):
+    times, energies = photons()
+    path = write_text(tmp_path / 'events.csv', times, energies)
+    for chunk_bytes in (37, 1000, 1 << 24):
+        read_times, read_energies = concatenate(read_text_events(path, chunk_bytes=chunk_bytes, delimiter=','))
+        assert np.array_equal(read_times, times)
+        assert np.array_equal(read_energies, energies)
+
+def test_binary_round_trip_in_blocks(tmp_path):
+    times, energies = photons()
+    path = str(tmp_path / 'events.bin')
+    write_binary_events(path, times[:500], energies[:500], append=False)
+    write_binary_events(path, times[500:], energies[500:])
+    blocks = list(read_binary_events(path, chunk_events=7))
+    assert all(len(block[0]) == 7 for block in blocks[:-1])
+    read_times, read_energies = concatenate(blocks)
+    assert np.array_equal(read_times, times)
+    assert np.array_equal(read_energies, energies.astype(np.float32))
+
+def test_npy_and_converted_text_match(tmp_path):
+    times, energies = photons()
+    npy_path = str(tmp_path / 'events.npy')
+    np.save(npy_path, np.column_stack((times, energies)))
+    read_times, read_energies = concatenate(read_binary_events(npy_path, chunk_events=100))
+    assert np.array_equal(read_times, times) and np.array_equal(read_energies, energies)
+
+    binary_path = str(tmp_path / 'converted.bin')
+    convert_text_to_binary(write_text(tmp_path / 'events.csv', times, energies), binary_path, chunk_bytes=500, delimiter=',')
+    assert np.array_equal(concatenate(read_binary_events(binary_path))[0], times)
+
+def test_event_file_source_rebases_to_the_first_event(tmp_path):
+    times, energies = photons()
+    path = str(tmp_path / 'events.bin')
+    write_binary_events(path, times + 1000, energies, append=False)
+    read_times, _ = concatenate(EventFileSource(path, chunk_events=64))
+    assert read_times[0] == 0
+    assert read_times == pytest.approx(times - times[0])
+
+@pytest.mark.parametrize('suffix', ['.csv', '.bin'])
+def test_replay_matches_feeding_the_photons_directly(tmp_path, suffix):
+    times, energies = photons()
+    state = GlobalState()
+    state.vars['duration'] = DURATION
+    expected = Simulator(state, bursts=[]).run(source=[(times, energies)])
+    assert expected.triggered()
+
+    path = str(tmp_path / ('events' + suffix))
+    if suffix == '.csv':
+        write_text(path, times, energies)
+        result = replay(path, state, rebase=False, chunk_bytes=4096, delimiter=',')
+    else:
+        write_binary_events(path, times, energies, append=False)
+        result = replay(path, state, rebase=False, chunk_events=1000)
+    assert result.triggered_timestamp == expected.triggered_timestamp
+    assert result.exit_timestamp == expected.exit_timestamp
+    assert result.photon_count_data == expected.photon_count_data
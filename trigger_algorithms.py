@@ -0,0 +1,366 @@
+from collections import deque
+
+import numpy as np
+
+from lifo_queue import FixedLengthLIFOQueue
+from ring_buffer import RingBuffer
+from simulator import approximate_derivative
+
+# Pluggable trigger algorithms
+#
+# A TriggerAlgorithm sees the closed 1s and event-by-event (ebe) bins of a photon stream and is asked,
+# on the first photon after each close, whether a burst has started or ended. The binning, check
+# scheduling, re-arming and event delivery live in streaming_trigger.StreamingTrigger, so every
+# algorithm runs over identical photon streams and bins:
+#   StreamingTrigger(vars, algorithm=CusumTrigger.from_vars(vars))
+# Each algorithm declares state_size() (floats held) and PER_BIN_OPERATIONS (approximate arithmetic
+# operations per bin close) so they can be compared at equal compute cost; compare_algorithms()
+# measures detection latency and false alarms over the same seeds.
+#
+# Algorithms plug into StreamingTrigger only, and so into what is built on it: the asyncio pipeline,
+# ContinuousRun (cli continuous --algorithm) and compare_algorithms(). Simulator.run() (sim.py, cli
+# run / replay, sweep.py) and trigger_engine.TriggerEngine keep their own inlined copies of the
+# simulator's algorithm for speed. SignificanceTrigger is the plugin version of that algorithm;
+# tests/test_trigger_algorithms.py checks that it gives the same timestamps as Simulator.run().
+
+class TriggerAlgorithm:
+    """
+    Interface for trigger algorithms.
+
+    close_second() and close_ebe() receive each closed bin (count, photon time closing it).
+    check_enter(time) returns the significance if a burst is detected, otherwise None;
+    check_exit(time) returns True when the burst is over. reset_after_exit() is called after an
+    exit and ready() tells whether the trigger may fire again. Enter checks only run on photons
+    after warm_up seconds.
+    """
+
+    name = 'base'
+    PER_BIN_OPERATIONS = 0
+    warm_up = 0.0
+
+    def close_second(self, count, time):
+        pass
+
+    def close_ebe(self, count, time):
+        pass
+
+    def check_enter(self, time):
+        return None
+
+    def check_exit(self, time):
+        return False
+
+    def reset_after_exit(self):
+        pass
+
+    def ready(self):
+        return True
+
+    def state_size(self):
+        return 0
+
+# Signed Poisson likelihood-ratio significance of n counts where expected are expected:
+# sqrt(2 (n ln(n / expected) - (n - expected))), negative below expected. Unlike (n - expected) /
+# sqrt(expected) it keeps the Gaussian tail probability at low counts.
+def poisson_significance(n, expected):
+    if n <= 0:
+        return -np.sqrt(2 * expected)
+    significance = np.sqrt(max(2 * (n * np.log(n / expected) - (n - expected)), 0.0))
+    return significance if n >= expected else -significance
+
+# Mean 1s count over the enter_look_back_to seconds before the tail, kept in O(1) per bin. Shared by
+# the CUSUM and likelihood-ratio triggers; frozen while a burst is in progress.
+class _BackgroundRate:
+    def __init__(self, tail, enter_look_back_to):
+        self.tail = tail
+        self.delay = deque()
+        self.window = FixedLengthLIFOQueue(max(1, enter_look_back_to - tail))
+        self.frozen = False
+
+    def push(self, count):
+        if self.frozen:
+            return
+        self.delay.append(count)
+        if len(self.delay) > self.tail:
+            self.window.push(self.delay.popleft())
+
+    def rate(self):
+        return self.window.get_running_average() if self.window.size() > 0 else 0.0
+
+    # Whether the look back window is full, i.e. rate() is a real estimate
+    def ready(self):
+        return self.window.size() == self.window.queue.maxlen
+
+    def state_size(self):
+        return self.tail + self.window.queue.maxlen + 2
+
+class SignificanceTrigger(TriggerAlgorithm):
+    """
+    The simulator's algorithm: enters when the newest ebe bin exceeds the oldest tail bin by
+    enter_significance_constant standard deviations of the running average over the look back
+    window, and exits when the ebe curve is flat and below 1.25 times the running average at entry.
+    """
+
+    name = 'significance'
+    PER_BIN_OPERATIONS = 20
+
+    def __init__(self, enter_significance_constant=5.5, tail=5, enter_look_back_to=17, ebe_bin_length=0.04,
+                 running_avg_length=3):
+        self.enter_significance_constant = enter_significance_constant
+        self.tail = tail
+        self.warm_up = enter_look_back_to
+        self.photon_count_queue = FixedLengthLIFOQueue(running_avg_length)
+        self.last_running_average = None
+        self.look_back_delay = deque()
+        self.look_back_queue = FixedLengthLIFOQueue(max(0, enter_look_back_to - tail))
+        tail_length = int(tail / ebe_bin_length)
+        self.tail_counts = RingBuffer(tail_length)
+        self.tail_timestamps = RingBuffer(tail_length)
+        self.entered_ebe_threshold = -99
+
+    @classmethod
+    def from_vars(cls, vars):
+        return cls(vars['enter_significance_constant'], vars['tail'], vars['enter_look_back_to'],
+                   vars['ebe_bin_length'], vars['running_avg_length'])
+
+    def close_second(self, count, time):
+        self.photon_count_queue.push(count)
+        self.last_running_average = self.photon_count_queue.get_running_average()
+        self.look_back_delay.append(self.last_running_average)
+        if len(self.look_back_delay) > self.tail:
+            self.look_back_queue.push(self.look_back_delay.popleft())
+
+    def close_ebe(self, count, time):
+        self.tail_counts.append(count)
+        self.tail_timestamps.append(time)
+
+    def check_enter(self, time):
+        look_back_std = self.look_back_queue.get_running_std() if self.look_back_queue.size() > 0 else np.nan
+        threshold = self.tail_counts[0] + self.enter_significance_constant * look_back_std
+        if self.tail_counts[-1] >= threshold:
+            self.entered_ebe_threshold = self.last_running_average
+            return (self.tail_counts[-1] - self.tail_counts[0]) / look_back_std if look_back_std > 0 else np.inf
+        return None
+
+    def check_exit(self, time):
+        der = approximate_derivative(self.tail_counts[-1], self.tail_counts[-2], self.tail_timestamps[-1] - self.tail_timestamps[-2])
+        return -0.001 < der < 0.001 and self.tail_counts[-1] < 1.25 * self.entered_ebe_threshold
+
+    # The tail is collected again after an exit before the trigger can fire again
+    def reset_after_exit(self):
+        self.tail_counts.clear()
+        self.tail_timestamps.clear()
+
+    def ready(self):
+        return len(self.tail_counts) == self.tail_counts.maxlen
+
+    def state_size(self):
+        return (self.photon_count_queue.queue.maxlen + len(self.look_back_delay) + self.look_back_queue.queue.maxlen +
+                2 * self.tail_counts.maxlen + 6)
+
+class CusumTrigger(TriggerAlgorithm):
+    """
+    Poisson CUSUM on the ebe bins: S = max(0, S + n ln(k) - (k - 1) mu), with mu the expected
+    background count per bin and k the rate increase to detect. Enters when S >= threshold; a second
+    CUSUM for the return from k mu to mu ends the burst. O(1) per bin. Nothing is accumulated until
+    the background window has filled, as mu would be underestimated before then.
+    """
+
+    name = 'cusum'
+    PER_BIN_OPERATIONS = 12
+
+    def __init__(self, threshold=20.0, rate_ratio=3.0, tail=5, enter_look_back_to=17, ebe_bin_length=0.04):
+        self.threshold = threshold
+        self.log_ratio = np.log(rate_ratio)
+        self.rate_ratio = rate_ratio
+        self.ebe_bin_length = ebe_bin_length
+        self.warm_up = enter_look_back_to
+        self.background = _BackgroundRate(tail, enter_look_back_to)
+        self.score = 0.0
+        self.exit_score = 0.0
+        self.triggered = False
+
+    @classmethod
+    def from_vars(cls, vars):
+        return cls(tail=vars['tail'], enter_look_back_to=vars['enter_look_back_to'], ebe_bin_length=vars['ebe_bin_length'])
+
+    def close_second(self, count, time):
+        self.background.push(count)
+
+    def close_ebe(self, count, time):
+        if not self.background.ready():
+            self.score = 0.0
+            return
+        mu = self.background.rate() * self.ebe_bin_length
+        llr = count * self.log_ratio - (self.rate_ratio - 1) * mu
+        if self.triggered:
+            self.exit_score = max(0.0, self.exit_score - llr)
+        else:
+            self.score = max(0.0, self.score + llr)
+
+    def check_enter(self, time):
+        if self.score >= self.threshold:
+            self.triggered = True
+            self.background.frozen = True
+            self.exit_score = 0.0
+            return self.score
+        return None
+
+    def check_exit(self, time):
+        return self.exit_score >= self.threshold
+
+    def reset_after_exit(self):
+        self.triggered = False
+        self.background.frozen = False
+        self.score = 0.0
+
+    def state_size(self):
+        return self.background.state_size() + 3
+
+class LikelihoodRatioTrigger(TriggerAlgorithm):
+    """
+    Poisson likelihood ratio over a sliding window of the last `window` seconds of ebe bins against
+    the background rate: significance = sqrt(2 (n ln(n / b) - (n - b))) for n counts and b expected.
+    Enters at enter_significance, exits below exit_significance. The window sum is updated in O(1).
+    """
+
+    name = 'likelihood_ratio'
+    PER_BIN_OPERATIONS = 15
+
+    def __init__(self, enter_significance=5.5, exit_significance=1.0, window=0.2, tail=5, enter_look_back_to=17,
+                 ebe_bin_length=0.04):
+        self.enter_significance = enter_significance
+        self.exit_significance = exit_significance
+        self.ebe_bin_length = ebe_bin_length
+        self.warm_up = enter_look_back_to
+        self.background = _BackgroundRate(tail, enter_look_back_to)
+        self.window_counts = RingBuffer(max(1, int(round(window / ebe_bin_length))))
+        self.window_sum = 0.0
+        self.significance = 0.0
+
+    @classmethod
+    def from_vars(cls, vars):
+        return cls(vars['enter_significance_constant'], tail=vars['tail'], enter_look_back_to=vars['enter_look_back_to'],
+                   ebe_bin_length=vars['ebe_bin_length'])
+
+    def close_second(self, count, time):
+        self.background.push(count)
+
+    def close_ebe(self, count, time):
+        if len(self.window_counts) == self.window_counts.maxlen:
+            self.window_sum -= self.window_counts[0]
+        self.window_counts.append(count)
+        self.window_sum += count
+        expected = self.background.rate() * self.ebe_bin_length * len(self.window_counts)
+        n = self.window_sum
+        if expected > 0 and n > expected:
+            self.significance = poisson_significance(n, expected)
+        else:
+            self.significance = 0.0
+
+    def check_enter(self, time):
+        if self.significance >= self.enter_significance:
+            self.background.frozen = True
+            return self.significance
+        return None
+
+    def check_exit(self, time):
+        return self.significance < self.exit_significance
+
+    def reset_after_exit(self):
+        self.background.frozen = False
+
+    def state_size(self):
+        return self.background.state_size() + self.window_counts.maxlen + 2
+
+ALGORITHMS = {
+    SignificanceTrigger.name: SignificanceTrigger,
+    CusumTrigger.name: CusumTrigger,
+    LikelihoodRatioTrigger.name: LikelihoodRatioTrigger,
+}
+
+def make_algorithm(name, vars):
+    if name not in ALGORITHMS:
+        raise ValueError('unknown trigger algorithm ' + repr(name) + ', choose from ' + ', '.join(ALGORITHMS))
+    return ALGORITHMS[name].from_vars(vars)
+
+def compare_algorithms(vars, names=tuple(ALGORITHMS), seeds=range(10), bursts=None, window_sigmas=3):
+    """
+    Run each algorithm over the same Poisson photon streams (one per seed) with re-arming on.
+    Per algorithm: detection fraction and mean latency (first entry inside a burst window minus the
+    window start), false alarms per hour (entries outside every window), state size, operations per
+    bin and processing time per photon.
+    """
+    from time import perf_counter
+    from grb import grb
+    from photon_source import PhotonSource, PoissonBurstSource
+    from streaming_trigger import StreamingTrigger
+    from sweep import burst_window
+
+    if bursts is None:
+        bursts = [grb(vars['duration'] / 2, vars['default_A'], vars['default_sigma'])]
+    windows = [burst_window(burst, window_sigmas) for burst in bursts]
+    rows = {name: {'detections': 0, 'latencies': [], 'false_alarms': 0, 'seconds': 0.0, 'photons': 0} for name in names}
+    for seed in seeds:
+        source = PoissonBurstSource(PhotonSource(vars['rate'], vars['duration'], [vars['random_seed'], seed]), bursts)
+        blocks = [block[0] for block in source]
+        for name in names:
+            algorithm = make_algorithm(name, vars)
+            trigger = StreamingTrigger(vars, algorithm=algorithm, rearm=True)
+            start = perf_counter()
+            events = []
+            for times in blocks:
+                events.extend(trigger.push_block(times))
+            row = rows[name]
+            row['seconds'] += perf_counter() - start
+            row['photons'] += trigger.photons
+            row['state_size'] = algorithm.state_size()
+            row['per_bin_operations'] = algorithm.PER_BIN_OPERATIONS
+            detected = False
+            for event in events:
+                if event.kind != 'enter':
+                    continue
+                inside = [lo for lo, hi in windows if lo <= event.time <= hi]
+                if inside and not detected:
+                    detected = True
+                    row['latencies'].append(event.time - inside[0])
+                elif not inside:
+                    row['false_alarms'] += 1
+            row['detections'] += detected
+
+    hours = len(seeds) * vars['duration'] / 3600
+    summary = []
+    for name, row in rows.items():
+        summary.append({
+            'algorithm': name,
+            'detection_fraction': row['detections'] / len(seeds),
+            'mean_latency': float(np.mean(row['latencies'])) if row['latencies'] else None,
+            'false_alarms_per_hour': row['false_alarms'] / hours,
+            'state_size': row['state_size'],
+            'per_bin_operations': row['per_bin_operations'],
+            'seconds_per_photon': row['seconds'] / max(row['photons'], 1),
+        })
+    return summary
+
+def main(argv=None):
+    import argparse
+    from config import GlobalState
+
+    parser = argparse.ArgumentParser(description='Compare trigger algorithms over identical photon streams')
+    parser.add_argument('--config', help='GlobalState JSON file')
+    parser.add_argument('--seeds', type=int, default=10)
+    parser.add_argument('--algorithms', nargs='+', default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    args = parser.parse_args(argv)
+
+    state = GlobalState()
+    if args.config:
+        state.load(args.config)
+    for row in compare_algorithms(state.vars, args.algorithms, range(args.seeds)):
+        print(row['algorithm'].ljust(18) + ' detected ' + str(round(row['detection_fraction'], 2)).ljust(5) +
+              ' latency ' + str(row['mean_latency'] if row['mean_latency'] is None else round(row['mean_latency'], 3)).ljust(7) +
+              ' false alarms/h ' + str(round(row['false_alarms_per_hour'], 1)).ljust(7) +
+              ' state ' + str(row['state_size']).ljust(6) + ' ops/bin ' + str(row['per_bin_operations']).ljust(4) +
+              ' ' + str(round(row['seconds_per_photon'] * 1e6, 3)) + ' us/photon')
+
+if __name__ == "__main__":
+    main()
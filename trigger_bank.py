@@ -0,0 +1,235 @@
+from collections import deque
+
+import numpy as np
+
+from config import GlobalState
+from lifo_queue import FixedLengthLIFOQueue
+from trigger_algorithms import poisson_significance
+
+# Multi-timescale trigger bank
+#
+# Many (bin length, lookback, tail, significance) trigger configurations run over the same photon
+# stream. Photons are binned once into fine bins on a fixed grid; every coarser bin length is an
+# integer multiple of the fine one and is built by summing bins of the next finer level that divides
+# it (e.g. 0.04 -> 0.16 -> 0.64 -> 2.56 s), so a timescale costs a few additions per bin rather
+# than another pass over the photons.
+#
+# Each timescale compares the newest bin with the mean and standard deviation of the bins between
+# look_back and tail seconds ago (the tail is left out so the start of a burst does not raise its
+# own background, as in the simulator) and enters when the z-score reaches enter_z_score. The
+# z-score is the smaller of (count - mean) / std, with std no lower than the Poisson sqrt(mean),
+# and the Poisson likelihood-ratio significance of count against mean; the latter keeps short bins
+# of a few counts from firing on the Poisson tail. The background is frozen while triggered and the
+# timescale exits when the z-score falls below exit_z_score, after which it can fire again.
+#
+# This is not the simulator's algorithm (running average tail against lookback std, derivative
+# based exit), so its thresholds are separate settings: 'bank_enter_z_score' and
+# 'bank_exit_z_score', not the simulator's significance constants.
+
+DEFAULT_FACTORS = (1, 4, 16, 64)        # Bin lengths of default_timescales(), in ebe_bin_length units
+MIN_BACKGROUND_BINS = 30
+
+class Timescale:
+    def __init__(self, bin_length, look_back, tail, enter_z_score, exit_z_score=1.0, name=None):
+        self.bin_length = bin_length
+        self.look_back = look_back
+        self.tail = tail
+        self.enter_z_score = enter_z_score
+        self.exit_z_score = exit_z_score
+        self.name = name if name is not None else str(round(bin_length, 6)) + 's'
+
+    def __str__(self):
+        return (self.name + ': bin ' + str(self.bin_length) + 's, look back ' + str(self.look_back) +
+                's, tail ' + str(self.tail) + 's, z-score ' + str(self.enter_z_score) + ' / ' + str(self.exit_z_score))
+
+# The simulator's tail and look back at bin lengths of factor * ebe_bin_length, with the bank's own
+# z-score thresholds. The look back is stretched where needed so every timescale has at least
+# MIN_BACKGROUND_BINS background bins, enough for a usable std estimate.
+def default_timescales(vars=None, factors=DEFAULT_FACTORS):
+    if vars is None:
+        vars = GlobalState().vars
+    timescales = []
+    for factor in factors:
+        bin_length = vars['ebe_bin_length'] * factor
+        tail = max(vars['tail'], bin_length)
+        look_back = max(vars['enter_look_back_to'], tail + MIN_BACKGROUND_BINS * bin_length)
+        timescales.append(Timescale(bin_length, look_back, tail, vars['bank_enter_z_score'], vars['bank_exit_z_score']))
+    return timescales
+
+class _TimescaleState:
+    def __init__(self, timescale, factor):
+        self.timescale = timescale
+        self.factor = factor
+        tail_bins = max(1, int(round(timescale.tail / timescale.bin_length)))
+        background_bins = max(2, int(round(timescale.look_back / timescale.bin_length)) - tail_bins)
+        self.delay = deque()
+        self.tail_bins = tail_bins
+        self.background = FixedLengthLIFOQueue(background_bins)
+        self.background_bins = background_bins
+        self.triggered = False
+        self.significance = 0.0
+        self.triggers = []              # [enter time, exit time or None, peak significance]
+
+class TriggerBank:
+    """
+    Evaluates several Timescales over one photon stream.
+
+    Feed sorted photon times with push_block() (or a whole block source with run()); blocks reaching
+    back before start_time or into an already closed bin raise ValueError. push_block() returns
+    the (kind, time, timescale name, significance) events caused by the block. Bins are closed,
+    and events stamped, at the end of each bin, once a later photon shows the bin is complete.
+    report() gives each timescale's triggers and peak significance; first_trigger() tells which
+    timescale fired first.
+    """
+
+    def __init__(self, timescales=None, start_time=0.0, base_bin_length=None):
+        if timescales is None:
+            timescales = default_timescales()
+        self.base_bin_length = base_bin_length if base_bin_length is not None else min(t.bin_length for t in timescales)
+        self.start_time = start_time
+        self.states = []
+        for timescale in timescales:
+            factor = int(round(timescale.bin_length / self.base_bin_length))
+            if factor < 1 or abs(factor * self.base_bin_length - timescale.bin_length) > 1e-9 * timescale.bin_length:
+                raise ValueError('bin length ' + str(timescale.bin_length) + ' is not a multiple of ' + str(self.base_bin_length))
+            self.states.append(_TimescaleState(timescale, factor))
+
+        # Binning hierarchy: each level sums bins of its parent, the largest other factor dividing it
+        self.factors = sorted(set(state.factor for state in self.states) | {1})
+        self.parents = {}
+        for factor in self.factors[1:]:
+            self.parents[factor] = max(f for f in self.factors if f < factor and factor % f == 0)
+        self.pending = {factor: np.zeros(0) for factor in self.factors[1:]}    # parent bins not yet summed
+        self.closed = {factor: 0 for factor in self.factors}                   # bins closed so far per level
+        self.fine_index = 0
+        self.open_count = 0
+        self.events = []
+
+    def push_block(self, times):
+        times = np.asarray(times, dtype=np.float64)
+        if len(times) == 0:
+            return []
+        indices = np.floor((times - self.start_time) / self.base_bin_length).astype(np.int64)
+        # Bins before the open one are already closed and evaluated, so earlier photons can't be counted
+        if indices[0] < self.fine_index or np.any(np.diff(indices) < 0):
+            raise ValueError('photon times must be sorted, at or after start_time (' + str(self.start_time) +
+                             ') and not before the open bin starting at ' +
+                             str(self.start_time + self.fine_index * self.base_bin_length) + ' s')
+        counts = np.bincount(indices - self.fine_index, minlength=int(indices[-1] - self.fine_index) + 1).astype(np.float64)
+        counts[0] += self.open_count
+        self.open_count = counts[-1]
+        self.fine_index = int(indices[-1])
+        return self._close_bins(counts[:-1])
+
+    # Close the open fine bin, e.g. at the end of a finite stream
+    def flush(self):
+        counts = np.array([self.open_count])
+        self.open_count = 0
+        self.fine_index += 1
+        return self._close_bins(counts)
+
+    def run(self, source):
+        for block in source:
+            self.push_block(block[0])
+        self.flush()
+        return self.report()
+
+    def _close_bins(self, fine_counts):
+        levels = {1: fine_counts}
+        for factor in self.factors[1:]:
+            parent = self.parents[factor]
+            step = factor // parent
+            pending = np.concatenate((self.pending[factor], levels[parent]))
+            full = len(pending) // step * step
+            levels[factor] = pending[:full].reshape(-1, step).sum(axis=1)
+            self.pending[factor] = pending[full:]
+
+        events = []
+        for state in self.states:
+            first = self.closed[state.factor]
+            for i, count in enumerate(levels[state.factor].tolist()):
+                end_time = self.start_time + (first + i + 1) * state.timescale.bin_length
+                self._evaluate(state, count, end_time, events)
+        for factor in self.factors:
+            self.closed[factor] += len(levels[factor])
+        events.sort(key=lambda event: event[1])
+        self.events.extend(events)
+        return events
+
+    def _evaluate(self, state, count, time, events):
+        timescale = state.timescale
+        if state.background.size() == state.background_bins:
+            mean = state.background.get_running_average()
+            std = max(state.background.get_running_std(), np.sqrt(max(mean, 0.0)))
+            if std <= 0:
+                std = 1.0
+            state.significance = (count - mean) / std
+            if mean > 0:
+                state.significance = min(state.significance, poisson_significance(count, mean))
+            if not state.triggered and state.significance >= timescale.enter_z_score:
+                state.triggered = True
+                state.triggers.append([time, None, state.significance])
+                events.append(('enter', time, timescale.name, state.significance))
+            elif state.triggered:
+                state.triggers[-1][2] = max(state.triggers[-1][2], state.significance)
+                if state.significance < timescale.exit_z_score:
+                    state.triggered = False
+                    state.triggers[-1][1] = time
+                    events.append(('exit', time, timescale.name, state.significance))
+        if not state.triggered:
+            state.delay.append(count)
+            if len(state.delay) > state.tail_bins:
+                state.background.push(state.delay.popleft())
+
+    # Per timescale: settings, trigger [enter, exit, peak significance] list and current significance
+    def report(self):
+        rows = []
+        for state in self.states:
+            timescale = state.timescale
+            rows.append({
+                'name': timescale.name,
+                'bin_length': timescale.bin_length,
+                'look_back': timescale.look_back,
+                'tail': timescale.tail,
+                'enter_z_score': timescale.enter_z_score,
+                'exit_z_score': timescale.exit_z_score,
+                'triggers': [list(trigger) for trigger in state.triggers],
+                'first_trigger': state.triggers[0][0] if state.triggers else None,
+                'peak_significance': max((trigger[2] for trigger in state.triggers), default=None),
+                'current_significance': state.significance,
+            })
+        return rows
+
+    # (timescale name, enter time) of the earliest trigger over all timescales, or None
+    def first_trigger(self):
+        first = None
+        for state in self.states:
+            if state.triggers and (first is None or state.triggers[0][0] < first[1]):
+                first = (state.timescale.name, state.triggers[0][0])
+        return first
+
+def main(argv=None):
+    import argparse
+    from grb import grb
+    from photon_source import PhotonSource, PoissonBurstSource
+
+    parser = argparse.ArgumentParser(description='Run the default trigger bank over a simulated burst')
+    parser.add_argument('--config', help='GlobalState JSON file')
+    parser.add_argument('--burst', choices=['sgrb', 'lgrb', 'default'], default='sgrb')
+    args = parser.parse_args(argv)
+
+    state = GlobalState()
+    if args.config:
+        state.load(args.config)
+    vars = state.vars
+    prefix = args.burst + '_' if args.burst != 'default' else 'default_'
+    bursts = [grb(vars['duration'] / 2, vars[prefix + 'A'], vars[prefix + 'sigma'])]
+    source = PoissonBurstSource(PhotonSource(vars['rate'], vars['duration'], vars['random_seed']), bursts)
+    bank = TriggerBank(default_timescales(vars))
+    for row in bank.run(source):
+        print(row['name'].ljust(10) + ' first trigger ' + str(row['first_trigger']).ljust(22) +
+              ' peak significance ' + str(row['peak_significance']))
+    print('First to fire: ' + str(bank.first_trigger()))
+
+if __name__ == "__main__":
+    main()
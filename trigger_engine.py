@@ -0,0 +1,179 @@
+import numpy as np
+
+from grb import as_burst_set
+
+# Offline trigger engine
+#
+# Evaluates the same enter/exit algorithm as sim() over pre-binned count arrays. sim() re-checks
+# the trigger on every photon, but its inputs (the 1s running average and the event-by-event tail
+# counts) only change when a bin closes, so here the algorithm is evaluated once per bin close with
+# all rolling statistics computed from cumulative sums - O(bins) instead of O(photons x window).
+
+NOT_TRIGGERED = -999        # Same sentinel sim() uses for triggered_timestamp / exit_timestamp
+
+# Bins photons the way sim() does: a bin closes on the first photon at least bin_length after the
+# previous close (the accumulator is reset, not carried over), and that photon belongs to the bin.
+# Returns (counts, close_times, close_indices), close_indices being positions in times.
+def bin_photons(times, bin_length, start_time=0.0):
+    times = np.asarray(times, dtype=np.float64)
+    close_indices = []
+    last_close = start_time
+    i = np.searchsorted(times, last_close + bin_length, side='left')
+    while i < len(times):
+        close_indices.append(i)
+        last_close = times[i]
+        i = max(i + 1, np.searchsorted(times, last_close + bin_length, side='left'))
+    close_indices = np.array(close_indices, dtype=np.int64)
+    counts = np.diff(close_indices, prepend=-1).astype(np.float64)
+    return counts, times[close_indices], close_indices
+
+# Running average over the last running_avg_length bins (fewer at the start), as FixedLengthLIFOQueue gives
+def running_averages(counts, running_avg_length):
+    counts = np.asarray(counts, dtype=np.float64)
+    sums = np.concatenate(([0.0], np.cumsum(counts)))
+    n = np.arange(1, len(counts) + 1)
+    lo = np.maximum(0, n - running_avg_length)
+    return (sums[n] - sums[lo]) / (n - lo)
+
+# Population std of values[lo:hi] for every (lo, hi) pair, from shifted cumulative sums; nan if empty
+def window_std(values, lo, hi):
+    values = np.asarray(values, dtype=np.float64)
+    shift = values.mean() if len(values) else 0.0
+    centered = values - shift
+    s1 = np.concatenate(([0.0], np.cumsum(centered)))
+    s2 = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    length = (hi - lo).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (s1[hi] - s1[lo]) / length
+        variance = (s2[hi] - s2[lo]) / length - mean * mean
+    return np.sqrt(np.maximum(variance, 0.0))
+
+class TriggerResult:
+    def __init__(self, triggered_timestamp=NOT_TRIGGERED, exit_timestamp=NOT_TRIGGERED,
+                 light_curve_counts=None, light_curve_timestamps=None):
+        self.triggered_timestamp = triggered_timestamp
+        self.exit_timestamp = exit_timestamp
+        self.light_curve_counts = np.array([]) if light_curve_counts is None else light_curve_counts
+        self.light_curve_timestamps = np.array([]) if light_curve_timestamps is None else light_curve_timestamps
+
+    def triggered(self):
+        return self.triggered_timestamp != NOT_TRIGGERED
+
+    def __str__(self):
+        return 'Triggered: ' + str(round(self.triggered_timestamp, 2)) + 's, exited: ' + str(round(self.exit_timestamp, 2)) + 's'
+
+class TriggerEngine:
+    def __init__(self, enter_significance_constant=5.5, tail=5, enter_look_back_to=17, ebe_bin_length=0.04,
+                 running_avg_length=3):
+        self.enter_significance_constant = enter_significance_constant
+        self.tail = tail
+        self.enter_look_back_to = enter_look_back_to
+        self.ebe_bin_length = ebe_bin_length
+        self.running_avg_length = running_avg_length
+
+    # Build an engine from a GlobalState.vars style dict
+    @classmethod
+    def from_vars(cls, vars):
+        return cls(vars['enter_significance_constant'], vars['tail'], vars['enter_look_back_to'],
+                   vars['ebe_bin_length'], vars['running_avg_length'])
+
+    def tail_length(self):
+        return int(self.tail / self.ebe_bin_length)
+
+    def evaluate(self, running_average, ra_timestamps, ebe_counts, ebe_timestamps, photon_times=None, duration=None):
+        """
+        Run the enter/exit algorithm over binned data.
+
+        running_average/ra_timestamps are the 1s running averages and the times their bins closed,
+        ebe_counts/ebe_timestamps the event-by-event bins. sim() checks the trigger on the photon
+        after a bin closes, so pass photon_times to reproduce its timestamps exactly; without them
+        the bin close time is used. If duration is given a burst still in progress exits at duration.
+        """
+        running_average = np.asarray(running_average, dtype=np.float64)
+        ra_timestamps = np.asarray(ra_timestamps, dtype=np.float64)
+        ebe_counts = np.asarray(ebe_counts, dtype=np.float64)
+        ebe_timestamps = np.asarray(ebe_timestamps, dtype=np.float64)
+        tail_len = self.tail_length()
+        result = TriggerResult()
+
+        # Every bin close starts a new state; state k holds after the k-th close (state 0 before any)
+        event_times = np.concatenate((ra_timestamps, ebe_timestamps))
+        is_ebe = np.concatenate((np.zeros(len(ra_timestamps), dtype=bool), np.ones(len(ebe_timestamps), dtype=bool)))
+        order = np.argsort(event_times, kind='stable')
+        event_times = event_times[order]
+        is_ebe = is_ebe[order]
+        n_ra = np.concatenate(([0], np.cumsum(~is_ebe)))
+        n_ebe = np.concatenate(([0], np.cumsum(is_ebe)))
+        state_start = np.concatenate(([-np.inf], event_times))
+        state_end = np.concatenate((event_times, [np.inf]))
+
+        # Time of the first check in each state: the first photon after the close that led into it
+        if photon_times is not None:
+            photon_times = np.asarray(photon_times, dtype=np.float64)
+            nxt = np.searchsorted(photon_times, state_start, side='right')
+            check_time = np.where(nxt < len(photon_times), photon_times[np.minimum(nxt, len(photon_times) - 1)], np.inf)
+            last_check = photon_times[-1] if len(photon_times) else -np.inf
+            nxt_enter = np.searchsorted(photon_times, np.maximum(state_start, self.enter_look_back_to), side='right')
+            enter_time = np.where(nxt_enter < len(photon_times), photon_times[np.minimum(nxt_enter, len(photon_times) - 1)], np.inf)
+        else:
+            check_time = np.maximum(state_start, 0.0)
+            last_check = event_times[-1] if len(event_times) else -np.inf
+            enter_time = np.maximum(check_time, np.nextafter(float(self.enter_look_back_to), np.inf))
+        has_check = (check_time <= state_end) & (check_time <= last_check)
+        has_enter_check = (enter_time <= state_end) & (enter_time <= last_check)
+
+        # Enter threshold: newest tail bin against the oldest tail bin plus c * std of the lookback
+        # window running_average[-enter_look_back_to:-tail]
+        has_ebe = n_ebe > 0
+        newest = ebe_counts[np.maximum(n_ebe - 1, 0)] if len(ebe_counts) else np.zeros(len(n_ebe))
+        oldest = ebe_counts[np.maximum(n_ebe - tail_len, 0)] if len(ebe_counts) else np.zeros(len(n_ebe))
+        lo = np.maximum(0, n_ra - self.enter_look_back_to)
+        hi = np.maximum(lo, n_ra - self.tail)
+        look_back_std = window_std(running_average, lo, hi)
+        with np.errstate(invalid='ignore'):
+            enters = has_enter_check & has_ebe & (newest >= oldest + self.enter_significance_constant * look_back_std)
+        if not enters.any():
+            return result
+
+        k = int(np.argmax(enters))
+        result.triggered_timestamp = float(enter_time[k])
+        entered_ebe_threshold = running_average[n_ra[k] - 1] if n_ra[k] > 0 else np.nan
+        start_bin = max(0, n_ebe[k] - tail_len)
+
+        # Exit once the tail has flattened out (approximate_derivative) close to the level we entered at.
+        # The exit check also runs on the photon that triggered.
+        prev = np.maximum(n_ebe - 2, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            derivative = (newest - ebe_counts[prev]) / (2 * (ebe_timestamps[np.maximum(n_ebe - 1, 0)] - ebe_timestamps[prev])) if len(ebe_counts) else np.zeros(len(n_ebe))
+            exits = has_check & (n_ebe >= 2) & (-0.001 < derivative) & (derivative < 0.001) & (newest < 1.25 * entered_ebe_threshold)
+        exits[:k] = False
+        exit_time = np.where(np.arange(len(exits)) == k, enter_time, check_time)
+        if exits.any():
+            j = int(np.argmax(exits))
+            result.exit_timestamp = float(exit_time[j])
+            # sim() only appends the closing tail once it has refilled
+            end_bin = n_ebe[j] + tail_len if n_ebe[j] + tail_len <= len(ebe_counts) else n_ebe[j]
+        else:
+            if duration is not None:
+                result.exit_timestamp = duration
+            end_bin = len(ebe_counts)
+
+        result.light_curve_counts = ebe_counts[start_bin:end_bin]
+        result.light_curve_timestamps = ebe_timestamps[start_bin:end_bin]
+        return result
+
+    # Bin a photon stream, add the bursts (grb list or BurstSet) at each bin close as sim() does, then evaluate
+    def evaluate_photons(self, photon_times, bursts=(), duration=None):
+        photon_times = np.asarray(photon_times, dtype=np.float64)
+        counts, ra_timestamps, _ = bin_photons(photon_times, 1)
+        ebe_counts, ebe_timestamps, _ = bin_photons(photon_times, self.ebe_bin_length)
+        return self.evaluate_counts(counts, ra_timestamps, ebe_counts, ebe_timestamps, bursts, photon_times, duration)
+
+    # Add the bursts to already binned background counts (1s and event-by-event, left unmodified) and
+    # evaluate, so one binned background can be reused for many bursts
+    def evaluate_counts(self, counts, ra_timestamps, ebe_counts, ebe_timestamps, bursts=(), photon_times=None, duration=None):
+        burst_set = as_burst_set(bursts)
+        counts = counts + burst_set.evaluate(ra_timestamps)
+        ebe_counts = ebe_counts + burst_set.evaluate(ebe_timestamps)
+        running_average = running_averages(counts, self.running_avg_length)
+        return self.evaluate(running_average, ra_timestamps, ebe_counts, ebe_timestamps, photon_times, duration)
@@ -0,0 +1,116 @@
+import io
+import os
+import warnings
+
+import numpy as np
+
+from ring_buffer import PHOTON_DTYPE
+
+# Streaming readers for time-tagged event (TTE) files
+#
+# Event files are read in bounded chunks and yielded as (times, energies) blocks, the same
+# interface PhotonSource has, so recorded detector data can be replayed through Simulator.run()
+# exactly like synthetic photons. Supported forms:
+#   text    one event per line, whitespace or CSV separated columns, '#' comments
+#   .npy    a structured array with 'time'/'energy' fields or a 2-D (events x columns) array,
+#           read through a memory map
+#   binary  raw PHOTON_DTYPE records (see write_binary_events), read through a memory map
+
+DEFAULT_CHUNK_BYTES = 1 << 24       # Text read size, ~16 MB per chunk
+DEFAULT_CHUNK_EVENTS = 1 << 20      # Events per block for binary files
+
+# Yield (times, energies) blocks from a text event file without loading it whole
+def read_text_events(path, chunk_bytes=DEFAULT_CHUNK_BYTES, time_column=0, energy_column=1, delimiter=None,
+                     skip_header=0, comments='#'):
+    with open(path, 'rb') as file:
+        for _ in range(skip_header):
+            file.readline()
+        remainder = b''
+        while True:
+            data = file.read(chunk_bytes)
+            if not data:
+                data, remainder = remainder, b''
+                if not data.strip():
+                    break
+            else:
+                # Only parse complete lines; the partial last line is kept for the next chunk
+                data = remainder + data
+                cut = data.rfind(b'\n') + 1
+                if cut == 0:
+                    remainder = data
+                    continue
+                data, remainder = data[:cut], data[cut:]
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)      # chunks holding only comments are empty
+                columns = np.loadtxt(io.BytesIO(data), delimiter=delimiter, comments=comments,
+                                     usecols=(time_column, energy_column), ndmin=2)
+            if len(columns) > 0:
+                yield columns[:, 0], columns[:, 1]
+
+# Yield (times, energies) blocks from a .npy or raw PHOTON_DTYPE file through a memory map
+def read_binary_events(path, chunk_events=DEFAULT_CHUNK_EVENTS, time_column=0, energy_column=1):
+    if path.endswith('.npy'):
+        events = np.load(path, mmap_mode='r')
+    else:
+        events = np.memmap(path, dtype=PHOTON_DTYPE, mode='r')
+    for start in range(0, len(events), chunk_events):
+        chunk = events[start:start + chunk_events]
+        if chunk.dtype.names:
+            yield np.array(chunk['time'], dtype=np.float64), np.array(chunk['energy'], dtype=np.float64)
+        else:
+            yield np.array(chunk[:, time_column], dtype=np.float64), np.array(chunk[:, energy_column], dtype=np.float64)
+
+# Append (times, energies) to a raw PHOTON_DTYPE file, e.g. to convert a text file block by block
+def write_binary_events(path, times, energies, flags=None, append=True):
+    records = np.zeros(len(times), dtype=PHOTON_DTYPE)
+    records['time'] = times
+    records['energy'] = energies
+    if flags is not None:
+        records['flags'] = flags
+    with open(path, 'ab' if append else 'wb') as file:
+        records.tofile(file)
+
+def convert_text_to_binary(text_path, binary_path, **kwargs):
+    open(binary_path, 'wb').close()
+    for times, energies in read_text_events(text_path, **kwargs):
+        write_binary_events(binary_path, times, energies)
+
+class EventFileSource:
+    """
+    Replay of a TTE file as a photon source.
+
+    Iterating yields (times, energies) blocks like PhotonSource. Text files are parsed in chunks,
+    .npy and raw binary files (format='binary', or any file ending in .npy/.bin) are memory mapped;
+    only one block is in memory at a time. With rebase=True times are shifted so the first event
+    is at 0, since the trigger compares times against enter_look_back_to. Reader options such as
+    delimiter, time_column or skip_header are passed through.
+    """
+
+    def __init__(self, path, format=None, rebase=True, **kwargs):
+        self.path = path
+        if format is None:
+            format = 'binary' if os.path.splitext(path)[1] in ('.npy', '.bin') else 'text'
+        self.format = format
+        self.rebase = rebase
+        self.kwargs = kwargs
+        self.duration = None
+        self.random_seed = None
+        self.start_time = 0.0
+
+    def __iter__(self):
+        if self.format == 'binary':
+            blocks = read_binary_events(self.path, **self.kwargs)
+        else:
+            blocks = read_text_events(self.path, **self.kwargs)
+        offset = None
+        for times, energies in blocks:
+            if self.rebase:
+                if offset is None:
+                    offset = times[0]
+                times = times - offset
+            yield times, energies
+
+# Run the trigger over a recorded event file and return the SimulationResult. No bursts are added.
+def replay(path, config=None, **kwargs):
+    from simulator import Simulator
+    return Simulator(config, bursts=[]).run(source=EventFileSource(path, **kwargs))